@@ -0,0 +1,218 @@
+"""
+Admission control: bounded queues per lane, and a per-client concurrency limit.
+
+Each expensive endpoint belongs to a lane. Cheap image uploads and
+multi-minute URL analyses go to separate lanes, so one never waits behind
+the other. A lane runs at most `slots` requests at once and queues up to
+`queue` more in FIFO order. A request is turned away at once with
+429 + Retry-After when:
+- the lane's queue is full
+- the expected wait is longer than the lane's max_wait. The expected wait is
+  the queue depth times the lane's average service time, divided by its slots.
+- the client IP already has ADMISSION_PER_CLIENT requests queued or running
+A queued request that still has no slot after max_wait is rejected the same
+way.
+
+Rejection happens in the middleware, before the body is read, so a spike
+costs no temp files, threads or decoded media. Paths outside every lane
+(health, metrics, job polling) are never queued. Job submission is limited
+by the job queue itself (see jobs.py) and answers with the same 429. The limits are per worker
+process. Each lane's limits can be overridden with
+ADMISSION_<LANE>_SLOTS, ADMISSION_<LANE>_QUEUE and ADMISSION_<LANE>_MAX_WAIT.
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+
+from starlette.responses import JSONResponse
+
+from metrics import Counter, Gauge, Histogram
+
+log = logging.getLogger(__name__)
+
+ADMISSION_PER_CLIENT = int(os.environ.get("ADMISSION_PER_CLIENT", "4"))  # 0 disables the per-client limit
+# Use the first X-Forwarded-For address as the client (only behind a proxy that sets it)
+ADMISSION_TRUST_FORWARDED = os.environ.get("ADMISSION_TRUST_FORWARDED", "0") == "1"
+SERVICE_TIME_ALPHA = 0.2  # Weight of the newest request in a lane's average service time
+
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests turned away with 429, by lane and reason",
+                             ("lane", "reason"))
+ADMISSION_QUEUE_WAIT = Histogram("admission_queue_wait_seconds", "Time admitted requests waited for a slot",
+                                 ("lane",))
+ADMISSION_DEPTH = Gauge("admission_lane_requests", "Requests running or queued, by lane and state",
+                        ("lane", "state"))
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Lane:
+    """
+    Concurrency slots plus a bounded FIFO queue for a group of endpoints.
+
+    Args:
+        name: Lane name, used in metrics and env overrides
+        paths: Request paths served by this lane
+        slots: Requests run at once
+        queue: Requests that may wait for a slot
+        max_wait: Longest expected or actual wait, in seconds, before a 429
+        service_time: Initial estimate of one request's duration, in seconds
+    """
+
+    def __init__(self, name: str, paths, slots: int, queue: int, max_wait: float, service_time: float):
+        env = f"ADMISSION_{name.upper()}_"
+        self.name = name
+        self.paths = frozenset(paths)
+        self.slots = int(os.environ.get(env + "SLOTS", slots))
+        self.queue = int(os.environ.get(env + "QUEUE", queue))
+        self.max_wait = float(os.environ.get(env + "MAX_WAIT", max_wait))
+        self.service_time = service_time
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self) -> float:
+        """Seconds a request arriving now would wait for a slot."""
+        if self.active < self.slots and not self._waiters:
+            return 0.0
+        return (len(self._waiters) + 1) * self.service_time / self.slots
+
+    async def acquire(self) -> float:
+        """
+        Waits for a slot.
+
+        Returns:
+            float: Seconds spent queued
+
+        Raises:
+            Rejected: Queue full, expected wait too long, or no slot within max_wait
+        """
+        if self.active < self.slots and not self._waiters:
+            self.active += 1
+            return 0.0
+        if len(self._waiters) >= self.queue:
+            raise Rejected("queue_full", self.expected_wait())
+        expected = self.expected_wait()
+        if expected > self.max_wait:
+            raise Rejected("wait_too_long", expected)
+
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as we gave up; pass it on
+                self.release(None)
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Rejected("queue_timeout", self.expected_wait())
+        return time.monotonic() - start
+
+    def release(self, service_time):
+        """Frees a slot, handing it straight to the oldest waiter if there is one."""
+        if service_time is not None:
+            self.service_time += SERVICE_TIME_ALPHA * (service_time - self.service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+def client_address(scope) -> str:
+    if ADMISSION_TRUST_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def reject_response(lane: str, reason: str, retry_after: float) -> JSONResponse:
+    """The 429 every admission check answers with; also used by the job queue."""
+    ADMISSION_REJECTED.inc(lane=lane, reason=reason)
+    retry_after = max(1, math.ceil(retry_after))
+    log.warning(f"🚦 Rejected {lane} request ({reason}); retry after {retry_after}s")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Server is busy, retry later", "lane": lane, "reason": reason,
+                 "retry_after": retry_after},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that queues requests for lane paths and rejects them with 429 under overload."""
+
+    def __init__(self, app, lanes=()):
+        self.app = app
+        self.lanes = {path: lane for lane in lanes for path in lane.paths}
+        self.per_client = {}
+
+    def _reject(self, lane, reason, retry_after):
+        return reject_response(lane.name, reason, retry_after)
+
+    async def __call__(self, scope, receive, send):
+        lane = self.lanes.get(scope.get("path")) if scope["type"] == "http" else None
+        if lane is None or scope.get("method") != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        client = client_address(scope)
+        if ADMISSION_PER_CLIENT and self.per_client.get(client, 0) >= ADMISSION_PER_CLIENT:
+            response = self._reject(lane, "client_limit", lane.expected_wait() or lane.service_time)
+            await response(scope, receive, send)
+            return
+
+        self.per_client[client] = self.per_client.get(client, 0) + 1
+        try:
+            try:
+                waited = await lane.acquire()
+            except Rejected as e:
+                await self._reject(lane, e.reason, e.retry_after)(scope, receive, send)
+                return
+            ADMISSION_QUEUE_WAIT.observe(waited, lane=lane.name)
+            start = time.monotonic()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                lane.release(time.monotonic() - start)
+        finally:
+            self.per_client[client] -= 1
+            if not self.per_client[client]:
+                del self.per_client[client]
+
+
+def install_admission(app, lanes):
+    """
+    Adds admission control to a FastAPI app.
+
+    Args:
+        app: The FastAPI app; call before adding CORS (so browsers can read the 429) and
+            before instrument_app() (so rejections are still counted and traced)
+        lanes: Lane objects; each request path should belong to at most one
+    """
+    app.add_middleware(AdmissionMiddleware, lanes=lanes)
+    ADMISSION_DEPTH.set_function(lambda: {
+        **{(lane.name, "running"): lane.active for lane in lanes},
+        **{(lane.name, "queued"): lane.waiting for lane in lanes},
+    })
+    for lane in lanes:
+        log.info(f"🚦 Lane {lane.name}: {lane.slots} slots, queue {lane.queue}, max wait {lane.max_wait:.0f}s "
+                 f"({', '.join(sorted(lane.paths))})")
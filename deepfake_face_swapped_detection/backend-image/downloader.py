@@ -1,6 +1,9 @@
 import os
 import uuid
 import glob
+import shutil
+import logging
+import threading
 import requests
 import yt_dlp
 import instaloader
@@ -15,6 +18,18 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+# Optional logged-in Instagram session (created with `instaloader --login USER`)
+INSTAGRAM_SESSION_USER = os.getenv("INSTAGRAM_SESSION_USER")
+INSTAGRAM_SESSION_FILE = os.getenv("INSTAGRAM_SESSION_FILE")
+
+# One Instaloader per process: its context keeps the HTTP session and rate-limit state
+_instaloader = None
+_instaloader_lock = threading.Lock()
+
 
 def _parse_srcset_for_highest_resolution(srcset: str) -> str:
     """
@@ -85,10 +100,10 @@ def _extract_og_image(driver) -> str:
         og_meta = driver.find_element(By.CSS_SELECTOR, 'meta[property="og:image"]')
         og_image_url = og_meta.get_attribute("content")
         if og_image_url and og_image_url.startswith("http"):
-            print(f"Found OG image: {og_image_url}")
+            log.info(f"Found OG image: {og_image_url}")
             return og_image_url
     except Exception as e:
-        print(f"No OG image found: {e}")
+        log.warning(f"No OG image found: {e}")
     return None
 
 
@@ -103,13 +118,13 @@ def _extract_article_images(driver) -> list:
         # Instagram wraps posts in <article> tags
         articles = driver.find_elements(By.TAG_NAME, "article")
         if not articles:
-            print("No <article> elements found")
+            log.warning("No <article> elements found")
             return candidates
         
         # Use first article (main post)
         article = articles[0]
         imgs = article.find_elements(By.TAG_NAME, "img")
-        print(f"Found {len(imgs)} images in article")
+        log.info(f"Found {len(imgs)} images in article")
         
         for img in imgs:
             # Skip unwanted images
@@ -131,7 +146,7 @@ def _extract_article_images(driver) -> list:
                     candidates.append((src, 0))
         
     except Exception as e:
-        print(f"Error extracting article images: {e}")
+        log.error(f"Error extracting article images: {e}")
     
     return candidates
 
@@ -168,24 +183,24 @@ def fetch_image_via_selenium(url: str, output_dir: str, unique_id: str, timeout:
         image_url = None
         
         # STRATEGY 1: Try Open Graph metadata (Instagram always has this)
-        print("Trying OG metadata extraction...")
+        log.info("Trying OG metadata extraction...")
         image_url = _extract_og_image(driver)
         
         # STRATEGY 2: Fallback to article-scoped extraction
         if not image_url:
-            print("OG metadata failed, trying article extraction...")
+            log.warning("OG metadata failed, trying article extraction...")
             candidates = _extract_article_images(driver)
             
             if candidates:
                 # Sort by quality score (highest first)
                 candidates.sort(key=lambda x: x[1], reverse=True)
                 image_url = candidates[0][0]
-                print(f"Selected best candidate: {image_url}")
+                log.info(f"Selected best candidate: {image_url}")
             else:
-                print("No suitable images found in article")
+                log.warning("No suitable images found in article")
         
         if not image_url:
-            print("Selenium: no usable image found")
+            log.warning("Selenium: no usable image found")
             return None
         
         # Download the image
@@ -206,12 +221,12 @@ def fetch_image_via_selenium(url: str, output_dir: str, unique_id: str, timeout:
                 f.write(chunk)
 
         if os.path.getsize(final_path) > 0:
-            print(f"Successfully downloaded image to: {final_path}")
+            log.info(f"Successfully downloaded image to: {final_path}")
             return final_path
         return None
 
     except Exception as e:
-        print(f"Selenium strategy failed: {e}")
+        log.warning(f"Selenium strategy failed: {e}")
         return None
     finally:
         if driver:
@@ -233,61 +248,77 @@ def get_instagram_shortcode(url: str) -> str:
     except:
         return None
 
-def download_instagram_image(url: str, output_dir: str) -> str:
+def get_instaloader() -> instaloader.Instaloader:
+    """
+    Returns the shared Instaloader, creating it (and loading the optional
+    session file) on first use. Callers must hold _instaloader_lock while
+    using its context.
+    """
+    global _instaloader
+    if _instaloader is None:
+        L = instaloader.Instaloader(
+            download_pictures=True,
+            download_videos=False,
+            download_video_thumbnails=False,
+            download_geotags=False,
+            download_comments=False,
+            save_metadata=False,
+            compress_json=False,
+            quiet=True,
+        )
+        if INSTAGRAM_SESSION_USER:
+            try:
+                L.load_session_from_file(INSTAGRAM_SESSION_USER, INSTAGRAM_SESSION_FILE)
+                log.info(f"✓ Loaded Instagram session for {INSTAGRAM_SESSION_USER}")
+            except Exception as e:
+                log.warning(f"⚠️ Could not load Instagram session, continuing anonymously: {e}")
+        _instaloader = L
+    return _instaloader
+
+
+def download_instagram_image(url: str, output_dir: str, unique_id: str) -> str:
     """
-    Downloads the image from an Instagram post using Instaloader.
+    Downloads only the main image of an Instagram post using Instaloader.
+    The image is written straight to output_dir/{unique_id}{ext}; no post
+    directory, captions or metadata files are created.
     Returns the path to the downloaded image file.
     """
     shortcode = get_instagram_shortcode(url)
     if not shortcode:
-        print("Could not extract Instagram shortcode.")
+        log.warning("Could not extract Instagram shortcode.")
         return None
 
-    L = instaloader.Instaloader(
-        download_pictures=True,
-        download_videos=False,
-        download_video_thumbnails=False,
-        download_geotags=False,
-        download_comments=False, 
-        save_metadata=False,
-        compress_json=False
-    )
-    
-    # Target directory for this specific download
-    target_dir = os.path.join(output_dir, shortcode)
-    
+    part_path = os.path.join(output_dir, f"{unique_id}.part")
     try:
-        print(f"Attempting Instaloader download for {shortcode}...")
-        post = instaloader.Post.from_shortcode(L.context, shortcode)
-        L.download_post(post, target=shortcode) # Downloads to 'shortcode' directory relative to cwd? 
-        # Instaloader downloads to a directory named `target`. 
-        # We need to control where that is. Instaloader uses cwd by default or `dirname_pattern`.
-        
-        # Actually Instaloader `download_post` 'target' argument is the directory name. 
-        # But we want to ensure it goes into our output_dir.
-        # Let's change cwd temporarily or move files? 
-        # Better: Instaloader saves to {target}/{filename}.
-        
-        # We can simulate the download manually if needed, but let's try the library method.
-        # If we pass target=os.path.join(output_dir, shortcode), it creates that dir.
-        
-        # Let's verify files.
-        # Instaloader saves .jpg and .txt (if caption).
-        
-        # Workaround: Use a unique target name in the output_dir
-        unique_target = os.path.join(output_dir, shortcode)
-        L.download_post(post, target=unique_target)
-        
-        # Find the .jpg file
-        files = glob.glob(os.path.join(unique_target, "*.jpg"))
-        if files:
-            return files[0]
-        
-        return None
+        log.info(f"Attempting Instaloader download for {shortcode}...")
+        with _instaloader_lock:
+            L = get_instaloader()
+            post = instaloader.Post.from_shortcode(L.context, shortcode)
+            image_url = post.url
+
+        # The CDN download uses an anonymous session, so it does not need the lock
+        # Streamed: closing the response returns (or drops) its connection
+        with L.context.get_raw(image_url) as resp, open(part_path, "wb") as f:
+            content_type = resp.headers.get("content-type", "")
+            ext = ".jpg"
+            if "png" in content_type:
+                ext = ".png"
+            if "webp" in content_type:
+                ext = ".webp"
+            shutil.copyfileobj(resp.raw, f)
+
+        if os.path.getsize(part_path) == 0:
+            return None
+        final_path = os.path.join(output_dir, f"{unique_id}{ext}")
+        os.replace(part_path, final_path)
+        return final_path
 
     except Exception as e:
-        print(f"Instaloader failed: {e}")
+        log.warning(f"Instaloader failed: {e}")
         return None
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
 
 def download_image(url: str, output_dir: str = "tmp_downloads_images") -> str:
     """
@@ -297,24 +328,21 @@ def download_image(url: str, output_dir: str = "tmp_downloads_images") -> str:
     unique_id = str(uuid.uuid4())
 
     # 0. Selenium Strategy (handles dynamic pages like Instagram/Reddit)
-    print("Trying Selenium headless render for dynamic page...")
-    selenium_path = fetch_image_via_selenium(url, output_dir, unique_id)
+    log.info("Trying Selenium headless render for dynamic page...")
+    with span("download.selenium"):
+        selenium_path = fetch_image_via_selenium(url, output_dir, unique_id)
     if selenium_path:
         return selenium_path
-    print("Selenium strategy did not yield an image; falling back.")
+    log.warning("Selenium strategy did not yield an image; falling back.")
     
     # 1. Instagram Strategy
     if "instagram.com" in url:
-        print("Detected Instagram URL, trying Instaloader...")
-        # Instaloader is tricky with paths, let's try a dedicated subdir
-        insta_path = download_instagram_image(url, output_dir)
+        log.info("Detected Instagram URL, trying Instaloader...")
+        with span("download.instaloader"):
+            insta_path = download_instagram_image(url, output_dir, unique_id)
         if insta_path:
-            # Move/Rename to our standard unique_id in the main dir for consistency
-            final_path = os.path.join(output_dir, f"{unique_id}.jpg")
-            os.rename(insta_path, final_path)
-            # Cleanup dir if empty? Instaloader leaves json/txt
-            return final_path
-        print("Instaloader failed, falling back to yt-dlp...")
+            return insta_path
+        log.warning("Instaloader failed, falling back to yt-dlp...")
 
     # 2. yt-dlp Strategy (Generic Social + Fallback)
     # We try to get the thumbnail or the image itself
@@ -331,7 +359,7 @@ def download_image(url: str, output_dir: str = "tmp_downloads_images") -> str:
     }
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts_thumb) as ydl:
+        with span("download.ytdlp_thumbnail"), yt_dlp.YoutubeDL(ydl_opts_thumb) as ydl:
             ydl.download([url])
             
         # Check for files
@@ -341,7 +369,7 @@ def download_image(url: str, output_dir: str = "tmp_downloads_images") -> str:
             return files[0]
             
     except Exception as e:
-        print(f"yt-dlp thumbnail strategy failed: {e}")
+        log.warning(f"yt-dlp thumbnail strategy failed: {e}")
 
     # Strategy 2b: Full download (if it's a direct image link served via html wrapper?)
     # or just normal yt-dlp download if 2a failed
@@ -352,36 +380,37 @@ def download_image(url: str, output_dir: str = "tmp_downloads_images") -> str:
     }
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts_full) as ydl:
+        with span("download.ytdlp"), yt_dlp.YoutubeDL(ydl_opts_full) as ydl:
             ydl.download([url])
         
         files = glob.glob(os.path.join(output_dir, f"{unique_id}.*"))
         if files and os.path.getsize(files[0]) > 0:
             return files[0]
     except Exception as e:
-        print(f"yt-dlp full download failed: {e}")
+        log.warning(f"yt-dlp full download failed: {e}")
 
     # 3. Direct Request Strategy (Last Resort)
     try:
-        print("Trying direct request...")
+        log.info("Trying direct request...")
         headers = {'User-Agent': 'Mozilla/5.0'}
-        resp = requests.get(url, headers=headers, stream=True, timeout=10)
-        resp.raise_for_status()
-        
-        content_type = resp.headers.get('content-type', '')
-        ext = ".jpg"
-        if "png" in content_type: ext = ".png"
-        if "webp" in content_type: ext = ".webp"
-        
-        final_path = os.path.join(output_dir, f"{unique_id}{ext}")
-        with open(final_path, 'wb') as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                f.write(chunk)
+        with span("download.direct"):
+            with requests.get(url, headers=headers, stream=True, timeout=10) as resp:
+                resp.raise_for_status()
+
+                content_type = resp.headers.get('content-type', '')
+                ext = ".jpg"
+                if "png" in content_type: ext = ".png"
+                if "webp" in content_type: ext = ".webp"
+
+                final_path = os.path.join(output_dir, f"{unique_id}{ext}")
+                with open(final_path, 'wb') as f:
+                    for chunk in resp.iter_content(chunk_size=8192):
+                        f.write(chunk)
         
         if os.path.getsize(final_path) > 0:
             return final_path
             
     except Exception as e:
-        print(f"Direct request failed: {e}")
+        log.warning(f"Direct request failed: {e}")
 
     return None
@@ -1,14 +1,19 @@
+import time
+_startup_t0 = time.perf_counter()
+
 import io
 import os
-import base64
-from io import BytesIO
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
 import uvicorn
 import numpy as np
 import tensorflow as tf
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import os
 
@@ -23,18 +28,28 @@ from tensorflow.keras.applications.resnet50 import preprocess_input
 # --- New Imports for URL Processing ---
 from pydantic import BaseModel
 from url_handler import detect_platform
-from downloader import download_image
+# downloader (Selenium, instaloader, yt-dlp, webdriver-manager) is imported on first use of /explain-url
 
 # --- New Import for API Integration ---
-import requests
+from remote_api import RemoteDeepfakeClient
+from metrics import instrument_app, Gauge, DOWNLOAD_BYTES, PREDICTIONS
+from tracing import setup_logging, install_tracing, span
+from profiling import install_profiling
+from admission import Lane, install_admission
+from uploads import UPLOAD_OPENAPI, receive_upload
+from explain_artifacts import ArtifactJanitor, artifact_url, install_artifacts, renderer, store_or_none
+from heatmap_render import HEATMAP_VARIANT, render_heatmap_overlay
+
+setup_logging()
+log = logging.getLogger(__name__)
 
 # -----------------------------
 # Debug / Runtime Info
 # -----------------------------
-print("RUNNING FILE:", os.path.abspath(__file__))
-print("TF VERSION:", tf.__version__)
-print("TF PATH:", tf.__file__)
-print("HAS tf.is_nan?", hasattr(tf, "is_nan"))
+log.debug("RUNNING FILE: %s", os.path.abspath(__file__))
+log.debug("TF VERSION: %s", tf.__version__)
+log.debug("TF PATH: %s", tf.__file__)
+log.debug("HAS tf.is_nan? %s", hasattr(tf, "is_nan"))
 
 # -----------------------------
 # Compatibility aliases (FIX)
@@ -46,8 +61,29 @@ if not hasattr(tf, "is_nan"):
 if not hasattr(tf, "is_inf"):
     tf.is_inf = tf.math.is_inf  # type: ignore[attr-defined]
 
+# -----------------------------
+# CPU threads
+# -----------------------------
+# Split the cores available to this process between the uvicorn workers on the node.
+# (The TF runtime is not fork-safe once initialised, so this backend is not pre-forked
+# like backend_video/serve.py; each worker keeps its own model.)
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+TF_NUM_THREADS = int(os.getenv("TF_NUM_THREADS", 0)) or max(
+    1, available_cpus() // max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+)
+tf.config.threading.set_intra_op_parallelism_threads(TF_NUM_THREADS)
+tf.config.threading.set_inter_op_parallelism_threads(min(2, TF_NUM_THREADS))
+
 # --- CONFIGURATION ---
 MODEL_WEIGHTS_FILENAME = "resnet50_model.h5"
+# Self-contained architecture + weights; written from the .h5 on first start if missing
+MODEL_ARTIFACT_FILENAME = os.getenv("MODEL_ARTIFACT", "resnet50_model.keras")
 INPUT_SHAPE = (180, 180)
 
 # --- API CONFIGURATION ---
@@ -55,9 +91,33 @@ INPUT_SHAPE = (180, 180)
 API_URL = os.getenv("API_URL")
 API_KEY = os.getenv("API_KEY")
 USE_API_FALLBACK = True  # Set to False to disable API
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "8"))  # Total budget per call, including the hedge
+API_HEDGE_DELAY = float(os.getenv("API_HEDGE_DELAY", "2"))  # Fire a backup request after this long
+API_BREAKER_FAILURES = int(os.getenv("API_BREAKER_FAILURES", "3"))
+API_BREAKER_RESET = float(os.getenv("API_BREAKER_RESET", "30"))
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "600"))
+API_MAX_SIDE = int(os.getenv("API_MAX_SIDE", "1024"))  # Uploads are downscaled to this before sending
+API_BATCH_WINDOW = float(os.getenv("API_BATCH_WINDOW", "0.02"))  # Seconds to wait for more images per call
+API_MAX_BATCH = int(os.getenv("API_MAX_BATCH", "8"))
+# Uploads are read into memory as they stream in (see uploads.py), never to disk
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+
+remote_client = RemoteDeepfakeClient(
+    API_URL,
+    API_KEY,
+    timeout=API_TIMEOUT,
+    hedge_delay=API_HEDGE_DELAY,
+    failure_threshold=API_BREAKER_FAILURES,
+    reset_timeout=API_BREAKER_RESET,
+    cache_ttl=API_CACHE_TTL,
+    max_side=API_MAX_SIDE,
+    batch_window=API_BATCH_WINDOW,
+    max_batch=API_MAX_BATCH,
+)
 
 # Global variable to hold the loaded model
 model = None
+startup_timings = {}
 
 
 def get_gradcam_heatmap(img_array, model):
@@ -120,34 +180,37 @@ def explain_decision(heatmap):
     return dominant_region, scores
 
 
-def generate_heatmap_image(img_array, heatmap):
-    """Generates a base64 encoded heatmap overlay image."""
-    import matplotlib.cm as cm
+# Explainability images are rendered when the client fetches them (see explain_artifacts.py)
+@renderer("heatmap", variant=HEATMAP_VARIANT)
+def render_heatmap(inputs):
+    """Grad-CAM overlay on the original image (see heatmap_render.py)."""
+    return render_heatmap_overlay(inputs["image"].tobytes(), inputs["heatmap"])
 
-    # Original image
-    img = keras_image.array_to_img(img_array[0])
 
-    # Heatmap to color
-    heatmap_uint8 = np.uint8(255 * heatmap)
-    jet = cm.get_cmap("jet")
-    jet_colors = jet(np.arange(256))[:, :3]
-    jet_heatmap = jet_colors[heatmap_uint8]
-    jet_heatmap = keras_image.array_to_img(jet_heatmap)
-    jet_heatmap = jet_heatmap.resize((img.size[0], img.size[1]))
-    jet_heatmap = keras_image.img_to_array(jet_heatmap)
+@renderer("original")
+def render_original(inputs):
+    """The downloaded image, served as fetched."""
+    return inputs["image"].tobytes()
 
-    # Overlay
-    superimposed = jet_heatmap * 0.4 + keras_image.img_to_array(img)
-    superimposed = keras_image.array_to_img(superimposed)
 
-    # To base64
-    buffer = BytesIO()
-    superimposed.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+def heatmap_artifact(image_bytes: bytes, heatmap) -> dict:
+    """
+    Stores the Grad-CAM inputs and returns the response fields that point at the overlay.
+    Both fields are None if the artifact could not be stored; the analysis stands without it.
+    """
+    with span("heatmap_store"):
+        artifact_id = store_or_none("heatmap", image=image_bytes, heatmap=np.asarray(heatmap, dtype=np.float32))
+    return {"heatmap_artifact_id": artifact_id,
+            "heatmap_image_url": artifact_url(artifact_id) if artifact_id else None}
 
 
-def get_api_prediction(image_bytes: bytes) -> tuple:
+def original_artifact_url(image_bytes: bytes):
+    """URL of the image itself, for showing next to the heatmap; None if it could not be stored."""
+    artifact_id = store_or_none("original", image=image_bytes)
+    return artifact_url(artifact_id) if artifact_id else None
+
+
+async def get_api_prediction(image_bytes: bytes, digest: str = None) -> tuple:
     """
     Calls NVIDIA Hive API for deepfake image detection.
     Returns (Label, Confidence) or (None, None) if API fails.
@@ -156,54 +219,108 @@ def get_api_prediction(image_bytes: bytes) -> tuple:
     """
     if not USE_API_FALLBACK:
         return None, None
-    
+    with span("remote_api"):
+        return await remote_client.predict(image_bytes, digest=digest)
+
+
+async def classify_image(contents: bytes, digest: str = None) -> dict:
+    """
+    Runs local inference and the remote API call concurrently, then applies the
+    decision logic: if the API is available and disagrees, use the API; else use the model.
+    `digest` is the SHA-256 of contents when already known (streamed uploads).
+    """
+    api_task = asyncio.create_task(get_api_prediction(contents, digest))
     try:
-        # Encode image to base64
-        image_b64 = base64.b64encode(image_bytes).decode()
-        
-        # Since images are small (180x180), use direct base64
-        payload = {
-            "input": [f"data:image/png;base64,{image_b64}"]
-        }
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {API_KEY}",
-            "Accept": "application/json",
-        }
-        
-        response = requests.post(API_URL, headers=headers, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            result = response.json()
-            # Response format: {"data": [{"bounding_boxes": [{"is_deepfake": 0.999}, ...], "status": "SUCCESS"}]}
-            data = result.get("data", [])
-            if data and data[0].get("status") == "SUCCESS":
-                bounding_boxes = data[0].get("bounding_boxes", [])
-                if bounding_boxes:
-                    # Aggregate is_deepfake scores
-                    # API returns 'is_deepfake' score [0, 1]. High means Deepfake.
-                    deepfake_scores = [box.get("is_deepfake", 0) for box in bounding_boxes]
-                    avg_score = sum(deepfake_scores) / len(deepfake_scores)
-                    
-                    if avg_score > 0.5:
-                        return "Deepfake", avg_score
-                    else:
-                        # If average deepfake score is low, it's Real.
-                        # Confidence for Real is 1 - deepfake_score
-                        return "Real", 1.0 - avg_score
-                else:
-                    # No faces detected. Default to Real (or could be 'Unknown')
-                    # We'll assume Real with lower confidence or just None?
-                    # Let's say Real with moderate confidence if no face found but image processed.
-                    return "Real", 0.6
-        
-        print(f"API call failed: {response.status_code} - {response.text}")
-        return None, None
-    
+        # Keras calls block, so keep them off the event loop while the API call is in flight
+        with span("preprocess"):
+            processed_image = await run_in_threadpool(transform_image, contents)
+        with span("inference"):
+            prediction = await run_in_threadpool(model.predict, processed_image, verbose=0)
+    except Exception:
+        api_task.cancel()
+        raise
+    score = float(prediction[0][0])
+
+    # NOTE: Verify your training label mapping.
+    # Current logic assumes score>0.5 => Real. Adjust if your training was opposite.
+    if score > 0.5:
+        model_label = "Real"
+        model_confidence = score
+    else:
+        model_label = "Deepfake"
+        model_confidence = 1.0 - score
+
+    api_label, api_confidence = await api_task
+
+    # Let's say if Model says X and API says Y, we trust API (it's NVIDIA!)
+    if api_label and api_label != model_label:
+        final_label = api_label
+        final_confidence = api_confidence  # Use API confidence
+        used_api = True
+    elif api_label and api_label == model_label:
+        final_label = model_label
+        final_confidence = max(model_confidence, api_confidence)
+        used_api = True # We effectively used it to confirm
+    else:
+        final_label = model_label
+        final_confidence = model_confidence
+        used_api = False
+
+    PREDICTIONS.inc(label=final_label)
+    return {
+        "processed_image": processed_image,
+        "score": score,
+        "label": final_label,
+        "confidence": final_confidence,
+        "used_api": used_api,
+        "api_label": api_label,
+    }
+
+
+def build_model():
+    """
+    Builds the classifier architecture without pretrained ImageNet weights;
+    every weight is overwritten by the trained weights file anyway.
+    """
+    base_model = ResNet50(weights=None, include_top=False, input_shape=(180, 180, 3))
+    base_model.trainable = False
+
+    return Sequential([
+        base_model,
+        GlobalAveragePooling2D(),
+        Dense(384, activation="relu"),
+        Dropout(0.5),
+        Dense(1, activation="sigmoid"),
+    ])
+
+
+def _timed(phase, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        startup_timings[phase] = round(time.perf_counter() - start, 3)
+
+
+def load_model():
+    """
+    Loads the serialized artifact if present; otherwise builds the model,
+    loads MODEL_WEIGHTS_FILENAME and saves the artifact for the next start.
+    """
+    if os.path.exists(MODEL_ARTIFACT_FILENAME):
+        log.info(f"🔄 Loading model artifact from: {MODEL_ARTIFACT_FILENAME}...")
+        return _timed("artifact_load", tf.keras.models.load_model, MODEL_ARTIFACT_FILENAME, compile=False)
+
+    log.info(f"🔄 Loading model weights from: {MODEL_WEIGHTS_FILENAME}...")
+    net = _timed("model_build", build_model)
+    _timed("weights_load", net.load_weights, MODEL_WEIGHTS_FILENAME)
+    try:
+        _timed("artifact_save", net.save, MODEL_ARTIFACT_FILENAME)
+        log.info(f"✓ Saved model artifact to {MODEL_ARTIFACT_FILENAME}")
     except Exception as e:
-        print(f"API error: {e}")
-        return None, None
+        # Read-only image: keep serving, the next start just repeats the h5 path
+        log.warning(f"⚠️ Could not save model artifact: {e}")
+    return net
 
 
 @asynccontextmanager
@@ -212,34 +329,36 @@ async def lifespan(app: FastAPI):
     Loads the Keras model when the server starts.
     """
     global model
+    startup_timings["imports"] = round(time.perf_counter() - _startup_t0, 3)
     try:
-        print(f"🔄 Loading model weights from: {MODEL_WEIGHTS_FILENAME}...")
-
-        base_model = ResNet50(weights="imagenet", include_top=False, input_shape=(180, 180, 3))
-        base_model.trainable = False
-
-        model = Sequential([
-            base_model,
-            GlobalAveragePooling2D(),
-            Dense(384, activation="relu"),
-            Dropout(0.5),
-            Dense(1, activation="sigmoid"),
-        ])
-
-        model.load_weights(MODEL_WEIGHTS_FILENAME)
-        print("✅ Model loaded successfully!")
+        model = load_model()
+        log.info("✅ Model loaded successfully!")
 
     except Exception as e:
-        print(f"❌ CRITICAL ERROR: Could not load model. {e}")
-        print(f"Please ensure '{MODEL_WEIGHTS_FILENAME}' is a valid weights file in this directory.")
-
+        log.error(f"❌ CRITICAL ERROR: Could not load model. {e}")
+        log.error(f"Please ensure '{MODEL_WEIGHTS_FILENAME}' is a valid weights file in this directory.")
+
+    await remote_client.start()
+    artifact_janitor = ArtifactJanitor()
+    artifact_janitor.start()
+    startup_timings["ready_after"] = round(time.perf_counter() - _startup_t0, 3)
+    phases = " | ".join(f"{k} {v:.2f}s" for k, v in startup_timings.items())
+    log.info(f"⏱ Startup: {phases}")
     yield
+    artifact_janitor.stop()
+    await remote_client.close()
     model = None
 
 
 # Initialize the App (debug=True to show full stack traces during development)
 app = FastAPI(title="Deepfake Detection API", lifespan=lifespan, debug=True)
 
+# Uploads only wait for the model; URL requests download first, so they get their own lane
+install_admission(app, [
+    Lane("upload", ["/explain"], slots=4, queue=32, max_wait=10, service_time=1),
+    Lane("url", ["/explain-url"], slots=2, queue=16, max_wait=30, service_time=5),
+])
+
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
     CORSMiddleware,
@@ -249,6 +368,32 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+
+def start_tf_profile(out_dir):
+    """Op-level TF profiler for one profiled request (see profiling.py); the trace opens in TensorBoard."""
+    tf.profiler.experimental.start(os.path.join(out_dir, "tf"))
+    return True
+
+
+def stop_tf_profile(handle, out_dir):
+    tf.profiler.experimental.stop()
+
+
+install_artifacts(app)
+instrument_app(app)
+install_profiling(app, op_profiler=(start_tf_profile, stop_tf_profile))
+install_tracing(app)
+
+# Remote API client state, read at scrape time
+REMOTE_CACHE_HIT_RATIO = Gauge("remote_api_cache_hit_ratio", "Share of remote API lookups served from cache")
+REMOTE_CACHE_HIT_RATIO.set_function(
+    lambda: remote_client.cache.hits / max(1, remote_client.cache.hits + remote_client.cache.misses)
+)
+REMOTE_PENDING = Gauge("remote_api_pending_images", "Images waiting for the next remote API batch")
+REMOTE_PENDING.set_function(lambda: remote_client.pending_count)
+REMOTE_BREAKER_OPEN = Gauge("remote_api_breaker_open", "1 while the remote API circuit breaker is open")
+REMOTE_BREAKER_OPEN.set_function(lambda: int(remote_client.breaker.state == "open"))
+
 class ImageURLRequest(BaseModel):
     url: str
 
@@ -271,60 +416,35 @@ def transform_image(image_bytes: bytes) -> np.ndarray:
     return img_array
 
 
-@app.post("/explain")
-async def explain(file: UploadFile = File(...)):
+@app.post("/explain", openapi_extra=UPLOAD_OPENAPI)
+async def explain(request: Request):
     """
     Endpoint to explain the prediction with Grad-CAM heatmap and text explanation.
     """
     if model is None:
         raise HTTPException(status_code=503, detail="Model is not loaded. Check server logs.")
 
-    if not (file.content_type or "").startswith("image/"):
+    upload = await receive_upload(request, max_bytes=MAX_IMAGE_BYTES, memory_limit=MAX_IMAGE_BYTES)
+    if not upload.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File provided is not an image.")
 
     try:
-        contents = await file.read()
-        processed_image = transform_image(contents)
-
-        prediction = model.predict(processed_image)
-        score = float(prediction[0][0])
-
-        # NOTE: Verify your training label mapping.
-        # Current logic assumes score>0.5 => Real. Adjust if your training was opposite.
-        if score > 0.5:
-            model_label = "Real"
-            model_confidence = score
-        else:
-            model_label = "Deepfake"
-            model_confidence = 1.0 - score
-
-        # Get API prediction
-        api_label, api_confidence = get_api_prediction(contents)
-        
-        # Decision logic: If API available and disagrees, use API; else use model
-        # Or if we just want to verify:
-        # Let's say if Model says X and API says Y, we trust API (it's NVIDIA!)
-        if api_label and api_label != model_label:
-            final_label = api_label
-            final_confidence = api_confidence  # Use API confidence
-            used_api = True
-        elif api_label and api_label == model_label:
-            final_label = model_label
-            # If both agree, boost confidence? Or just keep model's.
-            # Let's keep model's, but mark as confirmed?
-            final_confidence = max(model_confidence, api_confidence)
-            used_api = True # We effectively used it to confirm
-        else:
-            final_label = model_label
-            final_confidence = model_confidence
-            used_api = False
-
-        label = final_label
-        confidence = final_confidence
-
-        heatmap = get_gradcam_heatmap(processed_image, model)
+        contents = upload.data
+        result = await classify_image(contents, upload.sha256)
+
+        processed_image = result["processed_image"]
+        score = result["score"]
+        label = result["label"]
+        confidence = result["confidence"]
+        used_api = result["used_api"]
+        api_label = result["api_label"]
+
+        # The gradient pass blocks for as long as inference; keep it off the event loop too
+        with span("gradcam"):
+            heatmap = await run_in_threadpool(get_gradcam_heatmap, processed_image, model)
         dominant_region, region_scores = explain_decision(heatmap)
-        heatmap_image = generate_heatmap_image(processed_image, heatmap)
+        # Hashing and writing a 20 MB upload is too slow for the event loop
+        heatmap_fields = await run_in_threadpool(heatmap_artifact, contents, heatmap)
 
         region_scores = {k: float(v) for k, v in region_scores.items()}
 
@@ -353,23 +473,34 @@ async def explain(file: UploadFile = File(...)):
             explanation += "The model detected natural skin textures, consistent lighting, and realistic facial features."
 
         return {
-            "filename": file.filename,
+            "filename": upload.filename,
             "prediction": label,
             "confidence_percentage": f"{confidence * 100:.2f}%",
             "raw_score": float(score),
             "dominant_focus_region": dominant_region,
             "region_scores": region_scores,
             "explanation": explanation,
-            "heatmap_image_base64": heatmap_image,
+            **heatmap_fields,
             "used_api_fallback": used_api,
             "api_prediction": api_label,
         }
 
     except Exception as e:
-        print(f"Error processing image: {e}")
+        log.error(f"Error processing image: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def fetch_image(url: str) -> str:
+    """Downloads an image URL into tmp_downloads_images and returns the file path."""
+    from downloader import download_image
+    return download_image(url, output_dir="tmp_downloads_images")
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
 @app.post("/explain-url")
 async def explain_url_endpoint(payload: ImageURLRequest):
     """
@@ -379,60 +510,41 @@ async def explain_url_endpoint(payload: ImageURLRequest):
         raise HTTPException(status_code=503, detail="Model is not loaded.")
 
     url = payload.url
-    print(f"Received URL for analysis: {url}")
+    log.info(f"Received URL for analysis: {url}")
     
     # Detect platform (optional logging)
     platform = detect_platform(url)
-    print(f"Detected platform: {platform}")
+    log.info(f"Detected platform: {platform}")
 
     temp_file_path = None
     try:
-        # Download image
-        temp_file_path = download_image(url, output_dir="tmp_downloads_images")
+        # Download image (blocking: Selenium, yt-dlp and the downloader import itself run in the threadpool)
+        with span("download"):
+            temp_file_path = await run_in_threadpool(fetch_image, url)
         
         if not temp_file_path or not os.path.exists(temp_file_path):
             raise HTTPException(status_code=400, detail="Failed to download image from URL.")
+        DOWNLOAD_BYTES.inc(os.path.getsize(temp_file_path), platform=platform, method="full")
 
         # Read file contents
-        with open(temp_file_path, "rb") as f:
-            contents = f.read()
+        contents = await run_in_threadpool(read_file, temp_file_path)
 
         # --- Re-use existing logic ---
-        processed_image = transform_image(contents)
-
-        prediction = model.predict(processed_image)
-        score = float(prediction[0][0])
-
-        if score > 0.5:
-            model_label = "Real"
-            model_confidence = score
-        else:
-            model_label = "Deepfake"
-            model_confidence = 1.0 - score
-
-        # Get API prediction
-        api_label, api_confidence = get_api_prediction(contents)
-        
-        # Decision logic
-        if api_label and api_label != model_label:
-            final_label = api_label
-            final_confidence = api_confidence
-            used_api = True
-        elif api_label and api_label == model_label:
-            final_label = model_label
-            final_confidence = max(model_confidence, api_confidence)
-            used_api = True
-        else:
-            final_label = model_label
-            final_confidence = model_confidence
-            used_api = False
-
-        label = final_label
-        confidence = final_confidence
-
-        heatmap = get_gradcam_heatmap(processed_image, model)
+        result = await classify_image(contents)
+
+        processed_image = result["processed_image"]
+        score = result["score"]
+        label = result["label"]
+        confidence = result["confidence"]
+        used_api = result["used_api"]
+        api_label = result["api_label"]
+
+        # The gradient pass blocks for as long as inference; keep it off the event loop too
+        with span("gradcam"):
+            heatmap = await run_in_threadpool(get_gradcam_heatmap, processed_image, model)
         dominant_region, region_scores = explain_decision(heatmap)
-        heatmap_image = generate_heatmap_image(processed_image, heatmap)
+        # Hashing and writing a 20 MB upload is too slow for the event loop
+        heatmap_fields = await run_in_threadpool(heatmap_artifact, contents, heatmap)
 
         region_scores = {k: float(v) for k, v in region_scores.items()}
 
@@ -460,14 +572,8 @@ async def explain_url_endpoint(payload: ImageURLRequest):
             )
             explanation += "The model detected natural features."
 
-        # Convert original image to base64 for frontend display
-        original_image_base64 = ""
-        try:
-            with open(temp_file_path, "rb") as f:
-                original_image_base64 = base64.b64encode(f.read()).decode()
-                original_image_base64 = f"data:image/jpeg;base64,{original_image_base64}"
-        except Exception as e:
-            print(f"Could not convert image to base64: {e}")
+        # The frontend shows the downloaded image next to the heatmap
+        original_image_url = await run_in_threadpool(original_artifact_url, contents)
 
         return {
             "filename": url,
@@ -477,8 +583,8 @@ async def explain_url_endpoint(payload: ImageURLRequest):
             "dominant_focus_region": dominant_region,
             "region_scores": region_scores,
             "explanation": explanation,
-            "heatmap_image_base64": heatmap_image,
-            "original_image_base64": original_image_base64,
+            **heatmap_fields,
+            "original_image_url": original_image_url,
             "used_api_fallback": used_api,
             "api_prediction": api_label,
         }
@@ -486,7 +592,7 @@ async def explain_url_endpoint(payload: ImageURLRequest):
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Error processing URL: {e}")
+        log.error(f"Error processing URL: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
@@ -506,6 +612,14 @@ def home():
     }
 
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 with startup-phase timings once the model is loaded, 503 otherwise."""
+    if model is None:
+        return JSONResponse(status_code=503, content={"status": "not loaded", "startup_timings": startup_timings})
+    return {"status": "ready", "startup_timings": startup_timings}
+
+
 if __name__ == "__main__":
     # Use port 8001 for image backend (video backend uses 8000)
     uvicorn.run("main:app", host="127.0.0.1", port=8001, reload=True)
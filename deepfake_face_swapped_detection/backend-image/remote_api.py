@@ -0,0 +1,338 @@
+"""
+Async client for the remote (NVIDIA Hive) deepfake image detection API.
+
+- One pooled httpx.AsyncClient per process instead of a new connection per call
+- Hedged requests: if the first attempt has not answered after HEDGE_DELAY,
+  a second identical request is fired and whichever answers first wins
+- A circuit breaker skips the call entirely while the API keeps failing
+- Results are cached by SHA-256 of the image bytes
+- Images are downscaled and re-encoded before upload, and concurrent calls
+  arriving within a short window are sent together as one multi-input request
+"""
+import io
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+import httpx
+from PIL import Image, ImageOps
+
+log = logging.getLogger(__name__)
+
+# Formats the API accepts as-is when they are already small enough
+PASSTHROUGH_MIME = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def prepare_image(image_bytes: bytes, max_side: int = 1024, max_bytes: int = 512 * 1024,
+                  quality: int = 85) -> tuple:
+    """
+    Bound the size of an image before it is uploaded.
+
+    Args:
+        image_bytes: Original upload
+        max_side: Longest side in pixels after downscaling
+        max_bytes: Images already within max_side and this size are sent unchanged
+        quality: JPEG quality for re-encoded images
+
+    Returns:
+        tuple: (bytes, mime type) to send
+    """
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        mime = PASSTHROUGH_MIME.get(img.format)
+        if mime and max(img.size) <= max_side and len(image_bytes) <= max_bytes:
+            return image_bytes, mime
+
+        if img.format == "JPEG":
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full resolution
+            img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue(), "image/jpeg"
+    except Exception as e:
+        log.warning(f"⚠️ Could not re-encode image for API, sending original: {e}")
+        return image_bytes, "image/png"
+
+
+def to_data_uri(image_bytes: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(image_bytes).decode()}"
+
+
+def build_payload(data_uris: list) -> dict:
+    """Wraps one or more data URIs in the API's {"input": [...]} schema."""
+    return {"input": list(data_uris)}
+
+
+def parse_api_entry(entry: dict) -> tuple:
+    """
+    Turns one element of a Hive response's "data" list into (Label, Confidence).
+    Entry format: {"bounding_boxes": [{"is_deepfake": 0.999}, ...], "status": "SUCCESS"}
+    Returns (None, None) if the entry does not contain a usable result.
+    """
+    if entry and entry.get("status") == "SUCCESS":
+        bounding_boxes = entry.get("bounding_boxes", [])
+        if bounding_boxes:
+            # Aggregate is_deepfake scores
+            # API returns 'is_deepfake' score [0, 1]. High means Deepfake.
+            deepfake_scores = [box.get("is_deepfake", 0) for box in bounding_boxes]
+            avg_score = sum(deepfake_scores) / len(deepfake_scores)
+
+            if avg_score > 0.5:
+                return "Deepfake", avg_score
+            # If average deepfake score is low, it's Real.
+            # Confidence for Real is 1 - deepfake_score
+            return "Real", 1.0 - avg_score
+        # No faces detected but the image was processed: Real with moderate confidence
+        return "Real", 0.6
+    return None, None
+
+
+def parse_api_response(result: dict, count: int) -> list:
+    """
+    Splits a multi-input response into one (Label, Confidence) per input, in input order.
+    Missing entries come back as (None, None).
+    """
+    data = result.get("data", [])
+    return [parse_api_entry(data[i]) if i < len(data) else (None, None) for i in range(count)]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and stays open for
+    `reset_timeout` seconds. After that a single trial call is let through
+    (half-open); its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def abandon_trial(self):
+        """The half-open trial ended without an outcome (its caller was cancelled): let the next call try."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class ResultCache:
+    """Small LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RemoteDeepfakeClient:
+    """
+    Pooled, hedged, circuit-broken, cached and batching client for the remote API.
+    Call start() once on startup and close() on shutdown.
+    """
+
+    def __init__(self, url: str, api_key: str, timeout: float = 8.0, hedge_delay: float = 2.0,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0,
+                 cache_entries: int = 512, cache_ttl: float = 600.0, max_connections: int = 20,
+                 max_side: int = 1024, batch_window: float = 0.02, max_batch: int = 8):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.max_connections = max_connections
+        self.max_side = max_side
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.cache = ResultCache(cache_entries, cache_ttl)
+        self._client = None
+        # Callers waiting for the next batch: (data URI, future)
+        self._pending = []
+        self._flush_handle = None
+        self._batch_tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url and self.api_key)
+
+    @property
+    def pending_count(self) -> int:
+        """Images waiting for the next batch to be sent."""
+        return len(self._pending)
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 3.0)),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Accept": "application/json",
+                },
+            )
+
+    async def close(self):
+        self._flush()
+        if self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _post(self, payload: dict) -> dict:
+        response = await self._client.post(self.url, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"API call failed: {response.status_code} - {response.text[:200]}")
+        return response.json()
+
+    async def _hedged_post(self, payload: dict) -> dict:
+        """Fire a backup request if the first is slow; return the first success."""
+        deadline = time.monotonic() + self.timeout
+        tasks = [asyncio.create_task(self._post(payload))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if not done:
+                tasks.append(asyncio.create_task(self._post(payload)))
+
+            last_error = None
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error or asyncio.TimeoutError("Remote API timed out")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _flush(self):
+        """Send everything queued so far as one request."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send_batch(self, batch: list):
+        try:
+            result = await self._hedged_post(build_payload(uri for uri, _ in batch))
+            results = parse_api_response(result, len(batch))
+        except Exception as e:
+            self.breaker.record_failure()
+            log.error(f"API error: {e or type(e).__name__} (batch of {len(batch)}, breaker {self.breaker.state})")
+            results = [(None, None)] * len(batch)
+        else:
+            self.breaker.record_success()
+
+        for (_, future), item in zip(batch, results):
+            # Callers that gave up (cancelled requests) no longer need their result
+            if not future.done():
+                future.set_result(item)
+
+    async def _submit(self, data_uri: str) -> tuple:
+        """Queue one image for the next batch and wait for its own result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((data_uri, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    async def predict(self, image_bytes: bytes, digest: str = None) -> tuple:
+        """
+        Returns (Label, Confidence) or (None, None) if the API is disabled,
+        the breaker is open, or the call fails. `digest`, the SHA-256 hex of
+        image_bytes if the caller already has it, saves hashing them again.
+        """
+        if not self.enabled or self._client is None:
+            return None, None
+
+        key = digest or hashlib.sha256(image_bytes).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            return None, None
+
+        # Once queued, the batch records the outcome even if this caller goes away
+        submitted = False
+        try:
+            # Decoding and resizing a multi-MB upload is CPU work; keep it off the event loop
+            payload_bytes, mime = await asyncio.to_thread(prepare_image, image_bytes, self.max_side)
+            submitted = True
+            result = await self._submit(to_data_uri(payload_bytes, mime))
+        finally:
+            if trial and not submitted:
+                # Cancelled before the trial was sent (classify_image cancels the API call when
+                # inference fails); without this the breaker would refuse every call from now on
+                self.breaker.abandon_trial()
+
+        if result[0] is not None:
+            self.cache.put(key, result)
+        return result
@@ -34,8 +34,9 @@ try:
         print(f"Dominant Region: {data['dominant_focus_region']}")
         print(f"\nExplanation:\n{data['explanation']}")
         
-        # Don't print the huge base64 string
-        print(f"\n(Heatmap image returned: {len(data['heatmap_image_base64'])} chars)")
+        # The heatmap is rendered when first fetched
+        heatmap = requests.get(url.rsplit("/", 1)[0] + data['heatmap_image_url'])
+        print(f"\n(Heatmap image: {heatmap.headers.get('content-type')}, {len(heatmap.content)} bytes)")
     else:
         print(f"\n❌ Error {response.status_code}: {response.text}")
 
@@ -0,0 +1,15 @@
+"""
+Tests for one backend. Run from the backend's directory:
+
+    python -m pytest tests
+
+The modules are imported flat (as the server does), so each backend's tests
+run in their own process. This file is shared by both backends
+(benchmarks/check_shared.py).
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "..", "benchmarks"))
@@ -0,0 +1,145 @@
+import io
+import time
+import asyncio
+
+import pytest
+from PIL import Image
+
+from mock_hive_api import start_mock_api
+from remote_api import CircuitBreaker, RemoteDeepfakeClient
+
+
+def jpeg_bytes(seed: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (seed % 256, 80, 160)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def mock_api():
+    server = start_mock_api()
+    yield server
+    server.shutdown()
+
+
+def run_client(server, calls, **kwargs):
+    """Runs calls(client) against the mock API with a started client."""
+    async def main():
+        client = RemoteDeepfakeClient(server.url, "test-key", hedge_delay=5.0, **kwargs)
+        await client.start()
+        try:
+            return await calls(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def test_breaker_transitions(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("remote_api.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 10
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one trial at a time
+
+    # A failed trial re-opens at once, without waiting for the threshold again
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_open_breaker_skips_the_api(mock_api):
+    mock_api.failure_rate = 1.0
+
+    async def calls(client):
+        results = [await client.predict(jpeg_bytes(i)) for i in range(5)]
+        return results, client.breaker.state
+
+    results, state = run_client(mock_api, calls, failure_threshold=3, reset_timeout=60)
+    assert results == [(None, None)] * 5
+    assert state == "open"
+    # The last two calls never reached the API
+    assert mock_api.requests == 3
+
+
+def test_cache_hits_skip_the_api(mock_api):
+    image = jpeg_bytes(1)
+
+    async def calls(client):
+        first = await client.predict(image)
+        second = await client.predict(image)
+        return first, second, client.cache.hits
+
+    first, second, hits = run_client(mock_api, calls)
+    assert first == second
+    assert first[0] == "Deepfake" and first[1] == pytest.approx(0.9)
+    assert hits == 1
+    assert mock_api.requests == 1
+
+
+def test_failures_are_not_cached(mock_api):
+    mock_api.failure_rate = 1.0
+    image = jpeg_bytes(2)
+
+    async def calls(client):
+        failed = await client.predict(image)
+        mock_api.failure_rate = 0.0
+        return failed, await client.predict(image)
+
+    failed, recovered = run_client(mock_api, calls)
+    assert failed == (None, None)
+    assert recovered[0] == "Deepfake"
+    assert mock_api.requests == 2
+
+
+def test_concurrent_calls_share_one_request(mock_api):
+    async def calls(client):
+        tasks = [asyncio.create_task(client.predict(jpeg_bytes(i))) for i in range(4)]
+        for _ in range(40):
+            if client.pending_count == 4:
+                break
+            await asyncio.sleep(0.005)
+        assert client.pending_count == 4
+        results = await asyncio.gather(*tasks)
+        assert client.pending_count == 0
+        return results
+
+    results = run_client(mock_api, calls, batch_window=0.5)
+    assert all(label == "Deepfake" for label, _ in results)
+    assert mock_api.requests == 1
+    assert mock_api.images == 4
+
+
+def test_cancelled_half_open_trial_frees_the_breaker(mock_api, monkeypatch):
+    def slow_prepare(image_bytes, max_side):
+        time.sleep(0.2)
+        return image_bytes, "image/jpeg"
+    monkeypatch.setattr("remote_api.prepare_image", slow_prepare)
+
+    async def calls(client):
+        # Open long enough ago to be half-open
+        client.breaker.failures = client.breaker.failure_threshold
+        client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout
+        trial = asyncio.create_task(client.predict(jpeg_bytes(3)))
+        await asyncio.sleep(0.05)
+        assert client.breaker.trial_in_flight
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        # The next call gets to be the trial, and its success closes the breaker
+        return await client.predict(jpeg_bytes(4)), client.breaker.state
+
+    result, state = run_client(mock_api, calls)
+    assert result[0] == "Deepfake"
+    assert state == "closed"
@@ -0,0 +1,227 @@
+"""
+Per-request stage tracing and structured logging.
+
+Every HTTP request gets a request ID (the caller's X-Request-ID, or a new
+one) held in a context variable, so spans opened anywhere below the endpoint
+(downloader, preprocessing, inference) attach to the right request without
+threading it through function arguments. When the request finishes, its spans
+are written as one JSON line to a size-rotated trace file and, if enabled,
+summarised in a Server-Timing response header. Log records carry the same
+request ID.
+
+Each process writes its own trace file, TRACE_FILE with the PID before the
+extension (logs/traces.1234.jsonl): RotatingFileHandler is not safe across
+processes, and forked workers rotating one shared file lose spans.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+
+from metrics import STAGE_LATENCY
+
+TRACE_FILE = os.environ.get("TRACE_FILE", "logs/traces.jsonl")  # Empty disables the trace file
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", 10 * 1024 * 1024))
+TRACE_BACKUPS = int(os.environ.get("TRACE_BACKUPS", 5))
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # "json" for one JSON object per line
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_current = contextvars.ContextVar("trace", default=None)
+_trace_logger = None
+_trace_pid = None
+
+
+class Trace:
+    __slots__ = ("request_id", "start", "spans")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans = []
+
+
+def current_request_id() -> str:
+    trace = _current.get()
+    return trace.request_id if trace is not None else "-"
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Times the enclosed block as stage `name`: recorded in the current
+    request's trace (if any) and in the stage_duration_seconds histogram.
+    """
+    trace = _current.get()
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.observe(duration, stage=name)
+        if trace is not None:
+            entry = {
+                "name": name,
+                "start_ms": round((start - trace.start) * 1000, 2),
+                "duration_ms": round(duration * 1000, 2),
+            }
+            if error:
+                entry["error"] = True
+            entry.update(attrs)
+            trace.spans.append(entry)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = current_request_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging():
+    """Leveled logging to stderr with the request ID on every record (LOG_LEVEL, LOG_FORMAT)."""
+    root = logging.getLogger()
+    if any(isinstance(f, RequestIdFilter) for h in root.handlers for f in h.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    # One INFO line per outgoing request is noise next to the trace file
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def trace_file_path(pid: int = None) -> str:
+    """This process's trace file: TRACE_FILE with the PID before the extension."""
+    root, ext = os.path.splitext(TRACE_FILE)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def _get_trace_logger():
+    global _trace_logger, _trace_pid
+    if not TRACE_FILE:
+        return None
+    # Also re-opened after a fork, so a worker never writes or rotates its parent's file
+    if _trace_logger is None or _trace_pid != os.getpid():
+        path = trace_file_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger = logging.getLogger("trace")
+        for inherited in list(trace_logger.handlers):
+            trace_logger.removeHandler(inherited)
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
+        _trace_logger, _trace_pid = trace_logger, os.getpid()
+    return _trace_logger
+
+
+def _server_timing(trace: Trace) -> str:
+    totals = {}
+    for entry in trace.spans:
+        totals[entry["name"]] = totals.get(entry["name"], 0.0) + entry["duration_ms"]
+    parts = [f"{name.replace('.', '-')};dur={ms:.1f}" for name, ms in totals.items()]
+    parts.append(f"total;dur={(time.perf_counter() - trace.start) * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _write_trace(trace: Trace, method: str, path: str, status: int):
+    trace_logger = _get_trace_logger()
+    if trace_logger is not None and trace.spans:
+        trace_logger.info(json.dumps({
+            "ts": time.time(),
+            "request_id": trace.request_id,
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - trace.start) * 1000, 2),
+            "spans": sorted(trace.spans, key=lambda s: s["start_ms"]),
+        }))
+
+
+@contextmanager
+def background_trace(request_id: str, name: str):
+    """
+    Trace for work that runs outside an HTTP request (e.g. a queued job):
+    spans and log records inside carry `request_id`, and the trace line is
+    written with method "BACKGROUND" and path `name`.
+    """
+    trace = Trace(request_id)
+    token = _current.set(trace)
+    status = 500
+    try:
+        yield trace
+        status = 200
+    finally:
+        _current.reset(token)
+        _write_trace(trace, "BACKGROUND", name, status)
+
+
+class TracingMiddleware:
+    """ASGI middleware: request ID in, X-Request-ID (and Server-Timing) out, one trace line per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        trace = Trace(request_id)
+        token = _current.set(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode()))
+                if SERVER_TIMING:
+                    headers.append((b"server-timing", _server_timing(trace).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            _write_trace(trace, scope.get("method"), scope.get("path"), status["code"])
+
+
+def install_tracing(app):
+    """Adds the tracing middleware to a FastAPI app; call after instrument_app() so it runs outermost."""
+    app.add_middleware(TracingMiddleware)
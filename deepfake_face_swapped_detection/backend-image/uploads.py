@@ -0,0 +1,349 @@
+"""
+Streaming multipart uploads without temp-file copies.
+
+receive_upload() parses the request body as it arrives, rather than letting
+FastAPI spool the whole form first. The file part is hashed (SHA-256) chunk
+by chunk and cut off with a 413 as soon as it exceeds max_bytes. It then
+lands either:
+- in memory, as one bytes object, when it is a small file of a type that
+  decodes from a buffer (images). BytesIO over it shares the buffer, so
+  PIL/cv2 decode it without another copy; or
+- in a scratch file under UPLOAD_SCRATCH_DIR (tmpfs at /dev/shm when it
+  has room for UPLOAD_MAX_BYTES, the disk temp dir otherwise), for anything a decoder needs a path for (cv2, ffmpeg,
+  torchaudio). The path is handed over as is.
+
+Scratch files are named <pid>-<random><ext>. The janitor deletes files whose
+process has died, and files older than UPLOAD_SCRATCH_MAX_AGE, so a crash
+mid-request does not leak them.
+"""
+import os
+import io
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+
+from fastapi import HTTPException
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+log = logging.getLogger(__name__)
+
+
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 250 * 1024 * 1024))
+
+
+def _free_bytes(path: str) -> int:
+    try:
+        st = os.statvfs(path)
+    except (OSError, AttributeError):
+        return 0
+    return st.f_bavail * st.f_frsize
+
+
+def _default_scratch_dir(max_bytes: int = UPLOAD_MAX_BYTES):
+    # Docker gives containers a 64 MB /dev/shm by default: only use it if the largest upload fits
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK) and _free_bytes(shm) >= max_bytes:
+        base = shm
+    else:
+        base = tempfile.gettempdir()
+    return os.path.join(base, "deepfake-uploads")
+
+
+UPLOAD_SCRATCH_DIR = os.environ.get("UPLOAD_SCRATCH_DIR") or _default_scratch_dir()
+UPLOAD_MEMORY_LIMIT = int(os.environ.get("UPLOAD_MEMORY_LIMIT", 16 * 1024 * 1024))  # Largest upload kept in memory
+UPLOAD_SCRATCH_MAX_AGE = float(os.environ.get("UPLOAD_SCRATCH_MAX_AGE", 3600))  # Seconds before a scratch file is orphaned
+UPLOAD_JANITOR_INTERVAL = float(os.environ.get("UPLOAD_JANITOR_INTERVAL", 300))
+
+# Request body schema for the docs, since the endpoints read the body themselves
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object", "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+
+class Upload:
+    """
+    One uploaded file: in memory (`data`) or in a scratch file (`path`).
+
+    Attributes:
+        filename: Client-side file name
+        content_type: Part content type, as sent
+        size: Bytes received
+        sha256: Hex digest of the content, computed while streaming
+    """
+
+    def __init__(self, filename: str, content_type: str, in_memory: bool):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.sha256 = None
+        self.data = None
+        self.path = None
+        self._hash = hashlib.sha256()
+        self._chunks = [] if in_memory else None
+        self._file = None
+
+    @property
+    def ext(self) -> str:
+        return os.path.splitext(self.filename)[1].lower()
+
+    def _scratch_path(self) -> str:
+        os.makedirs(UPLOAD_SCRATCH_DIR, exist_ok=True)
+        return os.path.join(UPLOAD_SCRATCH_DIR, f"{os.getpid()}-{uuid.uuid4().hex}{self.ext}")
+
+    def _spill(self):
+        """Moves what is buffered so far into a scratch file and keeps writing there."""
+        self.path = self._scratch_path()
+        self._file = open(self.path, "wb")
+        for chunk in self._chunks or ():
+            self._file.write(chunk)
+        self._chunks = None
+
+    def write(self, chunk: bytes, memory_limit: int):
+        self.size += len(chunk)
+        self._hash.update(chunk)
+        if self._chunks is not None and self.size > memory_limit:
+            self._spill()
+        if self._chunks is not None:
+            self._chunks.append(chunk)
+        else:
+            if self._file is None:
+                self._spill()
+            self._file.write(chunk)
+
+    def finish(self):
+        self.sha256 = self._hash.hexdigest()
+        if self._chunks is not None:
+            self.data = b"".join(self._chunks)
+            self._chunks = None
+        elif self._file is None:
+            self._spill()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def file_path(self) -> str:
+        """Path for decoders that only take files; an in-memory upload is written to scratch first."""
+        if self.path is None:
+            self.path = self._scratch_path()
+            with open(self.path, "wb") as f:
+                f.write(self.data)
+        return self.path
+
+    def open(self):
+        """Binary file object over the content, without copying an in-memory upload."""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return open(self.path, "rb")
+
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self):
+        """Drops the buffer and removes the scratch file, if any."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self.data = None
+        self._chunks = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+async def receive_upload(request, field: str = "file", max_bytes: int = UPLOAD_MAX_BYTES,
+                         memory_limit: int = UPLOAD_MEMORY_LIMIT, memory_extensions=None) -> Upload:
+    """
+    Streams the `field` file of a multipart request into an Upload.
+
+    Args:
+        request: The Starlette request; its body must not have been read yet
+        field: Form field holding the file; other parts are skipped
+        max_bytes: Largest accepted file, 413 beyond it
+        memory_limit: Files up to this size stay in memory (if their type allows)
+        memory_extensions: Extensions kept in memory (e.g. images), or None for any
+
+    Returns:
+        Upload: Finished upload; the caller must close() it
+
+    Raises:
+        HTTPException: 400 for a malformed body, 413 if too large, 422 if the field is missing,
+            507 if the scratch directory runs out of space
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    # Multipart framing adds a few hundred bytes; anything far beyond the limit is refused before reading
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"Upload larger than {max_bytes // (1024 * 1024)} MB")
+
+    state = {"upload": None, "current": None, "header": b"", "value": b"", "headers": {}}
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["header"].lower()] = state["value"]
+        state["header"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        state["current"] = None
+        if state["upload"] is None and options.get(b"name") == field.encode() and b"filename" in options:
+            filename = options[b"filename"].decode("utf-8", errors="replace")
+            ext = os.path.splitext(filename)[1].lower()
+            in_memory = memory_limit > 0 and (memory_extensions is None or ext in memory_extensions)
+            state["current"] = state["upload"] = Upload(
+                filename, state["headers"].get(b"content-type", b"").decode("latin-1"), in_memory)
+
+    def on_part_data(data, start, end):
+        upload = state["current"]
+        if upload is None:
+            return
+        if upload.size + (end - start) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload larger than {max_bytes // (1024 * 1024)} MB")
+        upload.write(data[start:end], memory_limit)
+
+    def on_part_end():
+        state["current"] = None
+
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except HTTPException:
+        if state["upload"] is not None:
+            state["upload"].close()
+        raise
+    except OSError as e:
+        # Scratch space full or unwritable: the server's fault, not the client's
+        if state["upload"] is not None:
+            state["upload"].close()
+        log.error(f"❌ Could not write upload to {UPLOAD_SCRATCH_DIR}: {e}")
+        raise HTTPException(status_code=507, detail="Not enough scratch space to receive the upload")
+    except Exception as e:
+        if state["upload"] is not None:
+            state["upload"].close()
+        raise HTTPException(status_code=400, detail=f"Malformed upload: {str(e)[:100]}")
+
+    upload = state["upload"]
+    if upload is None:
+        raise HTTPException(status_code=422, detail=f"Form field '{field}' with a file is required")
+    try:
+        upload.finish()
+    except OSError as e:
+        upload.close()
+        log.error(f"❌ Could not write upload to {UPLOAD_SCRATCH_DIR}: {e}")
+        raise HTTPException(status_code=507, detail="Not enough scratch space to receive the upload")
+    log.info(f"📥 Upload {upload.filename}: {upload.size} bytes, sha256 {upload.sha256[:12]}, "
+             f"{'memory' if upload.data is not None else 'scratch'}")
+    return upload
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sweep_scratch(max_age: float = UPLOAD_SCRATCH_MAX_AGE, startup: bool = False) -> int:
+    """
+    Deletes orphaned scratch files: their process is gone, they are older
+    than max_age, or (at startup) they carry our own PID from a previous run.
+
+    Returns:
+        int: Files removed
+    """
+    removed = 0
+    now = time.time()
+    try:
+        names = os.listdir(UPLOAD_SCRATCH_DIR)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        path = os.path.join(UPLOAD_SCRATCH_DIR, name)
+        try:
+            pid = int(name.split("-", 1)[0])
+        except ValueError:
+            continue
+        try:
+            orphaned = (not _pid_alive(pid) or now - os.path.getmtime(path) > max_age
+                        or (startup and pid == os.getpid()))
+            if orphaned:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        log.info(f"🧹 Removed {removed} orphaned upload scratch file(s) from {UPLOAD_SCRATCH_DIR}")
+    return removed
+
+
+class ScratchJanitor:
+    """Background thread running sweep_scratch() every UPLOAD_JANITOR_INTERVAL seconds."""
+
+    def __init__(self, interval: float = UPLOAD_JANITOR_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        sweep_scratch(startup=True)
+        self._thread = threading.Thread(target=self._run, name="upload-janitor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sweep_scratch()
+            except Exception as e:
+                log.warning(f"⚠️  Upload janitor failed: {e}")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,196 @@
+"""
+Local artifact store for the video model.
+
+- Checkpoints are downloaded into a `.part` file that is resumed with HTTP
+  Range requests after a dropped connection, verified against a SHA-256
+  (explicit, or the `X-Linked-Etag` Hugging Face sends for LFS files) and
+  only then atomically renamed into place
+- The training checkpoint (pickled dict, possibly with optimizer state) is
+  converted once into a plain state-dict file that torch.load can mmap, so
+  every worker on a node maps the same page-cache pages instead of copying
+  the weights onto its own heap
+"""
+import os
+import re
+import hashlib
+import logging
+
+import torch
+import requests
+
+log = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "artifacts")
+
+CHUNK_SIZE = 1024 * 1024
+
+# Consecutive failed attempts (no new bytes) before giving up
+MAX_STALLED_ATTEMPTS = 3
+
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def remote_sha256(url: str, session: requests.Session, timeout: float = 30) -> str:
+    """
+    SHA-256 advertised by the server, if any. Hugging Face answers a HEAD on
+    /resolve/ with a redirect carrying X-Linked-Etag = sha256 of the LFS blob.
+
+    Returns:
+        str: lowercase hex digest, or None if the server does not publish one
+    """
+    try:
+        response = session.head(url, allow_redirects=False, timeout=timeout)
+    except requests.RequestException:
+        return None
+    for header in ('X-Linked-Etag', 'ETag'):
+        value = (response.headers.get(header) or "").removeprefix('W/').strip('"').lower()
+        if _SHA256_RE.match(value):
+            return value
+    return None
+
+
+def download_artifact(url: str, dest: str, sha256: str = None, timeout: float = 30,
+                      session: requests.Session = None) -> str:
+    """
+    Resumable, verified download of `url` to `dest`.
+
+    Args:
+        url: Artifact URL (must support Range requests to resume)
+        dest: Final path; only ever written by an atomic rename
+        sha256: Expected digest. If None, the server's X-Linked-Etag is used when present
+        timeout: Per-request connect/read timeout in seconds
+        session: Optional requests session (tests pass one in)
+
+    Returns:
+        str: dest
+
+    Raises:
+        ValueError: If the downloaded bytes do not match the expected digest
+        requests.RequestException: If the download keeps failing without progress
+    """
+    session = session or requests.Session()
+    expected = (sha256 or remote_sha256(url, session, timeout) or "").lower() or None
+
+    if os.path.exists(dest) and (expected is None or sha256_file(dest) == expected):
+        return dest
+
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    part_path = dest + ".part"
+    stalled = 0
+    # Most bytes any attempt has reached; a server that ignores Range restarts at 0 every time
+    furthest = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 416:
+                    # Nothing left past `offset`: the .part file is already complete
+                    break
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    log.warning("⚠️ Server ignored Range, restarting download from 0")
+                    offset = 0
+                expected_length = response.headers.get('Content-Length')
+
+                written = 0
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            if expected_length is not None and written < int(expected_length):
+                raise requests.ConnectionError(f"connection closed after {written} of {expected_length} bytes")
+            break
+        except requests.RequestException as e:
+            size = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if size > furthest:
+                furthest = size
+                stalled = 0
+            else:
+                stalled += 1
+            if stalled >= MAX_STALLED_ATTEMPTS:
+                raise
+            log.warning(f"⚠️ Download interrupted ({e}); resuming at byte {size}")
+
+    if expected is not None:
+        actual = sha256_file(part_path)
+        if actual != expected:
+            os.remove(part_path)
+            raise ValueError(f"Checksum mismatch for {url}: expected {expected}, got {actual}")
+        log.info(f"✓ Verified sha256 {expected[:12]}…")
+    else:
+        log.warning("⚠️ No checksum available; artifact saved unverified")
+
+    os.replace(part_path, dest)
+    return dest
+
+
+def convert_checkpoint(checkpoint_path: str, weights_path: str) -> str:
+    """
+    Writes the model weights from a training checkpoint as a plain state dict
+    (tensors only, contiguous) that loads with weights_only=True and mmap=True.
+
+    Returns:
+        str: weights_path
+    """
+    # The original checkpoint may hold arbitrary pickled objects, so this is the one weights_only=False load
+    checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=False)
+    state_dict = checkpoint.get('model_state_dict', checkpoint)
+    state_dict = {k: v.detach().contiguous() for k, v in state_dict.items() if torch.is_tensor(v)}
+
+    part_path = weights_path + ".part"
+    torch.save(state_dict, part_path)
+    os.replace(part_path, weights_path)
+    return weights_path
+
+
+def ensure_model_artifact(checkpoint_path: str, url: str, sha256: str = None,
+                          store_dir: str = ARTIFACT_DIR, timeout: float = 30) -> str:
+    """
+    Makes sure a memory-mappable weights file exists and returns its path.
+
+    An existing local checkpoint is used as is; otherwise it is downloaded
+    (resumable, verified) into `store_dir`. The converted weights are rebuilt
+    whenever the checkpoint is newer than them.
+
+    Args:
+        checkpoint_path: Local training checkpoint (e.g. best_model.pth)
+        url: Where to fetch the checkpoint if it is missing
+        sha256: Expected checkpoint digest (optional)
+        store_dir: Artifact store directory
+        timeout: Download timeout per request
+
+    Returns:
+        str: Path of the state-dict file to load with load_mmap_state_dict()
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    if not os.path.exists(checkpoint_path):
+        checkpoint_path = os.path.join(store_dir, os.path.basename(checkpoint_path))
+        # Only a verified download is ever renamed into the store, so an existing file is trusted
+        if not os.path.exists(checkpoint_path):
+            download_artifact(url, checkpoint_path, sha256=sha256, timeout=timeout)
+
+    stem = os.path.splitext(os.path.basename(checkpoint_path))[0]
+    weights_path = os.path.join(store_dir, f"{stem}.weights.pt")
+    if not os.path.exists(weights_path) or os.path.getmtime(weights_path) < os.path.getmtime(checkpoint_path):
+        log.info(f"Converting {checkpoint_path} to mmap-able weights at {weights_path}...")
+        convert_checkpoint(checkpoint_path, weights_path)
+    return weights_path
+
+
+def load_mmap_state_dict(weights_path: str) -> dict:
+    """Maps the weights file read-only; tensors share the page cache across processes."""
+    return torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True)
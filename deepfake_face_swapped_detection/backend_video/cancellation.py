@@ -0,0 +1,208 @@
+"""
+Request deadlines and cancellation.
+
+Every analysis request runs with a CancelToken: a deadline (REQUEST_TIMEOUT
+seconds, or less when the client sends X-Request-Timeout) plus a flag that
+is set when the client disconnects. A context variable holds the token, like
+the progress sink, so the pipeline checks it without threading it through
+every call:
+- token.check() between steps raises DeadlineExceeded (504) or Cancelled (499)
+- token.on_cancel(kill) stops blocking work (yt-dlp, ffmpeg) the moment the
+  client goes away or the deadline passes
+- token.budget(reserve) is the time a step may take and still leave
+  `reserve` seconds for the rest; frame sampling uses it to stop early and
+  score the frames it has instead of failing
+
+Outside a request (job workers, benchmarks) current_token() is a token that
+never fires.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from metrics import Counter
+from profiling import op_profile
+
+log = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = float(os.environ.get("REQUEST_TIMEOUT", 180))  # Default and maximum deadline, seconds
+INFERENCE_RESERVE = float(os.environ.get("INFERENCE_RESERVE", 3))  # Seconds kept back for inference when sampling
+DISCONNECT_POLL = 0.5  # Seconds between client-disconnect checks
+
+REQUESTS_CANCELLED = Counter("requests_cancelled_total", "Requests stopped before completion, by reason", ("reason",))
+
+
+class Cancelled(HTTPException):
+    """The client went away; 499 is what gets logged, nobody reads the response."""
+    def __init__(self, detail="Client closed request"):
+        super().__init__(status_code=499, detail=detail)
+
+
+class DeadlineExceeded(Cancelled):
+    def __init__(self, detail="Request deadline exceeded"):
+        HTTPException.__init__(self, status_code=504, detail=detail)
+
+
+class CancelToken:
+    """
+    Deadline and cancellation flag of one request.
+
+    Args:
+        timeout: Seconds until the deadline, or None for no deadline
+    """
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.reason = None
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self, reason="client disconnected"):
+        """Marks the token cancelled and runs the registered on_cancel callbacks once."""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks, self._callbacks = self._callbacks, []
+        REQUESTS_CANCELLED.inc(reason=reason)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log.warning(f"⚠️  Cancel callback failed: {e}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def remaining(self) -> float:
+        """Seconds until the deadline (inf without one, negative once passed)."""
+        return self.deadline - time.monotonic() if self.deadline is not None else float("inf")
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, reserve: float = 0.0, cap: float = None) -> float:
+        """
+        Seconds a step may take while leaving `reserve` for what follows.
+
+        Args:
+            reserve: Seconds to keep back for later steps
+            cap: Upper bound (the step's own timeout)
+
+        Returns:
+            float: At least 1 second, so a step near the deadline still gets a short try
+        """
+        seconds = self.remaining() - reserve
+        if cap is not None:
+            seconds = min(seconds, cap)
+        return max(1.0, seconds)
+
+    def check(self):
+        """Raises Cancelled or DeadlineExceeded if the request should stop."""
+        if self.reason == "deadline" or (self.reason is None and self.expired()):
+            raise DeadlineExceeded()
+        if self.reason is not None:
+            raise Cancelled()
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """
+        Calls callback() if the request is cancelled or its deadline passes
+        while the block runs (e.g. to kill a subprocess).
+        """
+        with self._lock:
+            fire_now = self.reason is not None
+            if not fire_now:
+                self._callbacks.append(callback)
+        if fire_now:
+            callback()
+        timer = None
+        if self.deadline is not None and not fire_now:
+            timer = threading.Timer(max(0.0, self.remaining()), self.cancel, ("deadline",))
+            timer.daemon = True
+            timer.start()
+        try:
+            yield
+        finally:
+            if timer:
+                timer.cancel()
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+
+class _NeverCancelled(CancelToken):
+    """Shared default token: no deadline, and cancel() is ignored."""
+    def cancel(self, reason="client disconnected"):
+        pass
+
+
+NEVER = _NeverCancelled()
+_current = contextvars.ContextVar("cancel_token", default=NEVER)
+
+
+def current_token() -> CancelToken:
+    return _current.get()
+
+
+@contextmanager
+def bind(token: CancelToken):
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def request_token(x_request_timeout=None) -> CancelToken:
+    """Token for a new request: REQUEST_TIMEOUT, or the client's X-Request-Timeout if shorter."""
+    timeout = REQUEST_TIMEOUT
+    try:
+        if x_request_timeout is not None and float(x_request_timeout) > 0:
+            timeout = min(timeout, float(x_request_timeout))
+    except ValueError:
+        pass
+    return CancelToken(timeout)
+
+
+async def run_cancellable(request, token: CancelToken, work, *args):
+    """
+    Runs work(*args) in the threadpool with `token` bound, cancelling the
+    token if the client disconnects before it finishes.
+
+    Args:
+        request: The Starlette request, polled for disconnects
+        token: From request_token()
+        work: Blocking function to run
+
+    Returns:
+        work's return value; raises what it raised (Cancelled/DeadlineExceeded once the token fired)
+    """
+    def run():
+        # A profiled request's op-level profile is taken in this thread, where its ops run
+        with bind(token), op_profile():
+            return work(*args)
+
+    # Copy the request context so spans and log records keep the request ID
+    task = asyncio.ensure_future(run_in_threadpool(contextvars.copy_context().run, run))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                log.info("🛑 Client disconnected; cancelling request")
+                token.cancel()
+                return await task
+    finally:
+        if not task.done():
+            token.cancel()
+            task.add_done_callback(lambda t: t.exception())
@@ -4,8 +4,46 @@ Video downloader module using yt-dlp
 import os
 import uuid
 import glob
+import re
+import time
+import logging
 import yt_dlp
 
+from progress import emit, has_listener
+from cancellation import current_token
+
+log = logging.getLogger(__name__)
+
+
+# Browser-like headers shared by the file download and the streaming path
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+def normalize_video_url(url: str) -> str:
+    """
+    Convert YouTube Shorts to regular YouTube URL for better compatibility
+    
+    Args:
+        url: Video URL
+        
+    Returns:
+        str: URL that yt-dlp handles most reliably
+    """
+    if 'youtube.com/shorts/' in url:
+        # Extract video ID from shorts URL
+        match = re.search(r'shorts/([a-zA-Z0-9_-]+)', url)
+        if match:
+            video_id = match.group(1)
+            url = f"https://www.youtube.com/watch?v={video_id}"
+            log.info(f"Converted YouTube Shorts URL to: {url}")
+    return url
 
 
 def get_video_metadata(url: str) -> dict:
@@ -33,6 +71,34 @@ def get_video_metadata(url: str) -> dict:
         }
 
 
+def download_progress_hook(min_interval: float = 0.5):
+    """yt-dlp progress hook that forwards download progress to a streaming client, at most every min_interval seconds."""
+    last = {"at": 0.0}
+
+    def hook(d):
+        if d.get('status') == 'finished':
+            emit("download", status="finished", downloaded_bytes=d.get('downloaded_bytes') or d.get('total_bytes'))
+            return
+        now = time.monotonic()
+        if d.get('status') != 'downloading' or now - last["at"] < min_interval:
+            return
+        last["at"] = now
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        emit("download", status="downloading", downloaded_bytes=downloaded, total_bytes=total,
+             percent=round(100.0 * downloaded / total, 1) if total else None,
+             speed=d.get('speed'), eta=d.get('eta'))
+    return hook
+
+
+def cancel_hook(token):
+    """yt-dlp progress hook that aborts the transfer once the request is cancelled or past its deadline."""
+    def hook(d):
+        if d.get('status') == 'downloading':
+            token.check()
+    return hook
+
+
 def download_video(url: str, output_dir: str = "tmp_downloads", timeout: int = 120) -> str:
     """
     Download video from URL using yt-dlp
@@ -40,26 +106,20 @@ def download_video(url: str, output_dir: str = "tmp_downloads", timeout: int = 1
     Args:
         url: Video URL to download
         output_dir: Directory to save the downloaded video
-        timeout: Download timeout in seconds
+        timeout: Download timeout in seconds (socket timeout, capped by the request deadline)
         
     Returns:
         str: Path to the downloaded video file
         
     Raises:
+        Cancelled: If the request was cancelled or ran out of time mid-transfer
         Exception: If download fails
     """
+    token = current_token()
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
-    # Convert YouTube Shorts to regular YouTube URL for better compatibility
-    if 'youtube.com/shorts/' in url:
-        # Extract video ID from shorts URL
-        import re
-        match = re.search(r'shorts/([a-zA-Z0-9_-]+)', url)
-        if match:
-            video_id = match.group(1)
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            print(f"Converted YouTube Shorts URL to: {url}")
+    url = normalize_video_url(url)
     
     # Generate unique ID for this download (avoids filename collisions)
     unique_id = str(uuid.uuid4())
@@ -71,24 +131,20 @@ def download_video(url: str, output_dir: str = "tmp_downloads", timeout: int = 1
         'outtmpl': output_template,
         'quiet': False,
         'no_warnings': False,
-        'socket_timeout': timeout,
+        'socket_timeout': token.budget(cap=timeout),
         'retries': 3,  # Simple integer for retry count
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        },
+        'http_headers': HTTP_HEADERS,
         'skip_unavailable_fragments': True,
         'fragment_retries': 10,
+        'progress_hooks': [cancel_hook(token)],
     }
+    if has_listener():
+        ydl_opts['progress_hooks'].append(download_progress_hook())
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            print(f"Attempting download to: {output_template}")
-            print(f"URL: {url}")
+            log.info(f"Attempting download to: {output_template}")
+            log.debug(f"URL: {url}")
             info = ydl.extract_info(url, download=True)
             
             # Find the file that was just created starting with unique_id
@@ -98,11 +154,11 @@ def download_video(url: str, output_dir: str = "tmp_downloads", timeout: int = 1
             if found_files:
                 final_path = found_files[0]
                 file_size = os.path.getsize(final_path)
-                print(f"File size: {file_size} bytes")
+                log.debug(f"File size: {file_size} bytes")
                 
                 # Verify file size > 0
                 if file_size > 0:
-                    print(f"✓ Download successful: {final_path}")
+                    log.info(f"✓ Download successful: {final_path}")
                     return final_path
                 else:
                     os.remove(final_path)
@@ -111,7 +167,7 @@ def download_video(url: str, output_dir: str = "tmp_downloads", timeout: int = 1
             raise Exception("yt-dlp finished but no file found matching pattern.")
                 
     except Exception as e:
-        print(f"❌ Download Error: {e}")
+        log.error(f"❌ Download Error: {e}")
         # Clean up any partial files
         partial_files = glob.glob(os.path.join(output_dir, f"{unique_id}.*"))
         for f in partial_files:
@@ -119,5 +175,7 @@ def download_video(url: str, output_dir: str = "tmp_downloads", timeout: int = 1
                 os.remove(f)
             except:
                 pass
+        # yt-dlp wraps what the hook raised; report the cancellation itself
+        token.check()
         raise Exception(f"Failed to download video: {str(e)}")
 
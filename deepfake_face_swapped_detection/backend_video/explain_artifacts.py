@@ -0,0 +1,345 @@
+"""
+Explainability images stored by reference and rendered on first fetch.
+
+An analysis response no longer carries its heatmap or frame thumbnails as
+base64. It stores the small inputs that produce them (the Grad-CAM grid and
+the source image, or a decoded frame) and returns a URL:
+
+    artifact_id = store("frame", frame=rgb)     # -> "frame-3f2a..."
+    artifact_url(artifact_id)                   # -> "/artifacts/frame-3f2a..."
+
+GET /artifacts/{id} runs the renderer registered for the kind, caches the
+encoded image next to the inputs and serves it as binary image/jpeg or
+image/webp with an ETag. A client that never fetches the image never pays
+for the colormap, resize or encode.
+
+IDs are SHA-256 digests of the inputs, so the same frame or heatmap maps to
+the same ID and the content behind an ID never changes. The ETag is the ID
+plus the renderer's variant (format and quality). Responses are sent as
+immutable and If-None-Match gets a 304 without touching the disk.
+
+Artifacts are files under EXPLAIN_ARTIFACT_DIR (tmpfs at /dev/shm when it
+has room for EXPLAIN_ARTIFACT_MAX_BYTES, the disk temp dir otherwise), so
+every worker process serves what any other one stored. The janitor deletes
+artifacts older than EXPLAIN_ARTIFACT_TTL, and the oldest ones beyond
+EXPLAIN_ARTIFACT_MAX_BYTES. If the directory fills up anyway, endpoints use
+store_or_none() and answer without the image URL instead of failing.
+"""
+import os
+import re
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from metrics import Counter
+
+log = logging.getLogger(__name__)
+
+
+EXPLAIN_ARTIFACT_TTL = float(os.environ.get("EXPLAIN_ARTIFACT_TTL", 3600))  # Seconds; matches JOB_RESULT_TTL
+EXPLAIN_ARTIFACT_MAX_BYTES = int(os.environ.get("EXPLAIN_ARTIFACT_MAX_BYTES", 512 * 1024 * 1024))
+
+
+def _free_bytes(path: str) -> int:
+    try:
+        st = os.statvfs(path)
+    except (OSError, AttributeError):
+        return 0
+    return st.f_bavail * st.f_frsize
+
+
+def _default_artifact_dir(max_bytes: int = EXPLAIN_ARTIFACT_MAX_BYTES):
+    # Docker's default /dev/shm is 64 MB: only use it if it can hold the whole cache
+    shm = "/dev/shm"
+    if os.path.isdir(shm) and os.access(shm, os.W_OK) and _free_bytes(shm) >= max_bytes:
+        base = shm
+    else:
+        base = tempfile.gettempdir()
+    return os.path.join(base, "deepfake-explain")
+
+
+EXPLAIN_ARTIFACT_DIR = os.environ.get("EXPLAIN_ARTIFACT_DIR") or _default_artifact_dir()
+EXPLAIN_JANITOR_INTERVAL = float(os.environ.get("EXPLAIN_JANITOR_INTERVAL", 300))
+ARTIFACT_ROUTE = "/artifacts"
+
+ARTIFACTS_STORED = Counter("explain_artifacts_stored_total", "Explainability artifacts stored, by kind", ("kind",))
+ARTIFACT_STORE_FAILURES = Counter("explain_artifact_store_failures_total",
+                                  "Artifacts dropped because their inputs could not be written, by kind",
+                                  ("kind",))
+ARTIFACT_FETCHES = Counter("explain_artifact_fetches_total",
+                           "Artifact fetches, by kind and result (rendered, cached, not_modified, missing)",
+                           ("kind", "result"))
+
+_ID_RE = re.compile(r'^([a-z]+)-([0-9a-f]{32})$')
+
+# kind -> (render(inputs) -> bytes, variant)
+_renderers = {}
+
+_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def renderer(kind: str, variant: str = ""):
+    """
+    Registers the function that turns an artifact's inputs into image bytes.
+
+    Args:
+        kind: Artifact kind (lowercase letters), the prefix of its IDs
+        variant: Output settings (e.g. "webp80"); part of the ETag and the cache file name,
+            so changing them re-renders instead of serving stale bytes
+    """
+    def register(render):
+        _renderers[kind] = (render, variant)
+        return render
+    return register
+
+
+def media_type(data: bytes) -> str:
+    """Content type of encoded image bytes, from their magic number."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, content_type in _MAGIC:
+        if data.startswith(magic):
+            return content_type
+    return "application/octet-stream"
+
+
+def _path(artifact_id: str, suffix: str) -> str:
+    return os.path.join(EXPLAIN_ARTIFACT_DIR, f"{artifact_id}.{suffix}")
+
+
+def _write_atomic(path: str, write):
+    tmp = os.path.join(EXPLAIN_ARTIFACT_DIR, f".{os.getpid()}-{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def store(kind: str, **inputs) -> str:
+    """
+    Saves the inputs of an artifact for a later render.
+
+    Args:
+        kind: A kind with a registered renderer
+        **inputs: NumPy arrays, or bytes (kept as a uint8 array)
+
+    Returns:
+        str: Artifact ID; the same inputs always give the same ID
+    """
+    if kind not in _renderers:
+        raise ValueError(f"No renderer registered for artifact kind '{kind}'")
+    arrays = {}
+    digest = hashlib.sha256(kind.encode())
+    for name in sorted(inputs):
+        value = inputs[name]
+        array = np.frombuffer(value, dtype=np.uint8) if isinstance(value, (bytes, bytearray, memoryview)) \
+            else np.ascontiguousarray(value)
+        digest.update(f"{name}:{array.dtype.str}:{array.shape}".encode())
+        digest.update(array.data)
+        arrays[name] = array
+    artifact_id = f"{kind}-{digest.hexdigest()[:32]}"
+
+    path = _path(artifact_id, "npz")
+    if os.path.exists(path):
+        # Same inputs stored before: keep them alive for another TTL
+        try:
+            os.utime(path)
+            return artifact_id
+        except OSError:
+            pass
+    os.makedirs(EXPLAIN_ARTIFACT_DIR, exist_ok=True)
+    _write_atomic(path, lambda f: np.savez(f, **arrays))
+    ARTIFACTS_STORED.inc(kind=kind)
+    return artifact_id
+
+
+def store_or_none(kind: str, **inputs):
+    """
+    store(), for callers whose response is still useful without the image.
+
+    Returns:
+        str: Artifact ID, or None if the inputs could not be written (disk full, say)
+    """
+    try:
+        return store(kind, **inputs)
+    except OSError as e:
+        ARTIFACT_STORE_FAILURES.inc(kind=kind)
+        log.warning(f"⚠️  Could not store {kind} artifact in {EXPLAIN_ARTIFACT_DIR}: {e}")
+        return None
+
+
+def artifact_url(artifact_id: str) -> str:
+    """Path the artifact is served at, relative to the backend's base URL."""
+    return f"{ARTIFACT_ROUTE}/{artifact_id}"
+
+
+def etag(artifact_id: str) -> str:
+    kind = artifact_id.split("-", 1)[0]
+    variant = _renderers[kind][1]
+    return f'"{artifact_id}.{variant}"' if variant else f'"{artifact_id}"'
+
+
+def render(artifact_id: str) -> bytes:
+    """
+    Encoded image of an artifact, rendered on the first call and read from the cache afterwards.
+
+    Raises:
+        KeyError: Unknown ID, or the artifact has expired
+    """
+    match = _ID_RE.match(artifact_id)
+    if not match or match.group(1) not in _renderers:
+        raise KeyError(artifact_id)
+    kind = match.group(1)
+    render_fn, variant = _renderers[kind]
+    output = _path(artifact_id, variant or "out")
+    try:
+        with open(output, "rb") as f:
+            data = f.read()
+        ARTIFACT_FETCHES.inc(kind=kind, result="cached")
+        return data
+    except FileNotFoundError:
+        pass
+
+    try:
+        with np.load(_path(artifact_id, "npz"), allow_pickle=False) as npz:
+            inputs = {name: npz[name] for name in npz.files}
+    except FileNotFoundError:
+        ARTIFACT_FETCHES.inc(kind=kind, result="missing")
+        raise KeyError(artifact_id)
+    data = render_fn(inputs)
+    try:
+        _write_atomic(output, lambda f: f.write(data))
+    except OSError as e:
+        log.warning(f"⚠️  Could not cache rendered artifact {artifact_id}: {e}")
+    ARTIFACT_FETCHES.inc(kind=kind, result="rendered")
+    return data
+
+
+async def get_artifact(artifact_id: str, request: Request):
+    """Rendered explainability image (heatmap or frame thumbnail) by ID, with ETag revalidation."""
+    match = _ID_RE.match(artifact_id)
+    if not match or match.group(1) not in _renderers:
+        raise HTTPException(status_code=404, detail="Unknown artifact")
+    tag = etag(artifact_id)
+    headers = {
+        "ETag": tag,
+        # Content-addressed: an ID never changes content; private since it shows the user's media
+        "Cache-Control": f"private, max-age={int(EXPLAIN_ARTIFACT_TTL)}, immutable",
+    }
+    if tag in (t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")):
+        ARTIFACT_FETCHES.inc(kind=match.group(1), result="not_modified")
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await run_in_threadpool(render, artifact_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+    return Response(content=data, media_type=media_type(data), headers=headers)
+
+
+def sweep_artifacts(max_age: float = EXPLAIN_ARTIFACT_TTL, max_bytes: int = EXPLAIN_ARTIFACT_MAX_BYTES) -> int:
+    """
+    Deletes artifacts (inputs and rendered output) older than max_age, then
+    the least recently stored ones until the directory fits in max_bytes.
+
+    Returns:
+        int: Files removed
+    """
+    try:
+        names = os.listdir(EXPLAIN_ARTIFACT_DIR)
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        log.warning(f"⚠️  Cannot list artifact directory {EXPLAIN_ARTIFACT_DIR}: {e}")
+        return 0
+    now = time.time()
+    entries = []
+    for name in names:
+        path = os.path.join(EXPLAIN_ARTIFACT_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((name, path, st.st_mtime, st.st_size))
+
+    # An artifact is as old as its inputs; the rendered output goes with them
+    born = {name[:-4]: mtime for name, _, mtime, _ in entries if name.endswith(".npz")}
+    removed = 0
+    keep = []
+    for name, path, mtime, size in entries:
+        stem = name.split(".", 1)[0]
+        if stem in born:
+            expired = now - born[stem] > max_age
+        else:
+            # Temp files of an interrupted write, and outputs whose inputs are gone
+            expired = now - mtime > 60
+        if expired:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        else:
+            keep.append((born.get(stem, mtime), size, path))
+
+    total = sum(size for _, size, _ in keep)
+    for _, size, path in sorted(keep):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+            total -= size
+        except OSError:
+            pass
+    if removed:
+        log.info(f"🧹 Removed {removed} explainability artifact file(s) from {EXPLAIN_ARTIFACT_DIR}")
+    return removed
+
+
+class ArtifactJanitor:
+    """Background thread running sweep_artifacts() every EXPLAIN_JANITOR_INTERVAL seconds."""
+
+    def __init__(self, interval: float = EXPLAIN_JANITOR_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        sweep_artifacts()
+        self._thread = threading.Thread(target=self._run, name="artifact-janitor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                sweep_artifacts()
+            except Exception as e:
+                log.warning(f"⚠️  Artifact janitor failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+def install_artifacts(app):
+    """Adds GET /artifacts/{artifact_id} to a FastAPI app."""
+    app.add_api_route(ARTIFACT_ROUTE + "/{artifact_id}", get_artifact, methods=["GET"],
+                      responses={200: {"content": {"image/webp": {}, "image/jpeg": {}}}, 304: {}, 404: {}})
@@ -0,0 +1,417 @@
+"""
+Durable job queue for long-running analyses.
+
+A URL analysis (download, decode, inference) can outlast the timeouts of
+proxies in front of the API. Instead of holding the request open, clients
+submit a job, get its ID back immediately and poll (or long-poll) for the
+result.
+
+- Jobs live in one SQLite file (WAL mode), shared by every worker process on
+  the node; claiming is a single atomic UPDATE, so each job runs once
+- Running jobs are heartbeated; a job whose worker died (crash, restart,
+  OOM kill) stops being heartbeated and is put back in the queue, up to
+  JOB_MAX_ATTEMPTS runs. A job is never requeued while its process is
+  still running it, and only the worker holding the claim can finish it
+- Finished jobs keep their result (or error) for JOB_RESULT_TTL seconds
+- Submission is admission-controlled across processes: at most
+  JOB_MAX_QUEUED jobs wait, and a client has at most JOB_PER_CLIENT queued
+  or running. Beyond that, submit raises admission.Rejected, with the
+  expected wait from the average job duration
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+
+from fastapi import HTTPException
+
+from admission import Rejected, SERVICE_TIME_ALPHA
+from metrics import Counter, Histogram
+from tracing import background_trace
+
+log = logging.getLogger(__name__)
+
+JOB_DB = os.environ.get("JOB_DB", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))  # Job threads per server process
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", 3600))
+JOB_HEARTBEAT = float(os.environ.get("JOB_HEARTBEAT", 10))
+JOB_STALE_AFTER = float(os.environ.get("JOB_STALE_AFTER", 60))  # No heartbeat for this long = worker lost
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 2))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 0.5))
+JOB_MAX_WAIT = float(os.environ.get("JOB_MAX_WAIT", 30))  # Cap on a status long-poll
+JOB_STOP_GRACE = float(os.environ.get("JOB_STOP_GRACE", 5))  # Seconds shutdown waits for running jobs
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", 32))  # 0 disables the queue cap
+JOB_PER_CLIENT = int(os.environ.get("JOB_PER_CLIENT", 4))  # Queued + running per client; 0 disables
+JOB_SERVICE_TIME = float(os.environ.get("JOB_SERVICE_TIME", 30))  # Initial estimate of one job, seconds
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+JOBS_FINISHED = Counter("jobs_finished_total", "Jobs finished, by kind and final status", ("kind", "status"))
+JOB_QUEUE_WAIT = Histogram("job_queue_wait_seconds", "Time jobs spent queued before a worker claimed them", ("kind",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    heartbeat_at REAL,
+    client TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    """SQLite-backed job table. Every call opens its own connection, so it is safe from any thread or process."""
+
+    def __init__(self, path: str = JOB_DB):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "client" not in columns:
+                # Job files from before per-client limits
+                conn.execute("ALTER TABLE jobs ADD COLUMN client TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql: str, params=()) -> list:
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def submit(self, kind: str, payload: dict, client: str = None, max_queued: int = 0, per_client: int = 0) -> str:
+        """
+        Queues a job.
+
+        Args:
+            kind: Handler name
+            payload: JSON-serialisable handler input
+            client: Submitting client (IP address), for per_client
+            max_queued: Refuse when this many jobs are already queued (0: no cap)
+            per_client: Refuse when `client` already has this many queued or running (0: no limit)
+
+        Returns:
+            str: Job ID
+
+        Raises:
+            Rejected: reason "queue_full" or "client_limit"; retry_after is left at 0 for the caller
+        """
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            # The checks and the insert are one write transaction, so processes cannot overshoot together
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if max_queued and conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?",
+                                               (QUEUED,)).fetchone()[0] >= max_queued:
+                    raise Rejected("queue_full", 0)
+                if per_client and client is not None and conn.execute(
+                        "SELECT COUNT(*) FROM jobs WHERE client = ? AND status IN (?, ?)",
+                        (client, QUEUED, RUNNING)).fetchone()[0] >= per_client:
+                    raise Rejected("client_limit", 0)
+                conn.execute("INSERT INTO jobs (id, kind, payload, status, created_at, client) VALUES (?, ?, ?, ?, ?, ?)",
+                             (job_id, kind, json.dumps(payload), QUEUED, time.time(), client))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self, worker: str) -> dict:
+        """Atomically moves the oldest queued job to running. Returns it, or None when the queue is empty."""
+        now = time.time()
+        rows = self._execute(
+            "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+            "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) RETURNING *",
+            (RUNNING, worker, now, now, QUEUED))
+        return _row_to_job(rows[0]) if rows else None
+
+    def heartbeat(self, job_ids):
+        now = time.time()
+        for job_id in job_ids:
+            self._execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?", (now, job_id, RUNNING))
+
+    def complete(self, job_id: str, worker: str, result: dict) -> bool:
+        """Stores the result, unless `worker` lost the job to a reclaim meanwhile. Returns whether it did."""
+        return bool(self._execute(
+            "UPDATE jobs SET status = ?, result = ?, finished_at = ? WHERE id = ? AND status = ? AND worker = ? "
+            "RETURNING id", (DONE, json.dumps(result), time.time(), job_id, RUNNING, worker)))
+
+    def fail(self, job_id: str, worker: str, status_code: int, detail: str) -> bool:
+        """Stores the error, unless `worker` lost the job to a reclaim meanwhile. Returns whether it did."""
+        return bool(self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status = ? AND worker = ? "
+            "RETURNING id", (FAILED, json.dumps({"status_code": status_code, "detail": detail}), time.time(),
+                             job_id, RUNNING, worker)))
+
+    def running_on(self, host: str) -> list:
+        """(job id, worker) of running jobs claimed by worker processes on `host`."""
+        return [(row["id"], row["worker"]) for row in
+                self._execute("SELECT id, worker FROM jobs WHERE status = ? AND worker LIKE ?", (RUNNING, f"{host}:%"))]
+
+    def expire_heartbeats(self, job_ids):
+        """Marks jobs as stale now, so the next reclaim_stale() picks them up without waiting."""
+        for job_id in job_ids:
+            self._execute("UPDATE jobs SET heartbeat_at = 0 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+    def reclaim_stale(self, stale_after: float = JOB_STALE_AFTER, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+        """Requeues running jobs whose worker stopped heartbeating; fails those out of attempts."""
+        cutoff = time.time() - stale_after
+        failed = self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+            "WHERE status = ? AND heartbeat_at < ? AND attempts >= ? RETURNING id",
+            (FAILED, json.dumps({"status_code": 500, "detail": "Worker lost while running the job"}), time.time(),
+             RUNNING, cutoff, max_attempts))
+        requeued = self._execute(
+            "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ? RETURNING id",
+            (QUEUED, RUNNING, cutoff))
+        if failed or requeued:
+            log.warning(f"⚠️ Stale jobs: {len(requeued)} requeued, {len(failed)} failed after {max_attempts} attempts")
+        return len(failed) + len(requeued)
+
+    def purge(self, ttl: float = JOB_RESULT_TTL) -> int:
+        """Deletes finished jobs older than ttl seconds."""
+        return len(self._execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ? RETURNING id",
+                                 (DONE, FAILED, time.time() - ttl)))
+
+    def get(self, job_id: str) -> dict:
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return _row_to_job(rows[0]) if rows else None
+
+    def queue_position(self, job: dict) -> int:
+        """0-based number of queued jobs ahead of `job`."""
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                             (QUEUED, job["created_at"]))[0][0]
+
+    def count(self, status: str) -> int:
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,))[0][0]
+
+
+def _row_to_job(row) -> dict:
+    job = dict(row)
+    for key in ("payload", "result", "error"):
+        if job[key] is not None:
+            job[key] = json.loads(job[key])
+    return job
+
+
+class JobRunner:
+    """
+    Worker threads that claim jobs from a JobStore and run them with the
+    handler registered for their kind, plus one maintenance thread for
+    heartbeats, stale-job recovery and result expiry.
+    """
+
+    def __init__(self, store: JobStore, handlers: dict, workers: int = JOB_WORKERS, ready: threading.Event = None,
+                 processes: int = 1, max_queued: int = JOB_MAX_QUEUED, per_client: int = JOB_PER_CLIENT,
+                 service_time: float = JOB_SERVICE_TIME):
+        """
+        Args:
+            store: Job table shared by every process
+            handlers: kind -> fn(payload) -> JSON-serialisable result; an
+                HTTPException's status code and detail are kept as the job's error
+            workers: Worker threads in this process
+            ready: Workers do not claim jobs until this is set (e.g. model loaded)
+            processes: Server processes sharing the store, each with `workers` threads (for the expected wait)
+            max_queued: Queue cap across every process (0: none)
+            per_client: Queued + running jobs allowed per client (0: no limit)
+            service_time: Initial estimate of one job's duration, seconds; then a moving average
+        """
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.ready = ready
+        self.processes = processes
+        self.max_queued = max_queued
+        self.per_client = per_client
+        self.service_time = service_time
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        # Set once stopped and no job is left running: the heartbeat keeps going until then
+        self._drained = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        self._drained.clear()
+        self._recover_local()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(f"{self._worker_prefix}:{i}",),
+                                      name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        maintenance = threading.Thread(target=self._maintain, name="job-maintenance", daemon=True)
+        maintenance.start()
+        self._threads.append(maintenance)
+
+    def _recover_local(self):
+        """Jobs left running by a dead process on this host go back to the queue now rather than after JOB_STALE_AFTER."""
+        host = socket.gethostname()
+        dead = []
+        for job_id, worker in self.store.running_on(host):
+            pid = int(worker.split(":")[1])
+            if pid == os.getpid():
+                # Restarted with the same PID (e.g. PID 1 in a container): we have not claimed anything yet
+                dead.append(job_id)
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                dead.append(job_id)
+            except PermissionError:
+                pass
+        if dead:
+            self.store.expire_heartbeats(dead)
+            self.store.reclaim_stale()
+
+    def stop(self, grace: float = JOB_STOP_GRACE):
+        """
+        Stops claiming jobs and waits up to `grace` seconds for the running ones.
+
+        Jobs still running after that are not put back in the queue, since
+        another worker would run them a second time while they finish here.
+        They stay heartbeated until they finish; if the process exits first,
+        the heartbeat stops and _recover_local() or reclaim_stale() in
+        another process requeues them.
+        """
+        self._stop.set()
+        self._wake.set()
+        deadline = time.monotonic() + grace
+        for thread in self._threads:
+            if thread.name != "job-maintenance":
+                thread.join(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            left = len(self._running)
+            if not left:
+                self._drained.set()
+        if left:
+            log.warning(f"⚠️ {left} job(s) still running at shutdown; left to the heartbeat to requeue if lost")
+        self._threads = []
+
+    def expected_wait(self) -> float:
+        """Seconds a job submitted now would wait for a worker."""
+        queued = self.store.count(QUEUED)
+        return (queued + 1) * self.service_time / max(1, self.workers * self.processes)
+
+    def submit(self, kind: str, payload: dict, client: str = None) -> str:
+        """
+        Queues a job for any worker process.
+
+        Raises:
+            Rejected: Queue full or client limit reached; retry_after is the expected wait
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        try:
+            job_id = self.store.submit(kind, payload, client, self.max_queued, self.per_client)
+        except Rejected as e:
+            e.retry_after = self.expected_wait()
+            raise
+        self._wake.set()
+        return job_id
+
+    def _work(self, worker: str):
+        if self.ready is not None:
+            while not self.ready.wait(1.0):
+                if self._stop.is_set():
+                    return
+        while not self._stop.is_set():
+            job = self.store.claim(worker)
+            if job is None:
+                self._wake.wait(JOB_POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: dict):
+        job_id, kind, worker = job["id"], job["kind"], job["worker"]
+        JOB_QUEUE_WAIT.observe(job["started_at"] - job["created_at"], kind=kind)
+        with self._lock:
+            self._running.add(job_id)
+        try:
+            with background_trace(job_id, f"job:{kind}"):
+                log.info(f"▶ Job {job_id} ({kind}) started, attempt {job['attempts']}")
+                try:
+                    result = self.handlers[kind](job["payload"])
+                except HTTPException as e:
+                    if self.store.fail(job_id, worker, e.status_code, str(e.detail)):
+                        JOBS_FINISHED.inc(kind=kind, status=FAILED)
+                    log.warning(f"⚠️ Job {job_id} failed: {e.status_code} {str(e.detail)[:100]}")
+                    return
+                except Exception as e:
+                    if self.store.fail(job_id, worker, 500, str(e)[:500]):
+                        JOBS_FINISHED.inc(kind=kind, status=FAILED)
+                    log.error(f"❌ Job {job_id} failed: {e}")
+                    return
+                if not self.store.complete(job_id, worker, result):
+                    log.warning(f"⚠️ Job {job_id} was reclaimed while running here; result dropped")
+                    return
+                JOBS_FINISHED.inc(kind=kind, status=DONE)
+                duration = time.time() - job["started_at"]
+                self.service_time += SERVICE_TIME_ALPHA * (duration - self.service_time)
+                log.info(f"✓ Job {job_id} done in {duration:.1f}s")
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+                if self._stop.is_set() and not self._running:
+                    self._drained.set()
+
+    def _maintain(self):
+        while not self._drained.wait(JOB_HEARTBEAT):
+            try:
+                with self._lock:
+                    running = list(self._running)
+                self.store.heartbeat(running)
+                if self._stop.is_set():
+                    continue
+                self.store.reclaim_stale()
+                purged = self.store.purge()
+                if purged:
+                    log.info(f"🧹 Purged {purged} expired job results")
+            except sqlite3.Error as e:
+                log.error(f"Job maintenance failed: {e}")
+
+
+def job_status(store: JobStore, job: dict) -> dict:
+    """Public view of a job for the status endpoint."""
+    view = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+    if job["status"] == QUEUED:
+        view["queue_position"] = store.queue_position(job)
+    elif job["status"] == DONE:
+        view["result"] = job["result"]
+        view["expires_at"] = job["finished_at"] + JOB_RESULT_TTL
+    elif job["status"] == FAILED:
+        view["error"] = job["error"]
+        view["expires_at"] = job["finished_at"] + JOB_RESULT_TTL
+    return view
@@ -1,5 +1,11 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import time
+_startup_t0 = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 import torch
 import torch.nn.functional as F
 import torchaudio
@@ -7,19 +13,47 @@ from torchvision import transforms
 import cv2
 import numpy as np
 import os
-import shutil
 import shutil as _shutil
-import uuid
 import gc
+import logging
+import threading
+import asyncio
 from PIL import Image
-import base64
 from io import BytesIO
 
 from model_arch import MultiModalDeepfakeDetector, Config
+from artifacts import ARTIFACT_DIR, ensure_model_artifact, load_mmap_state_dict
+from metrics import instrument_app, Gauge, DOWNLOAD_BYTES, PREDICTIONS
+from tracing import setup_logging, install_tracing, span
+from module_profiler import ModuleProfiler, format_table
+from profiling import ADMIN_TOKEN, check_admin_token, install_profiling
+from admission import Lane, Rejected, client_address, install_admission, reject_response
+from uploads import UPLOAD_OPENAPI, ScratchJanitor, receive_upload
+from explain_artifacts import ArtifactJanitor, artifact_url, install_artifacts, renderer, store_or_none
+from progress import emit, has_listener, event_stream, SSE_HEADERS
+from cancellation import Cancelled, current_token, request_token, run_cancellable, INFERENCE_RESERVE
+from jobs import JobStore, JobRunner, job_status, JOB_DB, JOB_MAX_WAIT, JOB_POLL_INTERVAL, QUEUED, DONE, FAILED
+
+setup_logging()
+log = logging.getLogger(__name__)
+
+# -- CPU threads: share the cores between the workers on this node instead of a fixed 1 --
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
 
-# -- MEMORY OPTIMIZATION: Reduce thread overhead for Render Free Tier --
-torch.set_num_threads(1)
+
+def threads_per_worker(workers):
+    """TORCH_NUM_THREADS if set, else the cores available to this process split across `workers`."""
+    return int(os.environ.get("TORCH_NUM_THREADS", 0)) or max(1, available_cpus() // max(1, workers))
+
+
+torch.set_num_threads(threads_per_worker(int(os.environ.get("WEB_CONCURRENCY", 1))))
 from downloader import download_video
+from streaming import stream_video_samples, STREAM_FRAME_MAX_SIDE
+from sparse_fetch import sparse_fetch_mp4, decode_sparse_keyframes
 from url_handler import detect_platform, is_supported_platform
 
 from pydantic import BaseModel
@@ -35,112 +69,211 @@ try:
 except:
     pass
 
-app = FastAPI(title="Deepfake Detection API")
-
-# --- CRITICAL FIX 1: Enable CORS ---
-# This allows your Vue.js frontend running on a different port to contact this API
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, specify your frontend URL (e.g., ["http://localhost:5173"])
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # -- Load Configuration and Model --
 config = Config()
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-MODEL_PATH = "best_model.pth" 
+MODEL_PATH = os.environ.get("MODEL_PATH", "best_model.pth")
 HF_MODEL_URL = "https://huggingface.co/vedant3114/best_model_video/resolve/main/best_model.pth"
+# Optional pinned checkpoint digest; without it the X-Linked-Etag from Hugging Face is used
+MODEL_SHA256 = os.environ.get("MODEL_SHA256")
+
+# -- URL streaming: decode while yt-dlp downloads instead of waiting for the whole file --
+STREAM_URL_VIDEO = os.environ.get("STREAM_URL_VIDEO", "1") == "1"
+STREAM_WINDOW_SECONDS = float(os.environ.get("STREAM_WINDOW_SECONDS", config.SEQUENCE_LENGTH))
+# -- Direct MP4/MOV links: fetch only the index, sampled keyframes and audio via HTTP Range --
+SPARSE_FETCH_DIRECT = os.environ.get("SPARSE_FETCH_DIRECT", "1") == "1"
+SPARSE_FETCH_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+# -- Streaming endpoints: preliminary score once this many sampled frames are decoded (0 disables) --
+PRELIMINARY_FRAMES = int(os.environ.get("PRELIMINARY_FRAMES", 8))
+# -- Uploads: images are decoded from memory, videos from a tmpfs scratch file (see uploads.py) --
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+log.info(f"Using device: {DEVICE}")
 
-print(f"Using device: {DEVICE}")
+# -- Startup: model loading runs in a background thread so the server binds immediately --
+WARMUP_FORWARD = os.environ.get("WARMUP_FORWARD", "1") == "1"
+MODEL_DOWNLOAD_TIMEOUT = float(os.environ.get("MODEL_DOWNLOAD_TIMEOUT", "30"))
+# -- Per-submodule forward timing (also switchable at runtime via /admin/module-profile) --
+MODULE_PROFILING = os.environ.get("MODULE_PROFILING", "0") == "1"
 
-# -- Diagnostic: Test Network on Startup --
+model = None
+model_ready = threading.Event()
+model_error = None
+module_profiler = None
+startup_timings = {}
+# -- Asynchronous URL jobs (see jobs.py); created per server process in the lifespan --
+job_runner = None
+
+
+# -- Diagnostic: Test Network (on demand via /diagnostics/network) --
 def test_network():
-    print("🌐 Testing Network Connectivity...")
+    log.info("🌐 Testing Network Connectivity...")
+    results = {}
     try:
         import socket
         # Test 1: Google DNS
         ip = socket.gethostbyname("www.google.com")
-        print(f"   ✓ DNS Resolution (Google): {ip}")
+        results["dns_google"] = ip
+        log.info(f"   ✓ DNS Resolution (Google): {ip}")
         
         # Test 2: Target (Instagram)
         ip_ig = socket.gethostbyname("www.instagram.com")
-        print(f"   ✓ DNS Resolution (Instagram): {ip_ig}")
+        results["dns_instagram"] = ip_ig
+        log.info(f"   ✓ DNS Resolution (Instagram): {ip_ig}")
         
         # Test 3: Public IP
         import requests
         public_ip = requests.get("https://api64.ipify.org?format=json", timeout=5).json()["ip"]
-        print(f"   ✓ Public IP: {public_ip}")
+        results["public_ip"] = public_ip
+        log.info(f"   ✓ Public IP: {public_ip}")
         
     except Exception as e:
-        print(f"   ❌ Network Diagnostic Failed: {e}")
+        results["error"] = str(e)
+        log.error(f"   ❌ Network Diagnostic Failed: {e}")
+    return results
 
-test_network()
 
-# Initialize Model
-model = MultiModalDeepfakeDetector().to(DEVICE)
+def load_weights(net, weights_path):
+    """Maps the converted weights into `net` (no heap copy) and freezes it for inference."""
+    log.info(f"Loading weights from {weights_path}...")
+    state_dict = load_mmap_state_dict(weights_path)
+    # assign=True makes the parameters the mmap-backed tensors instead of copying into fresh storage
+    net.load_state_dict(state_dict, assign=True)
+    del state_dict
+    gc.collect() # Drop the freshly initialised parameters that were replaced
+    
+    # --- CRITICAL: Force evaluation mode and disable gradients ---
+    net.eval()
+    for param in net.parameters():
+        param.requires_grad = False
 
-# -- Helper: Download Model if Missing --
-def download_model_if_missing():
-    if not os.path.exists(MODEL_PATH):
-        print(f"Model file {MODEL_PATH} not found. Downloading from Hugging Face...")
-        print(f"URL: {HF_MODEL_URL}")
-        try:
-            import requests
-            response = requests.get(HF_MODEL_URL, stream=True)
-            response.raise_for_status()
-            
-            with open(MODEL_PATH, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            print("✓ Model downloaded successfully!")
-        except Exception as e:
-            print(f"❌ Failed to download model: {e}")
-            # We will attempt to load anyway, which will likely fail, but let the error propagate naturally below
-            pass
-    else:
-        print(f"✓ Model file {MODEL_PATH} found locally.")
 
-# Download model if needed
-download_model_if_missing()
+def warm_up(net):
+    """One forward pass on silent audio and blank frames so the first request does not pay for lazy init."""
+    audio = silent_audio_tensor().unsqueeze(0).to(DEVICE)
+    video = video_tensor_from_frames([]).unsqueeze(0).to(DEVICE)
+    with torch.no_grad():
+        net(audio, video)
 
-# Load Weights
-if os.path.exists(MODEL_PATH):
-    print(f"Loading weights from {MODEL_PATH}...")
+
+def _timed(phase, fn, *args):
+    start = time.perf_counter()
     try:
-        # --- CRITICAL FIX 2: weights_only=False for older/custom checkpoints ---
-        # MEMORY FIX: Load to CPU explicitly to avoid any CUDA overhead allocation if not present
-        checkpoint = torch.load(MODEL_PATH, map_location='cpu', weights_only=False)
-        
-        if 'model_state_dict' in checkpoint:
-            state_dict = checkpoint['model_state_dict']
-            del checkpoint # Free up the wrapper dict immediately
-            gc.collect()
-            model.load_state_dict(state_dict)
-            del state_dict # Free up the state dict copy
-        else:
-            model.load_state_dict(checkpoint)
-            del checkpoint
-        
-        gc.collect() # Force cleanup
-        
-        # --- CRITICAL: Force evaluation mode and disable gradients ---
-        model.eval()
-        for param in model.parameters():
-            param.requires_grad = False
-        
-        print(f"Model Loaded Successfully! Memory usage optimized.")
+        return fn(*args)
+    finally:
+        startup_timings[phase] = round(time.perf_counter() - start, 3)
+
+
+def load_model():
+    """Background startup: fetch/convert the artifact, build, map weights, warm up."""
+    global model, model_error, module_profiler
+    try:
+        weights_path = _timed("model_artifact", ensure_model_artifact, MODEL_PATH, HF_MODEL_URL,
+                              MODEL_SHA256, ARTIFACT_DIR, MODEL_DOWNLOAD_TIMEOUT)
+
+        net = _timed("model_build", MultiModalDeepfakeDetector)
+        _timed("weights_load", load_weights, net, weights_path)
+        net = net.to(DEVICE)
+        if WARMUP_FORWARD:
+            _timed("warmup_forward", warm_up, net)
+
+        model = net
+        module_profiler = ModuleProfiler(net)
+        if MODULE_PROFILING:
+            module_profiler.enable()
+        model_ready.set()
+        log.info("Model Loaded Successfully! Memory usage optimized.")
     except Exception as e:
-        print(f"Error loading model: {e}")
-        # In production, we might want to crash if model fails, but for now print error
-else:
-    print(f"WARNING: Model file not found at {MODEL_PATH}. Inference will fail.")
+        model_error = str(e)
+        log.error(f"Error loading model: {e}")
+    finally:
+        startup_timings["ready_after"] = round(time.perf_counter() - _startup_t0, 3)
+        phases = " | ".join(f"{k} {v:.2f}s" for k, v in startup_timings.items())
+        log.info(f"⏱ Startup: {phases}")
+
+
+def start_torch_profile(out_dir):
+    """Op-level torch profiler for one profiled request (see profiling.py)."""
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if DEVICE.type == 'cuda':
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    prof = torch.profiler.profile(activities=activities, profile_memory=True)
+    prof.__enter__()
+    return prof
+
+
+def stop_torch_profile(prof, out_dir):
+    prof.__exit__(None, None, None)
+    prof.export_chrome_trace(os.path.join(out_dir, "torch_trace.json"))
+    ops = prof.key_averages()
+    if not ops:
+        log.warning(f"⚠️ Torch profile in {out_dir} recorded no ops; was it started in the thread running the model?")
+    with open(os.path.join(out_dir, "torch_ops.txt"), "w") as f:
+        f.write(ops.table(sort_by="self_cpu_time_total", row_limit=40) if ops else "No ops recorded\n")
+
+
+def require_model():
+    """Raises 503 until the background load has finished."""
+    if not model_ready.is_set():
+        detail = f"Model failed to load: {model_error}" if model_error else "Model is still loading"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_timings["imports"] = round(time.perf_counter() - _startup_t0, 3)
+    # Workers forked by serve.py inherit a model the parent already loaded
+    if not model_ready.is_set():
+        threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+    global job_runner
+    job_runner = JobRunner(JobStore(JOB_DB), {
+        "predict-video-url": lambda payload: run_predict_video_url(payload["url"]),
+        "predict-url-explain": lambda payload: run_predict_url_explain(payload["url"]),
+    }, ready=model_ready, processes=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    job_runner.start()
+    janitor, artifact_janitor = ScratchJanitor(), ArtifactJanitor()
+    janitor.start()
+    artifact_janitor.start()
+    yield
+    artifact_janitor.stop()
+    janitor.stop()
+    job_runner.stop()
+
+
+app = FastAPI(title="Deepfake Detection API", lifespan=lifespan)
+
+# Uploads are decoded locally in seconds; URL analyses download first and can take minutes
+install_admission(app, [
+    Lane("upload", ["/predict", "/predict-explain", "/predict-explain/stream"],
+         slots=2, queue=16, max_wait=20, service_time=3),
+    Lane("url", ["/predict-video-url", "/predict-url-explain", "/predict-url-explain/stream"],
+         slots=2, queue=8, max_wait=90, service_time=30),
+])
+
+# --- CRITICAL FIX 1: Enable CORS ---
+# This allows your Vue.js frontend running on a different port to contact this API
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # In production, specify your frontend URL (e.g., ["http://localhost:5173"])
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+install_artifacts(app)
+instrument_app(app)
+# torch.profiler records only the thread that enters it: the request's worker thread, via op_profile()
+install_profiling(app, op_profiler=(start_torch_profile, stop_torch_profile), per_thread=True)
+install_tracing(app)
+
+MODEL_READY_GAUGE = Gauge("model_ready", "1 once the model is loaded and warmed up")
+MODEL_READY_GAUGE.set_function(lambda: int(model_ready.is_set()))
+JOBS_QUEUED_GAUGE = Gauge("jobs_queued", "Jobs waiting for a worker (all processes sharing the job store)")
+JOBS_QUEUED_GAUGE.set_function(lambda: job_runner.store.count(QUEUED) if job_runner else 0)
 
 # -- Helper 1: Image Preprocessing (Treats Image as Static Video) --
-def preprocess_image_as_video(image_path):
-    print(f"Processing image as static video: {image_path}")
+def preprocess_image_as_video(image_path, name=None):
+    """image_path may also be a binary file object, e.g. Upload.open() over an in-memory upload."""
+    log.info(f"Processing image as static video: {name or image_path}")
     try:
         # 1. Load Image
         pil_image = Image.open(image_path).convert('RGB')
@@ -162,7 +295,7 @@ def preprocess_image_as_video(image_path):
         
         return audio_tensor, video_tensor
     except Exception as e:
-        print(f"Image preprocessing error: {e}")
+        log.error(f"Image preprocessing error: {e}")
         return None, None
 
 # -- Helper 2: Video Preprocessing with Enhanced Audio Handling --
@@ -178,7 +311,7 @@ def extract_audio_from_video(video_path, use_fallback=True):
             return waveform, sample_rate, "torchaudio"
         except RuntimeError as e:
             if "TorchCodec" in str(e) and use_fallback:
-                print(f"⚠️  TorchCodec not available, trying librosa fallback...")
+                log.warning("⚠️  TorchCodec not available, trying librosa fallback...")
                 raise
             raise
             
@@ -187,16 +320,18 @@ def extract_audio_from_video(video_path, use_fallback=True):
         try:
             import subprocess
             import io
-            print(f"Using ffmpeg audio extraction...")
+            log.info("Using ffmpeg audio extraction...")
 
             # Check ffmpeg availability first to avoid WinError when it's missing
             if _shutil.which('ffmpeg') is None:
-                print("ffmpeg not found on PATH; skipping ffmpeg audio extraction.")
+                log.warning("ffmpeg not found on PATH; skipping ffmpeg audio extraction.")
                 raise RuntimeError("ffmpeg not found")
 
             # Extract audio using ffmpeg
+            # Only the first SEQUENCE_LENGTH seconds are turned into mel segments
             cmd = [
                 'ffmpeg', '-i', str(video_path),
+                '-t', str(config.SEQUENCE_LENGTH),
                 '-f', 'wav',
                 '-acodec', 'pcm_s16le',
                 '-ar', '16000',
@@ -204,81 +339,210 @@ def extract_audio_from_video(video_path, use_fallback=True):
                 '-'
             ]
 
-            result = subprocess.run(cmd, capture_output=True, timeout=30)
-            if result.returncode == 0:
+            # Killed if the client leaves; gets at most half the time left, the rest is for frames and inference
+            token = current_token()
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            with token.on_cancel(proc.kill):
+                try:
+                    stdout, _ = proc.communicate(timeout=min(30, token.budget(INFERENCE_RESERVE) / 2))
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.communicate()
+                    raise
+            token.check()
+            if proc.returncode == 0:
                 # Load from bytes using scipy
                 try:
                     from scipy.io import wavfile
-                    import tempfile
-                    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
-                        f.write(result.stdout)
-                        temp_path = f.name
-
-                    sample_rate, audio_data = wavfile.read(temp_path)
+                    sample_rate, audio_data = wavfile.read(io.BytesIO(stdout))
                     waveform = torch.from_numpy(audio_data.astype(np.float32) / 32768.0).unsqueeze(0)
-                    os.remove(temp_path)
                     return waveform, sample_rate, "ffmpeg"
                 except Exception:
                     pass
+        except Cancelled:
+            raise
         except Exception as e2:
-            print(f"ffmpeg extraction failed or skipped: {e2}")
+            log.warning(f"ffmpeg extraction failed or skipped: {e2}")
         
         # Method 3: Return silence if audio extraction fails
-        print(f"⚠️  Audio extraction failed ({str(e)[:50]}...). Using silent audio.")
-        print("Note: This will affect consistency detection accuracy.")
+        log.warning(f"⚠️  Audio extraction failed ({str(e)[:50]}...). Using silent audio.")
+        log.warning("Note: This will affect consistency detection accuracy.")
         return None, None, "silence"
 
 
-def preprocess_video(video_path):
-    print(f"Processing video file: {video_path}")
+# Shared by file and stream preprocessing
+video_frame_transform = transforms.Compose([
+    transforms.ToPILImage(), 
+    transforms.Resize((config.IMG_SIZE, config.IMG_SIZE)), 
+    transforms.ToTensor(), 
+    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+])
+
+
+def silent_audio_tensor():
+    expected_time_dim = int(config.AUDIO_SAMPLE_RATE * 1.0 / 512) + 1
+    return torch.zeros((config.SEQUENCE_LENGTH, config.AUDIO_N_MELS, expected_time_dim))
+
+
+def audio_tensor_from_waveform(waveform, sample_rate):
+    """Turns a [channels, samples] waveform into SEQUENCE_LENGTH one-second mel segments."""
+    # Resample if needed
+    if sample_rate != config.AUDIO_SAMPLE_RATE:
+        resampler = torchaudio.transforms.Resample(sample_rate, config.AUDIO_SAMPLE_RATE)
+        waveform = resampler(waveform)
+    
+    # Convert to mono
+    if waveform.shape[0] > 1: 
+        waveform = torch.mean(waveform, dim=0, keepdim=True)
+    
+    # Create mel spectrogram
+    mel_spectrogram = torchaudio.transforms.MelSpectrogram(
+        sample_rate=config.AUDIO_SAMPLE_RATE, n_fft=config.AUDIO_N_FFT, 
+        n_mels=config.AUDIO_N_MELS, hop_length=512, power=2.0
+    )
+    
+    segment_samples = int(config.AUDIO_SAMPLE_RATE * 1.0)
+    audio_segments = []
+    
+    for i in range(config.SEQUENCE_LENGTH):
+        start = i * segment_samples
+        if start >= waveform.shape[1]:
+            segment = torch.zeros(1, segment_samples)
+        else:
+            segment = waveform[:, start:start+segment_samples]
+        
+        if segment.shape[1] < segment_samples:
+            segment = F.pad(segment, (0, segment_samples - segment.shape[1]))
+        
+        mel_spec = mel_spectrogram(segment)
+        audio_segments.append(mel_spec.squeeze(0))
+    
+    return torch.stack(audio_segments)
+
+
+def video_tensor_from_frames(frames):
+    """Stacks RGB frames (None for unreadable ones) into a [SEQUENCE_LENGTH, 3, H, W] tensor."""
+    tensors = []
+    for frame in frames[:config.SEQUENCE_LENGTH]:
+        if frame is None:
+            tensors.append(torch.zeros(3, config.IMG_SIZE, config.IMG_SIZE))
+        else:
+            tensors.append(video_frame_transform(frame))
+    while len(tensors) < config.SEQUENCE_LENGTH:
+        tensors.append(torch.zeros(3, config.IMG_SIZE, config.IMG_SIZE))
+    return torch.stack(tensors)
+
+
+def coarse_to_fine(length):
+    """Sequence positions with an evenly spaced subset of PRELIMINARY_FRAMES first, then the rest."""
+    stride = max(1, length // PRELIMINARY_FRAMES) if PRELIMINARY_FRAMES else 1
+    return list(range(0, length, stride)) + [p for p in range(length) if p % stride]
+
+
+def preliminary_prediction(frames, positions, audio_tensor=None):
+    """
+    Scores the reduced sequence decoded so far, so streaming clients get an
+    early estimate before the remaining frames are in.
+
+    Args:
+        frames: RGB frames (None for unreadable ones), in sequence order
+        positions: Sequence position of each frame, used to pick the matching audio steps
+        audio_tensor: Full [SEQUENCE_LENGTH, ...] audio input, or None if not extracted yet (silence)
+
+    Returns:
+        dict: label, score, confidence, frames_used, audio
+    """
+    video = torch.stack([video_frame_transform(f) if f is not None else torch.zeros(3, config.IMG_SIZE, config.IMG_SIZE)
+                         for f in frames])
+    audio = (audio_tensor if audio_tensor is not None else silent_audio_tensor())[list(positions)]
+    with torch.no_grad(), span("preliminary_inference"):
+        outputs = model(audio.unsqueeze(0).to(DEVICE), video.unsqueeze(0).to(DEVICE))
+        confidence_scores = F.softmax(outputs['logits'], dim=1)
+        prediction_idx = torch.argmax(confidence_scores, dim=1).item()
+        conf_score = confidence_scores[0, prediction_idx].item()
+    return {
+        "label": "DEEPFAKE" if prediction_idx == 1 else "AUTHENTIC",
+        "score": round(conf_score, 4),
+        "confidence": round(conf_score * 100, 2),
+        "frames_used": len(frames),
+        "audio": audio_tensor is not None,
+    }
+
+
+def report_frames(frames, positions, audio_tensor=None):
+    """
+    Frame progress for streaming clients, plus a preliminary score once
+    PRELIMINARY_FRAMES are decoded. No-op without a streaming client.
+
+    Args:
+        frames: Frames decoded so far
+        positions: Sequence position of each decoded frame (ascending for the first PRELIMINARY_FRAMES)
+        audio_tensor: Audio input, if already extracted
+    """
+    if not has_listener():
+        return
+    emit("frames", decoded=len(frames), total=config.SEQUENCE_LENGTH)
+    if PRELIMINARY_FRAMES and len(frames) == PRELIMINARY_FRAMES < config.SEQUENCE_LENGTH and model_ready.is_set():
+        try:
+            emit("preliminary", **preliminary_prediction(frames, positions, audio_tensor))
+        except Exception as e:
+            log.warning(f"⚠️  Preliminary inference failed: {e}")
+
+
+def fill_undecoded(frames, positions):
+    """
+    Deadline fallback: fills the sequence positions that were never decoded
+    with the nearest decoded frame, so the model still sees a full sequence.
+
+    Args:
+        frames: SEQUENCE_LENGTH slots, modified in place
+        positions: Positions that were decoded
+
+    Returns:
+        list: For each position, the decoded position its frame came from
+    """
+    decoded = sorted(positions)
+    sources = [pos if pos in positions else min(decoded, key=lambda p: abs(p - pos)) for pos in range(len(frames))]
+    for pos, source in enumerate(sources):
+        frames[pos] = frames[source]
+    return sources
+
+
+def preprocess_video(video_path, keep_frames=False):
+    """
+    Decodes the audio and SEQUENCE_LENGTH evenly spaced frames of a video file.
+
+    Args:
+        video_path: Local video file
+        keep_frames: Also return the sampled frames at display resolution, so
+            explanations can show them without decoding the file again
+
+    Returns:
+        (audio_tensor, video_tensor, samples): video_tensor is None if no frame could
+        be read; samples ('frames', 'frame_indices' like the URL paths) only with keep_frames
+    """
+    log.info(f"Processing video file: {video_path}")
+    token = current_token()
     
     # --- Audio Extraction with Enhanced Error Handling ---
     audio_tensor = None
     try:
-        waveform, sample_rate, extraction_method = extract_audio_from_video(video_path)
+        with span("audio_extract"):
+            waveform, sample_rate, extraction_method = extract_audio_from_video(video_path)
         
         if waveform is not None:
-            print(f"✓ Audio extracted using: {extraction_method}")
-            
-            # Resample if needed
-            if sample_rate != config.AUDIO_SAMPLE_RATE:
-                resampler = torchaudio.transforms.Resample(sample_rate, config.AUDIO_SAMPLE_RATE)
-                waveform = resampler(waveform)
-            
-            # Convert to mono
-            if waveform.shape[0] > 1: 
-                waveform = torch.mean(waveform, dim=0, keepdim=True)
-            
-            # Create mel spectrogram
-            mel_spectrogram = torchaudio.transforms.MelSpectrogram(
-                sample_rate=config.AUDIO_SAMPLE_RATE, n_fft=config.AUDIO_N_FFT, 
-                n_mels=config.AUDIO_N_MELS, hop_length=512, power=2.0
-            )
-            
-            segment_samples = int(config.AUDIO_SAMPLE_RATE * 1.0)
-            audio_segments = []
-            
-            for i in range(config.SEQUENCE_LENGTH):
-                start = i * segment_samples
-                if start >= waveform.shape[1]:
-                    segment = torch.zeros(1, segment_samples)
-                else:
-                    segment = waveform[:, start:start+segment_samples]
-                
-                if segment.shape[1] < segment_samples:
-                    segment = F.pad(segment, (0, segment_samples - segment.shape[1]))
-                
-                mel_spec = mel_spectrogram(segment)
-                audio_segments.append(mel_spec.squeeze(0))
-            
-            audio_tensor = torch.stack(audio_segments)
+            log.info(f"✓ Audio extracted using: {extraction_method}")
+            audio_tensor = audio_tensor_from_waveform(waveform, sample_rate)
+            emit("audio", method=extraction_method, seconds=round(waveform.shape[1] / sample_rate, 2))
         else:
             raise Exception("Audio extraction returned None")
             
+    except Cancelled:
+        raise
     except Exception as e:
-        print(f"⚠️  Audio warning (using silence): {str(e)[:100]}")
-        expected_time_dim = int(config.AUDIO_SAMPLE_RATE * 1.0 / 512) + 1
-        audio_tensor = torch.zeros((config.SEQUENCE_LENGTH, config.AUDIO_N_MELS, expected_time_dim))
+        log.warning(f"⚠️  Audio warning (using silence): {str(e)[:100]}")
+        audio_tensor = silent_audio_tensor()
+        emit("audio", method="silence")
 
     # --- Video Extraction ---
     video_tensor = None
@@ -286,71 +550,226 @@ def preprocess_video(video_path):
         cap = cv2.VideoCapture(str(video_path))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        if total_frames < 1: return audio_tensor, None
+        if total_frames < 1: return audio_tensor, None, None
         
         frame_indices = np.linspace(0, total_frames - 1, config.SEQUENCE_LENGTH, dtype=int)
-        frames = []
-        transform = transforms.Compose([
-            transforms.ToPILImage(), 
-            transforms.Resize((config.IMG_SIZE, config.IMG_SIZE)), 
-            transforms.ToTensor(), 
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        frames = [None] * config.SEQUENCE_LENGTH
+        sources = range(config.SEQUENCE_LENGTH)
+        decoded, positions = [], []
         
-        for idx in frame_indices:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-            ret, frame = cap.read()
-            if ret:
-                frames.append(transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
-            else:
-                frames.append(torch.zeros(3, config.IMG_SIZE, config.IMG_SIZE))
+        with span("frame_sample"):
+            # Every seek decodes from a keyframe anyway, so visit positions coarse-to-fine:
+            # the first frames decoded already span the clip for the preliminary score
+            for pos in coarse_to_fine(config.SEQUENCE_LENGTH):
+                if len(positions) >= max(1, PRELIMINARY_FRAMES) and token.remaining() < INFERENCE_RESERVE:
+                    # Near the deadline: the frames so far already span the clip, score those
+                    log.warning(f"⏱️  Deadline near; using {len(positions)}/{config.SEQUENCE_LENGTH} sampled frames")
+                    sources = fill_undecoded(frames, positions)
+                    break
+                token.check()
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_indices[pos])
+                ret, frame = cap.read()
+                frames[pos] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) if ret else None
+                decoded.append(frames[pos])
+                positions.append(pos)
+                report_frames(decoded, positions, audio_tensor)
         cap.release()
-        video_tensor = torch.stack(frames)
+        video_tensor = video_tensor_from_frames(frames)
+    except Cancelled:
+        cap.release()
+        raise
     except Exception as e:
-        print(f"Video error: {e}")
-        return audio_tensor, None
-        
-    return audio_tensor, video_tensor
+        log.error(f"Video error: {e}")
+        return audio_tensor, None, None
 
-# -- Helper 3: Extract Frames for Explainability --
-def extract_frames_base64(video_path, frame_indices):
+    samples = None
+    if keep_frames:
+        # At most SEQUENCE_LENGTH frames of at most STREAM_FRAME_MAX_SIDE pixels; deadline-filled slots share one array
+        display = {source: display_frame(frames[source]) if frames[source] is not None else None
+                   for source in set(sources)}
+        samples = {
+            'frames': [display[source] for source in sources],
+            'frame_indices': [int(frame_indices[source]) for source in sources],
+        }
+    return audio_tensor, video_tensor, samples
+
+
+def display_frame(rgb_frame):
+    """Downscales a frame to the size kept around for UI thumbnails."""
+    h, w = rgb_frame.shape[:2]
+    scale = STREAM_FRAME_MAX_SIDE / max(h, w)
+    if scale >= 1:
+        return rgb_frame
+    return cv2.resize(rgb_frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+def preprocess_sparse_video(url):
     """
-    Extracts frames at specific indices and converts them to base64 strings.
-    Used for showing anomalous frames in the UI.
+    Range-fetches only the sampled keyframes and the audio window of a direct
+    MP4/MOV URL, then preprocesses that sparse file.
+    
+    Returns:
+        (audio_tensor, video_tensor, samples) like preprocess_video_stream.
     """
-    frames_data = []
+    with span("download"):
+        fetched = sparse_fetch_mp4(
+            url,
+            num_frames=config.SEQUENCE_LENGTH,
+            audio_seconds=config.SEQUENCE_LENGTH,
+            output_dir="tmp_downloads",
+            timeout=current_token().budget(INFERENCE_RESERVE, cap=30),
+        )
+    DOWNLOAD_BYTES.inc(fetched['bytes_transferred'], platform="direct", method="sparse")
     try:
-        cap = cv2.VideoCapture(str(video_path))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        with span("frame_sample"):
+            frames = decode_sparse_keyframes(fetched['path'], fetched['frame_indices'])
+        emit("frames", decoded=len(frames), total=config.SEQUENCE_LENGTH)
+        video_tensor = video_tensor_from_frames(frames)
         
-        if total_frames > 0:
-            for idx in frame_indices:
-                # Clamp index to be safe
-                safe_idx = max(0, min(int(idx), total_frames - 1))
-                cap.set(cv2.CAP_PROP_POS_FRAMES, safe_idx)
-                ret, frame = cap.read()
-                if ret:
-                    # Convert BGR to RGB
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    pil_img = Image.fromarray(rgb_frame)
-                    
-                    # Resize for display to reduce payload size (e.g., max 300px height)
-                    # This keeps the response JSON manageable
-                    pil_img.thumbnail((300, 300))
-                    
-                    buffered = BytesIO()
-                    pil_img.save(buffered, format="JPEG", quality=70)
-                    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                    
-                    frames_data.append({
-                        "frame_index": safe_idx,
-                        "confidence_score": 0.0, # Placeholder, can be mapped from consistency score if needed
-                        "image_base64": f"data:image/jpeg;base64,{img_str}"
-                    })
-        cap.release()
-    except Exception as e:
-        print(f"Error extracting frames: {e}")
-    return frames_data
+        audio_tensor = None
+        try:
+            with span("audio_extract"):
+                waveform, sample_rate, extraction_method = extract_audio_from_video(fetched['path'])
+            if waveform is not None:
+                log.info(f"✓ Audio extracted using: {extraction_method}")
+                audio_tensor = audio_tensor_from_waveform(waveform, sample_rate)
+                emit("audio", method=extraction_method, seconds=round(waveform.shape[1] / sample_rate, 2))
+        except Cancelled:
+            raise
+        except Exception as e:
+            log.warning(f"⚠️  Audio warning (using silence): {str(e)[:100]}")
+        if audio_tensor is None:
+            audio_tensor = silent_audio_tensor()
+            emit("audio", method="silence")
+    finally:
+        try:
+            os.remove(fetched['path'])
+        except OSError:
+            pass
+    
+    samples = {
+        'frames': [display_frame(frame) for frame in frames],
+        'frame_indices': fetched['frame_indices'],
+    }
+    return audio_tensor, video_tensor, samples
+
+
+def preprocess_video_stream(url):
+    """
+    Streaming counterpart of download_video + preprocess_video.
+    Samples SEQUENCE_LENGTH frames over the first STREAM_WINDOW_SECONDS while the
+    video is still downloading and stops the transfer once they are captured.
+    Near the request deadline the transfer is stopped early and the frames
+    captured so far are spread over the sequence.
+    
+    Returns:
+        (audio_tensor, video_tensor, samples) where samples holds the decoded RGB
+        frames and their approximate source frame indices.
+    """
+    # Download, frame sampling and audio extraction overlap in one ffmpeg pipeline
+    with span("stream_decode"):
+        samples = stream_video_samples(
+            url,
+            num_frames=config.SEQUENCE_LENGTH,
+            window_seconds=STREAM_WINDOW_SECONDS,
+            sample_rate=config.AUDIO_SAMPLE_RATE,
+            timeout=current_token().budget(INFERENCE_RESERVE, cap=120),
+            # Frames arrive in time order; audio is only complete at the end
+            on_frame=lambda frames: report_frames(frames, range(len(frames))),
+        )
+    
+    if samples['waveform'] is not None and samples['waveform'].size > 0:
+        waveform = torch.from_numpy(samples['waveform']).unsqueeze(0)
+        audio_tensor = audio_tensor_from_waveform(waveform, samples['sample_rate'])
+        emit("audio", method="stream", seconds=round(samples['waveform'].size / samples['sample_rate'], 2))
+    else:
+        log.warning("⚠️  Stream has no audio track. Using silent audio.")
+        audio_tensor = silent_audio_tensor()
+        emit("audio", method="silence")
+    
+    video_tensor = video_tensor_from_frames(samples['frames'])
+    return audio_tensor, video_tensor, samples
+
+# -- Helper 3: Anomalous Frames for Explainability --
+FRAME_THUMBNAIL_SIDE = int(os.environ.get("FRAME_THUMBNAIL_SIDE", 300))
+FRAME_THUMBNAIL_QUALITY = int(os.environ.get("FRAME_THUMBNAIL_QUALITY", 70))
+
+
+@renderer("frame", variant=f"jpeg{FRAME_THUMBNAIL_QUALITY}-{FRAME_THUMBNAIL_SIDE}")
+def render_frame_thumbnail(inputs):
+    """Encodes a stored RGB frame as a small JPEG for the UI (on its first fetch, see explain_artifacts.py)."""
+    pil_img = Image.fromarray(inputs['frame'])
+    pil_img.thumbnail((FRAME_THUMBNAIL_SIDE, FRAME_THUMBNAIL_SIDE))
+    buffered = BytesIO()
+    pil_img.save(buffered, format="JPEG", quality=FRAME_THUMBNAIL_QUALITY)
+    return buffered.getvalue()
+
+
+def anomalous_frame_artifacts(samples, video_temporal, count=4):
+    """
+    The `count` sampled frames with the lowest video consistency, taken from
+    the frames kept by preprocessing (no second decode). Each frame is stored
+    as an artifact; its JPEG is only encoded if a client fetches image_url.
+
+    Args:
+        samples: 'frames' (display-resolution RGB, None if unreadable) and 'frame_indices'
+        video_temporal: Per-position video consistency scores
+
+    Returns:
+        list: {frame_index, consistency_score, artifact_id, image_url}, most anomalous first;
+            artifact_id and image_url are None for a frame that could not be stored
+    """
+    picks = [i for i in np.argsort(video_temporal)[:count].tolist()
+             if i < len(samples['frames']) and samples['frames'][i] is not None]
+    frames = []
+    with span("explain_frames"):
+        for i in picks:
+            artifact_id = store_or_none("frame", frame=samples['frames'][i])
+            frames.append({
+                "frame_index": int(samples['frame_indices'][i]),
+                "consistency_score": round(float(video_temporal[i]), 4),
+                "artifact_id": artifact_id,
+                "image_url": artifact_url(artifact_id) if artifact_id else None,
+            })
+    return frames
+
+
+def load_url_video(url, platform):
+    """
+    Gets model inputs for a URL. Direct MP4/MOV links are Range-fetched sparsely,
+    other URLs are streamed when enabled, and anything that cannot be handled
+    that way falls back to a full download_video + preprocess_video.
+    
+    Returns:
+        (audio, video, video_path, samples); video_path (to clean up) only after a full download.
+
+    Raises:
+        Cancelled: If the request is cancelled or out of time; no fallback is tried then
+    """
+    token = current_token()
+    path = url.lower().split('?', 1)[0]
+    if SPARSE_FETCH_DIRECT and platform == "direct" and path.endswith(SPARSE_FETCH_EXTENSIONS):
+        try:
+            audio, video, samples = preprocess_sparse_video(url)
+            return audio, video, None, samples
+        except Exception as e:
+            token.check()
+            log.warning(f"⚠️  Sparse fetch failed ({str(e)[:100]}). Trying the next strategy.")
+    
+    if STREAM_URL_VIDEO:
+        try:
+            audio, video, samples = preprocess_video_stream(url)
+            return audio, video, None, samples
+        except Exception as e:
+            token.check()
+            log.warning(f"⚠️  Streaming analysis failed ({str(e)[:100]}). Falling back to full download.")
+    
+    with span("download"):
+        video_path = download_video(url, timeout=120)
+    DOWNLOAD_BYTES.inc(os.path.getsize(video_path), platform=platform, method="full")
+    log.info(f"✓ Download complete: {video_path}")
+    audio, video, samples = preprocess_video(video_path, keep_frames=True)
+    return audio, video, video_path, samples
 
 
 # -- API Endpoints --
@@ -359,34 +778,77 @@ def extract_frames_base64(video_path, frame_indices):
 def home():
     return {"status": "Deepfake Detection API is running"}
 
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    # 1. Determine file type
-    filename = file.filename
-    ext = os.path.splitext(filename)[1].lower()
-    temp_filename = f"temp_{uuid.uuid4()}{ext}"
-    
+@app.get("/ready")
+def ready():
+    """Readiness probe: 200 once the model is loaded and warmed up, 503 before."""
+    if model_ready.is_set():
+        return {"status": "ready", "startup_timings": startup_timings}
+    status = "error" if model_error else "loading"
+    return JSONResponse(status_code=503, content={"status": status, "error": model_error,
+                                                  "startup_timings": startup_timings},
+                        headers={"Retry-After": "5"})
+
+def require_admin(x_admin_token):
+    """Admin endpoints answer 404 unless ADMIN_TOKEN is set, and 403 without the matching X-Admin-Token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/module-profile")
+def get_module_profile(x_admin_token: str = Header(None), format: str = "json"):
+    """Per-submodule forward timings aggregated since the last reset, plus the latest per-request breakdowns."""
+    require_admin(x_admin_token)
+    require_model()
+    summary = module_profiler.summary()
+    if format == "table":
+        return PlainTextResponse(format_table(summary))
+    return {"enabled": module_profiler.enabled, **summary, "recent": module_profiler.recent()}
+
+
+@app.post("/admin/module-profile")
+def set_module_profile(enabled: bool, reset: bool = False, x_admin_token: str = Header(None)):
+    """Attach (enabled=true) or detach the forward hooks; reset=true clears collected timings."""
+    require_admin(x_admin_token)
+    require_model()
+    if reset:
+        module_profiler.reset()
+    if enabled:
+        module_profiler.enable()
+    else:
+        module_profiler.disable()
+    return {"enabled": module_profiler.enabled}
+
+
+@app.get("/diagnostics/network")
+async def network_diagnostics(x_admin_token: str = Header(None)):
+    """Outbound DNS/HTTP checks from the server; an admin endpoint, since it reveals the host's network setup."""
+    require_admin(x_admin_token)
+    return await run_in_threadpool(test_network)
+
+def run_predict(upload):
+    """Predicts a received upload (image or video)."""
+    filename = upload.filename
     try:
-        # 2. Save file
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # 3. Choose Preprocessor based on extension
-        if ext in ['.jpg', '.jpeg', '.png', '.webp']:
-            audio, video = preprocess_image_as_video(temp_filename)
+        # 1. Choose Preprocessor based on extension
+        if upload.ext in IMAGE_EXTENSIONS:
+            audio, video = preprocess_image_as_video(upload.open(), upload.filename)
         else:
-            audio, video = preprocess_video(temp_filename)
+            audio, video, _ = preprocess_video(upload.file_path())
         
         if video is None:
             raise HTTPException(status_code=400, detail="Could not process file content.")
 
-        # 4. Inference
+        # 2. Inference
         audio = audio.unsqueeze(0).to(DEVICE)
         video = video.unsqueeze(0).to(DEVICE)
         
         # --- CRITICAL: Ensure model is in eval mode and use no_grad context ---
+        # Skip the forward pass if nobody is waiting for it any more
+        current_token().check()
         model.eval()
-        with torch.no_grad():
+        with torch.no_grad(), span("inference"):
             outputs = model(audio, video)
             logits = outputs['logits']
             confidence_scores = F.softmax(logits, dim=1)
@@ -394,6 +856,7 @@ async def predict(file: UploadFile = File(...)):
             conf_score = confidence_scores[0, prediction_idx].item()
 
         label = "DEEPFAKE" if prediction_idx == 1 else "AUTHENTIC"
+        PREDICTIONS.inc(label=label)
         
         return {
             "status": "ok",
@@ -405,20 +868,22 @@ async def predict(file: UploadFile = File(...)):
             }
         }
 
+    except Cancelled:
+        raise
     except Exception as e:
-        print(f"Server Error: {e}")
+        log.error(f"Server Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        # 5. Clean up
-        if os.path.exists(temp_filename):
-            try:
-                os.remove(temp_filename)
-            except:
-                pass
 
-@app.post("/predict-video-url")
-async def predict_video_url(payload: VideoURLRequest):
+
+@app.post("/predict", openapi_extra=UPLOAD_OPENAPI)
+async def predict(request: Request, x_request_timeout: str = Header(None)):
+    require_model()
+    token = request_token(x_request_timeout)
+    with await receive_upload(request, memory_extensions=IMAGE_EXTENSIONS) as upload:
+        return await run_cancellable(request, token, run_predict, upload)
+
+
+def run_predict_video_url(url):
     """
     Predict deepfake from video URL (YouTube, Instagram, Facebook, TikTok, Twitter, Direct).
     
@@ -429,13 +894,9 @@ async def predict_video_url(payload: VideoURLRequest):
     4. Clean up
     5. Return results with platform info
     """
-    platform = detect_platform(payload.url)
+    platform = detect_platform(url)
     
-    print(f"\n{'='*60}")
-    print(f"URL Prediction Request")
-    print(f"Platform: {platform}")
-    print(f"URL: {payload.url[:80]}...")
-    print(f"{'='*60}")
+    log.info(f"URL Prediction Request | Platform: {platform} | URL: {url[:80]}...")
 
     if not is_supported_platform(platform):
         raise HTTPException(
@@ -443,15 +904,12 @@ async def predict_video_url(payload: VideoURLRequest):
             detail=f"Unsupported platform '{platform}'. Supported: YouTube, Instagram, Facebook, TikTok, Twitter, Direct URLs"
         )
 
+    require_model()
     video_path = None
     try:
-        # Download video
-        print(f"Downloading video from {platform}...")
-        video_path = download_video(payload.url, timeout=120)
-        print(f"✓ Download complete: {video_path}")
-        
-        # Preprocess
-        audio, video = preprocess_video(video_path)
+        # Download (or stream) and preprocess
+        log.info(f"Fetching video from {platform}...")
+        audio, video, video_path, _ = load_url_video(url, platform)
         
         if video is None:
             raise HTTPException(status_code=400, detail="Could not process video content")
@@ -460,8 +918,10 @@ async def predict_video_url(payload: VideoURLRequest):
         audio = audio.unsqueeze(0).to(DEVICE)
         video = video.unsqueeze(0).to(DEVICE)
         
+        # Skip the forward pass if nobody is waiting for it any more
+        current_token().check()
         model.eval()
-        with torch.no_grad():
+        with torch.no_grad(), span("inference"):
             outputs = model(audio, video)
             logits = outputs['logits']
             confidence_scores = F.softmax(logits, dim=1)
@@ -476,11 +936,9 @@ async def predict_video_url(payload: VideoURLRequest):
             }
         
         label = "DEEPFAKE" if prediction_idx == 1 else "AUTHENTIC"
+        PREDICTIONS.inc(label=label)
         
-        print(f"✓ Inference complete")
-        print(f"  Label: {label}")
-        print(f"  Confidence: {conf_score:.4f}")
-        print(f"{'='*60}\n")
+        log.info(f"✓ Inference complete | Label: {label} | Confidence: {conf_score:.4f}")
         
         return {
             "status": "ok",
@@ -490,14 +948,14 @@ async def predict_video_url(payload: VideoURLRequest):
                 "confidence": round(conf_score * 100, 2),
                 "platform": platform,
                 "consistency_scores": consistency_data,
-                "source_url": payload.url[:50] + "..." if len(payload.url) > 50 else payload.url
+                "source_url": url[:50] + "..." if len(url) > 50 else url
             }
         }
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
+        log.error(f"❌ Error: {str(e)}")
         raise HTTPException(
             status_code=500, 
             detail=f"Prediction failed: {str(e)[:100]}"
@@ -508,9 +966,14 @@ async def predict_video_url(payload: VideoURLRequest):
         if video_path and os.path.exists(video_path):
             try:
                 os.remove(video_path)
-                print(f"✓ Cleaned up: {video_path}")
+                log.info(f"✓ Cleaned up: {video_path}")
             except Exception as e:
-                print(f"⚠️  Could not clean up {video_path}: {e}")
+                log.warning(f"⚠️  Could not clean up {video_path}: {e}")
+
+
+@app.post("/predict-video-url")
+async def predict_video_url(request: Request, payload: VideoURLRequest, x_request_timeout: str = Header(None)):
+    return await run_cancellable(request, request_token(x_request_timeout), run_predict_video_url, payload.url)
 
 
 @app.get("/supported-platforms")
@@ -530,25 +993,18 @@ async def get_supported_platforms():
     }
 
 
-@app.post("/predict-explain")
-async def predict_with_explanation(file: UploadFile = File(...)):
+def run_predict_explain(upload):
     """
-    Predict and provide detailed explainability analysis.
+    Predict and provide detailed explainability analysis of a received upload.
     Returns consistency scores, temporal analysis, and anomaly detection.
     """
-    filename = file.filename
-    ext = os.path.splitext(filename)[1].lower()
-    temp_filename = f"temp_{uuid.uuid4()}{ext}"
-    
+    filename = upload.filename
+    is_image = upload.ext in IMAGE_EXTENSIONS
     try:
-        # Save and process
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        if ext in ['.jpg', '.jpeg', '.png', '.webp']:
-            audio, video = preprocess_image_as_video(temp_filename)
+        if is_image:
+            audio, video = preprocess_image_as_video(upload.open(), upload.filename)
         else:
-            audio, video = preprocess_video(temp_filename)
+            audio, video, samples = preprocess_video(upload.file_path(), keep_frames=True)
         
         if video is None:
             raise HTTPException(status_code=400, detail="Could not process file")
@@ -557,8 +1013,10 @@ async def predict_with_explanation(file: UploadFile = File(...)):
         audio = audio.unsqueeze(0).to(DEVICE)
         video = video.unsqueeze(0).to(DEVICE)
         
+        # Skip the forward pass if nobody is waiting for it any more
+        current_token().check()
         model.eval()
-        with torch.no_grad():
+        with torch.no_grad(), span("inference"):
             outputs = model(audio, video, return_features=True)
             logits = outputs['logits']
             confidence_scores = F.softmax(logits, dim=1)
@@ -580,36 +1038,15 @@ async def predict_with_explanation(file: UploadFile = File(...)):
             anomalous_frames = []
             try:
                 # If it's a video file (not a static image pretending to be video)
-                if ext not in ['.jpg', '.jpeg', '.png', '.webp']:
-                    # 1. Identify indices with lowest consistency (most anomalous)
-                    # Sort indices by score (ascending) -> lowest score first
-                    sorted_indices = np.argsort(video_temporal)
-                    # Take top 4 most anomalous
-                    top_anomalous_sequence_indices = sorted_indices[:4].tolist()
-                    
-                    # 2. Map sequence indices back to original frame indices
-                    cap_temp = cv2.VideoCapture(temp_filename)
-                    total_frames_count = int(cap_temp.get(cv2.CAP_PROP_FRAME_COUNT))
-                    cap_temp.release()
-                    
-                    if total_frames_count > 0:
-                        all_frame_indices = np.linspace(0, total_frames_count - 1, config.SEQUENCE_LENGTH, dtype=int)
-                        target_frame_indices = [all_frame_indices[i] for i in top_anomalous_sequence_indices]
-                        
-                        # 3. Extract frames
-                        anomalous_frames = extract_frames_base64(temp_filename, target_frame_indices)
-                        
-                        # Attach consistency scores to the frames for UI
-                        for i, frame_data in enumerate(anomalous_frames):
-                            # The i-th frame corresponds to the i-th index in top_anomalous_sequence_indices
-                            # wait, extract_frames_base64 appends in order of target_frame_indices
-                            seq_idx = top_anomalous_sequence_indices[i]
-                            score = video_temporal[seq_idx]
-                            frame_data["consistency_score"] = float(score)
+                if not is_image:
+                    # Top 4 most anomalous (lowest consistency) of the frames preprocessing kept
+                    anomalous_frames = anomalous_frame_artifacts(samples, video_temporal)
             except Exception as e:
-                print(f"Error extracting anomalous frames: {e}")
+                log.error(f"Error extracting anomalous frames: {e}")
         
         label = "DEEPFAKE" if prediction_idx == 1 else "AUTHENTIC"
+        PREDICTIONS.inc(label=label)
+        emit("inference", label=label, score=round(conf_score, 4), confidence=round(conf_score * 100, 2))
         
         return {
             "status": "ok",
@@ -619,8 +1056,8 @@ async def predict_with_explanation(file: UploadFile = File(...)):
                 "confidence": round(conf_score * 100, 2),
             },
             "explainability": {
-                "audio_temporal_consistency": audio_temporal.tolist(),
-                "video_temporal_consistency": video_temporal.tolist(),
+                "audio_temporal_consistency": np.round(audio_temporal, 4).tolist(),
+                "video_temporal_consistency": np.round(video_temporal, 4).tolist(),
                 "global_consistency": {
                     "audio": round(consistency_scores['audio_consistency'][0].item(), 4),
                     "video": round(consistency_scores['video_consistency'][0].item(), 4),
@@ -640,25 +1077,53 @@ async def predict_with_explanation(file: UploadFile = File(...)):
             "filename": filename
         }
     
+    except Cancelled:
+        raise
     except Exception as e:
-        print(f"Explainability Error: {e}")
+        log.error(f"Explainability Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        if os.path.exists(temp_filename):
-            try:
-                os.remove(temp_filename)
-            except:
-                pass
 
 
-@app.post("/predict-url-explain")
-async def predict_url_with_explanation(payload: VideoURLRequest):
+@app.post("/predict-explain", openapi_extra=UPLOAD_OPENAPI)
+async def predict_with_explanation(request: Request, x_request_timeout: str = Header(None)):
+    """
+    Predict and provide detailed explainability analysis.
+    Returns consistency scores, temporal analysis, and anomaly detection.
+    """
+    require_model()
+    token = request_token(x_request_timeout)
+    with await receive_upload(request, memory_extensions=IMAGE_EXTENSIONS) as upload:
+        return await run_cancellable(request, token, run_predict_explain, upload)
+
+
+@app.post("/predict-explain/stream", openapi_extra=UPLOAD_OPENAPI)
+async def predict_with_explanation_stream(request: Request, x_request_timeout: str = Header(None)):
+    """
+    /predict-explain as Server-Sent Events: progress events while the upload
+    is decoded and scored (see progress.py), then the response as `result`.
+    """
+    require_model()
+    token = request_token(x_request_timeout)
+    upload = await receive_upload(request, memory_extensions=IMAGE_EXTENSIONS)
+
+    def work():
+        with upload:
+            return run_predict_explain(upload)
+    try:
+        # Once event_stream() returns the work is running and closes the upload itself
+        stream = event_stream(work, token=token)
+    except BaseException:
+        upload.close()
+        raise
+    return StreamingResponse(stream, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def run_predict_url_explain(url):
     """
     Predict from URL with detailed explainability.
     Combines URL downloading with temporal analysis.
     """
-    platform = detect_platform(payload.url)
+    platform = detect_platform(url)
     
     if not is_supported_platform(platform):
         raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
@@ -668,11 +1133,10 @@ async def predict_url_with_explanation(payload: VideoURLRequest):
     # if platform == "instagram":
     #     raise HTTPException(status_code=400, detail="Instagram videos are not supported on this hosting platform due to network restrictions. Please use YouTube, TikTok, or direct URLs.")
     
+    require_model()
     video_path = None
     try:
-        video_path = download_video(payload.url, timeout=120)
-        
-        audio, video = preprocess_video(video_path)
+        audio, video, video_path, samples = load_url_video(url, platform)
         
         if video is None:
             raise HTTPException(status_code=400, detail="Could not process video")
@@ -680,8 +1144,10 @@ async def predict_url_with_explanation(payload: VideoURLRequest):
         audio = audio.unsqueeze(0).to(DEVICE)
         video = video.unsqueeze(0).to(DEVICE)
         
+        # Skip the forward pass if nobody is waiting for it any more
+        current_token().check()
         model.eval()
-        with torch.no_grad():
+        with torch.no_grad(), span("inference"):
             outputs = model(audio, video, return_features=True)
             logits = outputs['logits']
             confidence_scores = F.softmax(logits, dim=1)
@@ -699,28 +1165,15 @@ async def predict_url_with_explanation(payload: VideoURLRequest):
             # --- Extract Anomalous Frames ---
             anomalous_frames = []
             try:
-                sorted_indices = np.argsort(video_temporal)
-                top_anomalous_sequence_indices = sorted_indices[:4].tolist()
-                
-                cap_temp = cv2.VideoCapture(video_path)
-                total_frames_count = int(cap_temp.get(cv2.CAP_PROP_FRAME_COUNT))
-                cap_temp.release()
-                
-                if total_frames_count > 0:
-                    all_frame_indices = np.linspace(0, total_frames_count - 1, config.SEQUENCE_LENGTH, dtype=int)
-                    target_frame_indices = [all_frame_indices[i] for i in top_anomalous_sequence_indices]
-                    
-                    anomalous_frames = extract_frames_base64(video_path, target_frame_indices)
-                    
-                    for i, frame_data in enumerate(anomalous_frames):
-                        if i < len(top_anomalous_sequence_indices):
-                            seq_idx = top_anomalous_sequence_indices[i]
-                            score = video_temporal[seq_idx]
-                            frame_data["consistency_score"] = float(score)
+                # Every URL path keeps its sampled frames in memory
+                if samples is not None:
+                    anomalous_frames = anomalous_frame_artifacts(samples, video_temporal)
             except Exception as e:
-                print(f"Error extracting anomalous frames for URL: {e}")
+                log.error(f"Error extracting anomalous frames for URL: {e}")
         
         label = "DEEPFAKE" if prediction_idx == 1 else "AUTHENTIC"
+        PREDICTIONS.inc(label=label)
+        emit("inference", label=label, score=round(conf_score, 4), confidence=round(conf_score * 100, 2))
         
         return {
             "status": "ok",
@@ -731,8 +1184,8 @@ async def predict_url_with_explanation(payload: VideoURLRequest):
                 "platform": platform
             },
             "explainability": {
-                "audio_temporal_consistency": audio_temporal.tolist(),
-                "video_temporal_consistency": video_temporal.tolist(),
+                "audio_temporal_consistency": np.round(audio_temporal, 4).tolist(),
+                "video_temporal_consistency": np.round(video_temporal, 4).tolist(),
                 "global_consistency": {
                     "audio": round(consistency_scores['audio_consistency'][0].item(), 4),
                     "video": round(consistency_scores['video_consistency'][0].item(), 4),
@@ -747,6 +1200,8 @@ async def predict_url_with_explanation(payload: VideoURLRequest):
             }
         }
     
+    except Cancelled:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -758,9 +1213,78 @@ async def predict_url_with_explanation(payload: VideoURLRequest):
                 pass
 
 
+@app.post("/predict-url-explain")
+async def predict_url_with_explanation(request: Request, payload: VideoURLRequest,
+                                       x_request_timeout: str = Header(None)):
+    return await run_cancellable(request, request_token(x_request_timeout), run_predict_url_explain, payload.url)
+
+
+@app.post("/predict-url-explain/stream")
+async def predict_url_with_explanation_stream(payload: VideoURLRequest, x_request_timeout: str = Header(None)):
+    """
+    /predict-url-explain as Server-Sent Events: download, decode and
+    preliminary-score events (see progress.py), then the response as `result`.
+    """
+    platform = detect_platform(payload.url)
+    if not is_supported_platform(platform):
+        raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
+    require_model()
+    return StreamingResponse(event_stream(run_predict_url_explain, payload.url, token=request_token(x_request_timeout)),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# -- Job API: submit returns at once, the analysis runs on a job worker --
+
+def submit_url_job(request, kind, url):
+    """Queues a URL job; 429 (as from the "jobs" lane) when the queue or the client's share is full."""
+    platform = detect_platform(url)
+    if not is_supported_platform(platform):
+        raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
+    try:
+        job_id = job_runner.submit(kind, {"url": url}, client=client_address(request.scope))
+    except Rejected as e:
+        return reject_response("jobs", e.reason, e.retry_after)
+    log.info(f"Queued job {job_id} ({kind}) | Platform: {platform}")
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": QUEUED, "status_url": f"/jobs/{job_id}"},
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+
+@app.post("/jobs/predict-video-url", status_code=202)
+async def submit_predict_video_url(request: Request, payload: VideoURLRequest):
+    """Queues /predict-video-url; poll GET /jobs/{job_id} for the result."""
+    return await run_in_threadpool(submit_url_job, request, "predict-video-url", payload.url)
+
+
+@app.post("/jobs/predict-url-explain", status_code=202)
+async def submit_predict_url_explain(request: Request, payload: VideoURLRequest):
+    """Queues /predict-url-explain; poll GET /jobs/{job_id} for the result."""
+    return await run_in_threadpool(submit_url_job, request, "predict-url-explain", payload.url)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Job status, with the endpoint's response as `result` once done (or
+    `error` with the status code and detail it would have returned).
+    With wait > 0 (seconds, up to JOB_MAX_WAIT) the call long-polls until
+    the job finishes or the wait runs out.
+    """
+    deadline = time.monotonic() + min(max(wait, 0), JOB_MAX_WAIT)
+    while True:
+        job = await run_in_threadpool(job_runner.store.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired job")
+        if job["status"] in (DONE, FAILED) or time.monotonic() >= deadline:
+            return await run_in_threadpool(job_status, job_runner.store, job)
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
 if __name__ == "__main__":
     import uvicorn
     # Use config from env or default to 8000
     port = int(os.environ.get("PORT", 8000))
-    print(f"Starting server on port {port}...")
+    log.info(f"Starting server on port {port}...")
     uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
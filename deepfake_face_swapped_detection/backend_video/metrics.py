@@ -0,0 +1,194 @@
+"""
+In-process metrics with Prometheus text exposition at GET /metrics.
+
+Counters, gauges and histograms are plain dicts behind one lock each, so an
+observation on the hot path is a dict lookup, a bisect and a few additions.
+Values are per process: with several workers each one reports its own series.
+"""
+import time
+import bisect
+import threading
+
+from starlette.responses import PlainTextResponse
+
+# Seconds; covers a sub-millisecond cache hit up to a slow full download
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.label_names)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in self._values.items()]
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, key, extra, value in self._samples():
+            lines.append(f"{name}{_format_labels(self.label_names, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge set directly, or computed at scrape time from set_function()."""
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels=()):
+        super().__init__(name, help, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn):
+        """fn() returns a number, or a {label tuple: number} dict for labelled gauges."""
+        self._function = fn
+
+    def _samples(self):
+        if self._function is None:
+            return super()._samples()
+        try:
+            value = self._function()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [(self.name, key, None, v) for key, v in value.items()]
+        return [(self.name, (), None, value)]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", key, f'le="{_format_value(bound)}"', cumulative))
+            samples.append((f"{self.name}_sum", key, None, total))
+            samples.append((f"{self.name}_count", key, None, count))
+        return samples
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -- Metrics shared by both backends --
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by endpoint and status", ("method", "endpoint", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by endpoint", ("endpoint",))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+STAGE_LATENCY = Histogram("stage_duration_seconds", "Pipeline stage latency", ("stage",))
+DOWNLOAD_BYTES = Counter("download_bytes_total", "Media bytes fetched, by platform and method", ("platform", "method"))
+PREDICTIONS = Counter("predictions_total", "Final labels returned", ("label",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests, in-flight depth and latency per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Route templates only, so unmatched paths cannot blow up label cardinality
+            endpoint = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            HTTP_REQUESTS.inc(method=scope.get("method", ""), endpoint=endpoint, status=str(status["code"]))
+
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+def instrument_app(app):
+    """Adds the metrics middleware and the GET /metrics route to a FastAPI app."""
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,190 @@
+"""
+Per-submodule forward-pass profiling for MultiModalDeepfakeDetector.
+
+Forward pre/post hooks on a fixed set of submodules record, for every model
+call, each module's wall time (inclusive and self, i.e. minus profiled
+children) and the bytes of the tensors it returns. On CUDA the hooks also
+synchronize and record the allocator delta. Hooks are only attached while
+profiling is enabled, so the normal forward path is untouched.
+"""
+import time
+import threading
+from collections import deque
+
+import torch
+
+from tracing import current_request_id
+
+# Submodules worth separating; nested entries get self time = inclusive - profiled children
+DEFAULT_MODULES = (
+    "audio_extractor",
+    "audio_extractor.conv_layers",
+    "audio_extractor.transformer_encoder",
+    "audio_consistency",
+    "video_extractor",
+    "video_extractor.backbone",
+    "video_extractor.spatial_attention",
+    "video_extractor.transformer_encoder",
+    "video_consistency",
+    "fusion_network",
+)
+
+ROOT = "model"
+
+
+def _tensor_bytes(output) -> int:
+    if torch.is_tensor(output):
+        return output.numel() * output.element_size()
+    if isinstance(output, dict):
+        return sum(_tensor_bytes(v) for v in output.values())
+    if isinstance(output, (list, tuple)):
+        return sum(_tensor_bytes(v) for v in output)
+    return 0
+
+
+class ModuleProfiler:
+    """
+    Attach with enable(); every forward of the model then adds one record.
+
+    Args:
+        model: The MultiModalDeepfakeDetector instance
+        modules: Dotted submodule names to time (the model itself is always included)
+        history: How many per-call breakdowns to keep for recent()
+    """
+
+    def __init__(self, model, modules=DEFAULT_MODULES, history: int = 20):
+        self.model = model
+        self.modules = tuple(modules)
+        self._handles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._calls = 0
+        self._recent = deque(maxlen=history)
+        self._cuda = next(model.parameters()).is_cuda
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._handles)
+
+    def enable(self):
+        if self._handles:
+            return
+        named = dict(self.model.named_modules())
+        targets = [(ROOT, self.model)] + [(name, named[name]) for name in self.modules if name in named]
+        for name, module in targets:
+            self._handles.append(module.register_forward_pre_hook(self._make_pre_hook(name)))
+            self._handles.append(module.register_forward_hook(self._make_post_hook(name)))
+
+    def disable(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def reset(self):
+        with self._lock:
+            self._totals = {}
+            self._calls = 0
+            self._recent.clear()
+
+    # -- hooks --
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "stack"):
+            state.stack = []
+            state.record = {}
+        return state
+
+    def _make_pre_hook(self, name):
+        def pre_hook(module, inputs):
+            state = self._state()
+            if name == ROOT:
+                # A forward that raised leaves its frames behind; start clean
+                state.stack, state.record = [], {}
+            if self._cuda:
+                torch.cuda.synchronize()
+            memory = torch.cuda.memory_allocated() if self._cuda else 0
+            # [name, start, children time, allocator at start]
+            state.stack.append([name, time.perf_counter(), 0.0, memory])
+        return pre_hook
+
+    def _make_post_hook(self, name):
+        def post_hook(module, inputs, output):
+            state = self._state()
+            if self._cuda:
+                torch.cuda.synchronize()
+            end = time.perf_counter()
+            _, start, children, memory = state.stack.pop()
+            elapsed = end - start
+            if state.stack:
+                state.stack[-1][2] += elapsed
+            entry = state.record.setdefault(name, {"calls": 0, "total_ms": 0.0, "self_ms": 0.0,
+                                                   "output_bytes": 0, "cuda_alloc_bytes": 0})
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed * 1000
+            entry["self_ms"] += (elapsed - children) * 1000
+            entry["output_bytes"] += _tensor_bytes(output)
+            if self._cuda:
+                entry["cuda_alloc_bytes"] += torch.cuda.memory_allocated() - memory
+            if name == ROOT:
+                self._finish(state.record)
+                state.record = {}
+        return post_hook
+
+    def _finish(self, record):
+        with self._lock:
+            self._calls += 1
+            for name, entry in record.items():
+                total = self._totals.setdefault(name, {"calls": 0, "total_ms": 0.0, "self_ms": 0.0,
+                                                       "max_ms": 0.0, "output_bytes": 0, "cuda_alloc_bytes": 0})
+                total["calls"] += entry["calls"]
+                total["total_ms"] += entry["total_ms"]
+                total["self_ms"] += entry["self_ms"]
+                total["max_ms"] = max(total["max_ms"], entry["total_ms"])
+                total["output_bytes"] += entry["output_bytes"]
+                total["cuda_alloc_bytes"] += entry["cuda_alloc_bytes"]
+            self._recent.append({
+                "request_id": current_request_id(),
+                "modules": {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in entry.items()}
+                            for name, entry in record.items()},
+            })
+
+    # -- reporting --
+    def summary(self) -> dict:
+        """
+        Aggregates over every profiled forward since the last reset, ranked by self time.
+
+        Returns:
+            dict: {"forwards": n, "modules": [{name, mean_ms, self_mean_ms, max_ms, share, ...}, ...]}
+        """
+        with self._lock:
+            calls = self._calls
+            totals = {name: dict(entry) for name, entry in self._totals.items()}
+        root_ms = totals.get(ROOT, {}).get("total_ms", 0.0) or 1.0
+        rows = []
+        for name, entry in totals.items():
+            rows.append({
+                "module": name,
+                "mean_ms": round(entry["total_ms"] / max(calls, 1), 3),
+                "self_mean_ms": round(entry["self_ms"] / max(calls, 1), 3),
+                "max_ms": round(entry["max_ms"], 3),
+                "self_share": round(entry["self_ms"] / root_ms, 4),
+                "output_mb_per_forward": round(entry["output_bytes"] / max(calls, 1) / 2**20, 3),
+                "cuda_alloc_mb_per_forward": round(entry["cuda_alloc_bytes"] / max(calls, 1) / 2**20, 3),
+            })
+        rows.sort(key=lambda row: row["self_mean_ms"], reverse=True)
+        return {"forwards": calls, "modules": rows}
+
+    def recent(self) -> list:
+        with self._lock:
+            return list(self._recent)
+
+
+def format_table(summary: dict) -> str:
+    """Ranked plain-text table of ModuleProfiler.summary()."""
+    header = f"{'module':<40}{'self ms':>10}{'share':>8}{'incl ms':>10}{'max ms':>10}{'out MB':>9}"
+    lines = [f"{summary['forwards']} forward passes", header, "-" * len(header)]
+    for row in summary["modules"]:
+        lines.append(f"{row['module']:<40}{row['self_mean_ms']:>10.2f}{row['self_share']:>8.1%}"
+                     f"{row['mean_ms']:>10.2f}{row['max_ms']:>10.2f}{row['output_mb_per_forward']:>9.2f}")
+    return "\n".join(lines)
@@ -0,0 +1,289 @@
+"""
+On-demand profiling of individual requests.
+
+A request is profiled when an admin has armed the next N requests
+(POST /admin/profile?requests=N) or when it carries `X-Profile: <ADMIN_TOKEN>`.
+While it runs, a sampling thread records the Python stacks of every busy
+thread and the backend's op-level profiler (torch.profiler / TF profiler)
+is active. The results go to PROFILE_DIR/<time>_<request id>/:
+
+- stacks.folded: folded stacks ("frame;frame;frame count"), the input format
+  of flamegraph.pl, speedscope and inferno
+- the engine's raw profile (e.g. a Chrome trace for torch)
+- meta.json: request, duration, sample count
+
+When nothing is armed and no header is sent, the middleware only checks a
+counter (and scans headers when ADMIN_TOKEN is set), so the cost is nil.
+
+Process-wide op profilers (TF) are started by the middleware. Per-thread
+ones (torch.profiler only sees ops of the thread that entered it) are
+started by op_profile() in the worker thread that runs the request's
+compute; the middleware just hands it the output directory.
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+from starlette.responses import JSONResponse
+
+from tracing import current_request_id
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))  # Seconds between stack samples
+PROFILE_MAX_REQUESTS = int(os.environ.get("PROFILE_MAX_REQUESTS", "20"))
+# Admin endpoints and the X-Profile header are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Leaf frames of threads that are parked, not working (file name, function)
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+# Control-plane paths never use up an armed profile
+_UNPROFILED_PREFIXES = ("/admin/", "/metrics", "/ready")
+
+_remaining = 0
+_remaining_lock = threading.Lock()
+# One profile at a time: the sampler sees the whole process
+_active = threading.Lock()
+_op_profiler = None
+_op_profiler_per_thread = False
+# Output directory of the profiled request, for op_profile() in its worker thread
+_op_session = contextvars.ContextVar("op_profile_session", default=None)
+
+
+def check_admin_token(token) -> bool:
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def arm(requests: int) -> int:
+    """Profile the next `requests` requests (capped at PROFILE_MAX_REQUESTS); 0 disarms."""
+    global _remaining
+    with _remaining_lock:
+        _remaining = max(0, min(int(requests), PROFILE_MAX_REQUESTS))
+        return _remaining
+
+
+def _take_armed() -> bool:
+    global _remaining
+    with _remaining_lock:
+        if _remaining <= 0:
+            return False
+        _remaining -= 1
+        return True
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples sys._current_frames() every `interval` seconds into folded-stack counts."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                code = frame.f_code
+                if ident == own or (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def write_folded(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class _OpSession:
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.ran = False
+
+
+@contextmanager
+def op_profile():
+    """
+    Runs the block under the per-thread op-level profiler when the current
+    request is being profiled; a no-op otherwise. Enter it in the worker
+    thread that does the request's compute (see run_cancellable).
+    """
+    session = _op_session.get()
+    if session is None or session.ran or not _op_profiler:
+        yield
+        return
+    session.ran = True
+    try:
+        handle = _op_profiler[0](session.out_dir)
+    except Exception as e:
+        log.warning(f"⚠️ Op-level profiler did not start, sampling stacks only: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        try:
+            _op_profiler[1](handle, session.out_dir)
+        except Exception as e:
+            log.warning(f"⚠️ Op-level profile could not be written: {e}")
+
+
+def _profile_dir(request_id: str) -> str:
+    name = time.strftime("%Y%m%d-%H%M%S") + f"_{request_id}"
+    path = os.path.join(PROFILE_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling armed requests and requests with a valid X-Profile header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope) -> bool:
+        if ADMIN_TOKEN:
+            for name, value in scope.get("headers") or ():
+                if name == b"x-profile":
+                    return check_admin_token(value.decode("latin-1"))
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(_UNPROFILED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        header_requested = self._wants_profile(scope)
+        if not (header_requested or _remaining):
+            await self.app(scope, receive, send)
+            return
+        if not _active.acquire(blocking=False):
+            # Another request is being profiled; serve this one normally and keep the budget
+            await self.app(scope, receive, send)
+            return
+        if not header_requested and not _take_armed():
+            _active.release()
+            await self.app(scope, receive, send)
+            return
+
+        out_dir = _profile_dir(current_request_id())
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", os.path.basename(out_dir).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = StackSampler()
+        op_handle = None
+        session = _OpSession(out_dir) if _op_profiler and _op_profiler_per_thread else None
+        session_reset = _op_session.set(session)
+        if _op_profiler and not _op_profiler_per_thread:
+            try:
+                op_handle = _op_profiler[0](out_dir)
+            except Exception as e:
+                log.warning(f"⚠️ Op-level profiler did not start, sampling stacks only: {e}")
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _op_session.reset(session_reset)
+            sampler.stop()
+            try:
+                sampler.write_folded(os.path.join(out_dir, "stacks.folded"))
+                if op_handle is not None:
+                    _op_profiler[1](op_handle, out_dir)
+                with open(os.path.join(out_dir, "meta.json"), "w") as f:
+                    json.dump({
+                        "request_id": current_request_id(),
+                        "method": scope.get("method"),
+                        "path": scope.get("path"),
+                        "status": status["code"],
+                        "duration_ms": round(duration * 1000, 2),
+                        "stack_samples": sampler.samples,
+                        "interval_ms": sampler.interval * 1000,
+                        "op_profile": bool(op_handle is not None or (session and session.ran)),
+                    }, f, indent=2)
+                log.info(f"Profile written to {out_dir}")
+            finally:
+                _active.release()
+
+
+def _admin_denied(request):
+    if not ADMIN_TOKEN:
+        return JSONResponse({"detail": "Not Found"}, status_code=404)
+    if not check_admin_token(request.headers.get("x-admin-token")):
+        return JSONResponse({"detail": "Invalid admin token"}, status_code=403)
+    return None
+
+
+async def profile_status_endpoint(request):
+    denied = _admin_denied(request)
+    if denied:
+        return denied
+    profiles = sorted(os.listdir(PROFILE_DIR), reverse=True)[:50] if os.path.isdir(PROFILE_DIR) else []
+    return JSONResponse({"remaining": _remaining, "profile_dir": PROFILE_DIR, "profiles": profiles})
+
+
+async def profile_arm_endpoint(request):
+    denied = _admin_denied(request)
+    if denied:
+        return denied
+    try:
+        requests = int(request.query_params.get("requests", "1"))
+    except ValueError:
+        return JSONResponse({"detail": "requests must be an integer"}, status_code=400)
+    return JSONResponse({"remaining": arm(requests)})
+
+
+def install_profiling(app, op_profiler=None, per_thread=False):
+    """
+    Adds the profiling middleware and the /admin/profile routes to a FastAPI app.
+
+    Args:
+        app: The FastAPI app; call before install_tracing() so request IDs are set
+        op_profiler: Optional (start, stop) pair for engine op-level profiling:
+            start(out_dir) returns a handle, stop(handle, out_dir) writes the raw profile
+        per_thread: The op profiler only records the thread that started it; it is then
+            started by op_profile() in the request's worker thread instead of the middleware
+    """
+    global _op_profiler, _op_profiler_per_thread
+    _op_profiler = op_profiler
+    _op_profiler_per_thread = per_thread
+    app.add_middleware(ProfilingMiddleware)
+    app.add_route("/admin/profile", profile_status_endpoint, methods=["GET"], include_in_schema=False)
+    app.add_route("/admin/profile", profile_arm_endpoint, methods=["POST"], include_in_schema=False)
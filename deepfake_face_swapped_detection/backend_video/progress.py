@@ -0,0 +1,107 @@
+"""
+Live progress events for the streaming (Server-Sent Events) endpoints.
+
+Pipeline code calls emit(event, **data) wherever it makes progress; outside
+a streaming request that is a no-op. Inside one, a context variable holds a
+sink that forwards each event to the client, so the downloader, the
+decoders and the endpoints report progress without passing a callback
+through every function.
+
+Events, in the order a client typically sees them:
+- download: yt-dlp progress (downloaded_bytes, total_bytes, percent, speed, eta), then status "finished"
+- audio: audio extracted (method, seconds) or replaced by silence
+- frames: decoded frames so far (decoded, total)
+- preliminary: score from the first few sampled frames (label, score, confidence, frames_used)
+- inference: final model output (label, score, confidence)
+- result: the endpoint's full JSON response; or error: {status_code, detail}
+"""
+import json
+import asyncio
+import contextvars
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from cancellation import NEVER, bind
+from profiling import op_profile
+
+SSE_KEEPALIVE = 15  # Seconds between comment lines so proxies keep an idle stream open
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+_sink = contextvars.ContextVar("progress_sink", default=None)
+
+
+def emit(event: str, **data):
+    """Sends `event` to the streaming client of the current request, if there is one."""
+    sink = _sink.get()
+    if sink is not None:
+        sink(event, data)
+
+
+def has_listener() -> bool:
+    """True inside a streaming request; lets callers skip work only a live client would see."""
+    return _sink.get() is not None
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=float)}\n\n"
+
+
+def event_stream(work, *args, token=NEVER):
+    """
+    Runs work(*args) in the threadpool and yields its progress as SSE text:
+    every emitted event, then `result` with its return value, or `error`
+    with the status code and detail of the exception it raised.
+    `token` (see cancellation.py) is bound for the work and cancelled if the
+    client disconnects first.
+
+    The work starts here, not on the first read of the stream: a generator
+    that is never iterated never runs its cleanup, so anything the work
+    owns (an Upload it closes, say) would leak if the client hung up before
+    the response started.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def sink(event, data):
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
+
+    def run():
+        reset = _sink.set(sink)
+        try:
+            with bind(token), op_profile():
+                return work(*args)
+        finally:
+            _sink.reset(reset)
+
+    # Copy the request context so spans and log records keep the request ID
+    task = asyncio.ensure_future(run_in_threadpool(contextvars.copy_context().run, run))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return _relay(queue, task, token)
+
+
+async def _relay(queue, task, token):
+    try:
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({get, task}, timeout=SSE_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                yield format_sse(*get.result())
+                continue
+            get.cancel()
+            if task in done:
+                break
+            yield ": keepalive\n\n"
+
+        while not queue.empty():
+            yield format_sse(*queue.get_nowait())
+        try:
+            yield format_sse("result", task.result())
+        except HTTPException as e:
+            yield format_sse("error", {"status_code": e.status_code, "detail": str(e.detail)})
+        except Exception as e:
+            yield format_sse("error", {"status_code": 500, "detail": str(e)[:500]})
+    finally:
+        # Client went away: stop the work at its next cancellation point
+        if not task.done():
+            token.cancel()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Pre-fork launcher for the video backend.
+
+The parent process binds the listening socket, imports the app, loads and
+freezes the model once and then forks the workers. The weights (mmap-backed,
+see artifacts.py) and every other object created before the fork are shared
+copy-on-write, so N workers cost far less memory than N independent
+`uvicorn --workers N` processes that each load their own model. If the
+parent cannot load the model, the workers are forked anyway and fall back
+to the app's background loader, so /ready reports the error with a 503.
+
+Usage:
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 7860]
+
+Environment:
+    WEB_CONCURRENCY     default worker count
+    TORCH_NUM_THREADS   override intra-op threads per worker (default: cores // workers)
+"""
+import os
+import gc
+import time
+import signal
+import socket
+import logging
+import argparse
+
+import uvicorn
+
+log = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=int(os.environ.get("WEB_CONCURRENCY", 2)))
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=int(os.environ.get("PORT", 7860)))
+    return parser.parse_args()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, threads: int):
+    """Body of a forked worker; never returns."""
+    import torch
+
+    # Restore default signal handling; uvicorn installs its own for graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    torch.set_num_threads(threads)
+    config = uvicorn.Config(app, log_level="info", timeout_keep_alive=5)
+    uvicorn.Server(config).run(sockets=[sock])
+    os._exit(0)
+
+
+def main():
+    args = parse_args()
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    # Bind before loading: the port is open (connections queue) during the download and load
+    sock = bind_socket(args.host, args.port)
+
+    import torch
+    import main as backend
+    threads = backend.threads_per_worker(args.workers)
+    # Load single-threaded: an OpenMP pool started before fork() is not usable in the children
+    torch.set_num_threads(1)
+
+    log.info(f"Loading model once in the parent (pid {os.getpid()})...")
+    backend.startup_timings["imports"] = round(time.perf_counter() - backend._startup_t0, 3)
+    backend.load_model()
+    if not backend.model_ready.is_set():
+        # Serve anyway: each worker retries in the background and /ready answers 503 meanwhile,
+        # instead of the container crash-looping on a bad checkpoint
+        log.error(f"❌ Model failed to load in the parent: {backend.model_error}; workers will load their own")
+        backend.model_error = None
+
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the workers do not write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            run_worker(backend.app, sock, threads)
+        workers[pid] = time.monotonic()
+
+    for _ in range(args.workers):
+        spawn()
+    log.info(f"✓ Serving on {args.host}:{args.port} with {args.workers} workers x {threads} threads "
+             f"(pids {', '.join(map(str, workers))})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        log.warning(f"⚠️ Worker {pid} exited with status {status}; restarting")
+        if time.monotonic() - started < 1.0:
+            # Crash loop guard
+            time.sleep(1.0)
+        spawn()
+
+
+if __name__ == "__main__":
+    main()
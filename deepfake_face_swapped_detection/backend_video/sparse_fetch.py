@@ -0,0 +1,416 @@
+"""
+Sparse HTTP Range fetching for direct MP4/MOV URLs.
+
+The model only needs SEQUENCE_LENGTH frames and the first seconds of audio,
+so instead of downloading the whole file we:
+1. Read the top-level box layout and the `moov` index with Range requests
+2. Map the sampled frame positions to the nearest keyframe samples
+3. Fetch only those keyframes plus the audio samples in the analysis window
+4. Write everything at its original offset into a sparse local file
+
+The result has the original container layout. Only the wanted samples are
+written (over-fetched gap bytes are dropped), so decoding it with
+`-skip_frame nokey` yields exactly the chosen keyframes, in presentation order.
+"""
+import os
+import uuid
+import struct
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from downloader import HTTP_HEADERS
+from streaming import read_ppm_frame
+
+log = logging.getLogger(__name__)
+
+# Range requests must return the raw bytes at the requested offsets
+RANGE_HEADERS = {**HTTP_HEADERS, 'Accept-Encoding': 'identity'}
+
+# First request covers ftyp/moov for most faststart files
+INITIAL_READ_BYTES = 64 * 1024
+
+# Neighbouring ranges closer than this are fetched as one request
+MERGE_GAP_BYTES = 32 * 1024
+
+# Below this many distinct keyframes the sample is too repetitive to trust
+MIN_DISTINCT_KEYFRAMES = 8
+
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+
+class RangeReader:
+    """Issues HTTP Range requests against one URL and counts bytes transferred."""
+
+    def __init__(self, url: str, timeout: int = 30):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(RANGE_HEADERS)
+        self.bytes_transferred = 0
+        self.requests = 0
+        self.total_size = None
+        # read() is called from the fetch pool's threads
+        self._lock = threading.Lock()
+
+    def read(self, start: int, end: int) -> bytes:
+        """Return bytes [start, end) of the remote file."""
+        response = self.session.get(
+            self.url,
+            headers={'Range': f'bytes={start}-{end - 1}'},
+            timeout=self.timeout,
+            stream=True,
+        )
+        # Decide from the status line: a server ignoring Range would otherwise send the whole file here
+        with response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RuntimeError("Server does not support HTTP Range requests")
+            content_range = response.headers.get('Content-Range', '')
+            data = response.content
+
+        with self._lock:
+            if self.total_size is None and '/' in content_range:
+                self.total_size = int(content_range.rsplit('/', 1)[1])
+            self.requests += 1
+            self.bytes_transferred += len(data)
+        return data
+
+    def close(self):
+        self.session.close()
+
+
+def _parse_box_header(data: bytes, offset: int):
+    """Return (size, type, header_length) for the box starting at `offset`."""
+    size, box_type = struct.unpack('>I4s', data[offset:offset + 8])
+    header_length = 8
+    if size == 1:
+        size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+        header_length = 16
+    return size, box_type, header_length
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    offset = start
+    while offset + 8 <= end:
+        size, box_type, header_length = _parse_box_header(data, offset)
+        if size == 0:
+            size = end - offset
+        if size < header_length:
+            break
+        yield box_type, offset + header_length, offset + size
+        offset += size
+
+
+def _read_top_level(reader: RangeReader):
+    """
+    Locate top-level boxes with as few requests as possible.
+
+    Returns:
+        (headers, moov): list of (offset, header_bytes) for every top-level box,
+        and the complete moov box as (offset, bytes)
+    """
+    head = reader.read(0, INITIAL_READ_BYTES)
+    total_size = reader.total_size or len(head)
+
+    headers = []
+    moov = None
+    offset = 0
+    while offset < total_size:
+        if offset + 16 <= len(head):
+            header = head[offset:offset + 16]
+        else:
+            header = reader.read(offset, min(offset + 16, total_size))
+        if len(header) < 8:
+            break
+
+        size, box_type, header_length = _parse_box_header(header, 0)
+        if size == 0:
+            size = total_size - offset
+        if size < header_length:
+            raise RuntimeError(f"Corrupt MP4 box at offset {offset}")
+        headers.append((offset, header[:header_length]))
+
+        if box_type == b'moov':
+            if offset + size <= len(head):
+                moov = (offset, head[offset:offset + size])
+            else:
+                moov = (offset, reader.read(offset, offset + size))
+            # mdat's header is already known when moov comes last; otherwise keep walking
+            if any(h[1][4:8] == b'mdat' for h in headers):
+                break
+        offset += size
+
+    if moov is None:
+        raise RuntimeError("No moov box found; not a seekable MP4/MOV file")
+    return headers, moov
+
+
+def _parse_track(data: bytes, start: int, end: int) -> dict:
+    """Collect the sample tables of one trak box."""
+    track = {}
+
+    def visit(box_start, box_end):
+        for box_type, payload, box_end_ in _iter_boxes(data, box_start, box_end):
+            if box_type in CONTAINER_BOXES:
+                visit(payload, box_end_)
+            elif box_type == b'mdhd':
+                version = data[payload]
+                # Full boxes start with 1 byte version + 3 bytes flags
+                p = payload + 4
+                if version == 1:
+                    track['timescale'] = struct.unpack('>I', data[p + 16:p + 20])[0]
+                else:
+                    track['timescale'] = struct.unpack('>I', data[p + 8:p + 12])[0]
+            elif box_type == b'hdlr':
+                p = payload + 4
+                track['handler'] = data[p + 4:p + 8]
+            elif box_type == b'stts':
+                p = payload + 4
+                count = struct.unpack('>I', data[p:p + 4])[0]
+                entries = np.frombuffer(data, dtype='>u4', count=count * 2, offset=p + 4).reshape(-1, 2)
+                track['stts'] = entries.astype(np.int64)
+            elif box_type == b'ctts':
+                p = payload + 4
+                count = struct.unpack('>I', data[p:p + 4])[0]
+                # Version 1 offsets are signed; version 0 writers use them that way too
+                entries = np.frombuffer(data, dtype='>i4', count=count * 2, offset=p + 4).reshape(-1, 2)
+                track['ctts'] = entries.astype(np.int64)
+            elif box_type == b'stss':
+                p = payload + 4
+                count = struct.unpack('>I', data[p:p + 4])[0]
+                track['stss'] = np.frombuffer(data, dtype='>u4', count=count, offset=p + 4).astype(np.int64) - 1
+            elif box_type == b'stsc':
+                p = payload + 4
+                count = struct.unpack('>I', data[p:p + 4])[0]
+                entries = np.frombuffer(data, dtype='>u4', count=count * 3, offset=p + 4).reshape(-1, 3)
+                track['stsc'] = entries.astype(np.int64)
+            elif box_type == b'stsz':
+                p = payload + 4
+                sample_size, count = struct.unpack('>II', data[p:p + 8])
+                if sample_size:
+                    track['sizes'] = np.full(count, sample_size, dtype=np.int64)
+                else:
+                    track['sizes'] = np.frombuffer(data, dtype='>u4', count=count, offset=p + 8).astype(np.int64)
+            elif box_type == b'stz2':
+                p = payload + 4
+                field_size = data[p + 3]
+                count = struct.unpack('>I', data[p + 4:p + 8])[0]
+                if field_size == 4:
+                    packed = np.frombuffer(data, dtype=np.uint8, count=(count + 1) // 2, offset=p + 8)
+                    sizes = np.stack([packed >> 4, packed & 0x0F], axis=1).reshape(-1)[:count]
+                else:
+                    dtype = {8: '>u1', 16: '>u2'}[field_size]
+                    sizes = np.frombuffer(data, dtype=dtype, count=count, offset=p + 8)
+                track['sizes'] = sizes.astype(np.int64)
+            elif box_type == b'stco':
+                p = payload + 4
+                count = struct.unpack('>I', data[p:p + 4])[0]
+                track['chunk_offsets'] = np.frombuffer(data, dtype='>u4', count=count, offset=p + 4).astype(np.int64)
+            elif box_type == b'co64':
+                p = payload + 4
+                count = struct.unpack('>I', data[p:p + 4])[0]
+                track['chunk_offsets'] = np.frombuffer(data, dtype='>u8', count=count, offset=p + 4).astype(np.int64)
+
+    visit(start, end)
+    return track
+
+
+def _sample_table(track: dict) -> dict:
+    """Expand the compact sample tables into per-sample offsets, sizes and times."""
+    sizes = track['sizes']
+    chunk_offsets = track['chunk_offsets']
+    stsc = track['stsc']
+    n_samples = len(sizes)
+    n_chunks = len(chunk_offsets)
+
+    samples_per_chunk = np.zeros(n_chunks, dtype=np.int64)
+    for i, (first_chunk, per_chunk, _) in enumerate(stsc):
+        last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else n_chunks
+        samples_per_chunk[first_chunk - 1:last_chunk] = per_chunk
+
+    chunk_of_sample = np.repeat(np.arange(n_chunks), samples_per_chunk)[:n_samples]
+    size_before = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    first_sample_of_chunk = np.concatenate([[0], np.cumsum(samples_per_chunk)[:-1]])
+    offsets = (chunk_offsets[chunk_of_sample]
+               + size_before
+               - size_before[np.minimum(first_sample_of_chunk[chunk_of_sample], n_samples - 1)])
+
+    deltas = np.repeat(track['stts'][:, 1], track['stts'][:, 0])[:n_samples]
+    decode_times = np.concatenate([[0], np.cumsum(deltas)[:-1]])
+    presentation_times = decode_times.copy()
+    if 'ctts' in track:
+        composition = np.repeat(track['ctts'][:, 1], track['ctts'][:, 0])[:n_samples]
+        presentation_times[:len(composition)] += composition
+
+    sync = track.get('stss')
+    if sync is None:
+        sync = np.arange(n_samples)
+
+    return {
+        'offsets': offsets,
+        'sizes': sizes,
+        'decode_seconds': decode_times / track['timescale'],
+        'presentation_times': presentation_times,
+        'sync': sync,
+    }
+
+
+def _merge_ranges(ranges, gap: int = MERGE_GAP_BYTES):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(r) for r in merged]
+
+
+def _slice_fetched(wanted, chunks):
+    """Cut each wanted (start, end) range out of the merged chunks that cover it."""
+    chunks = sorted(chunks)
+    starts = [offset for offset, _ in chunks]
+    pieces = []
+    for start, end in wanted:
+        i = np.searchsorted(starts, start, side='right') - 1
+        chunk_offset, data = chunks[i]
+        pieces.append((start, data[start - chunk_offset:end - chunk_offset]))
+    return pieces
+
+
+def sparse_fetch_mp4(url: str, num_frames: int, audio_seconds: float,
+                     output_dir: str = "tmp_downloads", timeout: int = 30,
+                     merge_gap: int = MERGE_GAP_BYTES) -> dict:
+    """
+    Fetch just enough of a remote MP4/MOV to sample `num_frames` frames and the
+    first `audio_seconds` of audio.
+
+    Args:
+        url: Direct URL of the media file (server must support Range)
+        num_frames: Number of frames to sample across the whole video
+        audio_seconds: Length of audio needed from the start
+        output_dir: Directory for the sparse local file
+        timeout: Per-request timeout in seconds
+        merge_gap: Fetch neighbouring ranges closer than this many bytes in one request
+
+    Returns:
+        dict: 'path' of the sparse file, 'frame_indices' (presentation-order frame
+        number of the keyframe chosen for each sample), 'bytes_transferred',
+        'requests' and 'total_size'
+
+    Raises:
+        Exception: If the file is not a usable MP4 or the server lacks Range support
+    """
+    reader = RangeReader(url, timeout=timeout)
+    try:
+        top_level, (moov_offset, moov) = _read_top_level(reader)
+
+        _, _, moov_header_length = _parse_box_header(moov, 0)
+        video, audio = None, None
+        for box_type, payload, end in _iter_boxes(moov, moov_header_length, len(moov)):
+            if box_type != b'trak':
+                continue
+            track = _parse_track(moov, payload, end)
+            if not {'sizes', 'chunk_offsets', 'stsc', 'stts', 'timescale'} <= track.keys():
+                continue
+            if track.get('handler') == b'vide' and video is None:
+                video = _sample_table(track)
+            elif track.get('handler') == b'soun' and audio is None:
+                audio = _sample_table(track)
+
+        if video is None or len(video['sizes']) == 0:
+            raise RuntimeError("No video track in MP4 index")
+
+        # Presentation rank of each sample = the frame number cv2 seeks to
+        presentation_order = np.argsort(video['presentation_times'], kind='stable')
+        frame_number = np.empty_like(presentation_order)
+        frame_number[presentation_order] = np.arange(len(presentation_order))
+
+        # Same positions preprocess_video samples, snapped to the nearest keyframe
+        targets = presentation_order[np.linspace(0, len(presentation_order) - 1, num_frames, dtype=int)]
+        sync = video['sync']
+        sync_times = video['presentation_times'][sync]
+        nearest = np.abs(sync_times[None, :] - video['presentation_times'][targets][:, None]).argmin(axis=1)
+        keyframes = sync[nearest]
+
+        if len(set(keyframes.tolist())) < min(MIN_DISTINCT_KEYFRAMES, num_frames):
+            raise RuntimeError(f"Only {len(set(keyframes.tolist()))} distinct keyframes; too sparse to sample")
+
+        wanted = [(int(video['offsets'][k]), int(video['offsets'][k] + video['sizes'][k])) for k in set(keyframes.tolist())]
+        if audio is not None:
+            needed = np.nonzero(audio['decode_seconds'] < audio_seconds)[0]
+            wanted += [(int(audio['offsets'][i]), int(audio['offsets'][i] + audio['sizes'][i])) for i in needed]
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            chunks = list(pool.map(lambda r: (r[0], reader.read(*r)), _merge_ranges(wanted, merge_gap)))
+
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"{uuid.uuid4()}.mp4")
+        with open(path, "wb") as f:
+            # Unwritten regions stay as holes on filesystems that support sparse files
+            f.truncate(reader.total_size)
+            for offset, header in top_level:
+                f.seek(offset)
+                f.write(header)
+            f.seek(moov_offset)
+            f.write(moov)
+            for offset, data in _slice_fetched(wanted, chunks):
+                f.seek(offset)
+                f.write(data)
+
+        log.info(f"✓ Sparse fetch: {reader.bytes_transferred} of {reader.total_size} bytes "
+              f"in {reader.requests} requests ({len(set(keyframes.tolist()))} keyframes)")
+        return {
+            'path': path,
+            'frame_indices': frame_number[keyframes].tolist(),
+            'bytes_transferred': reader.bytes_transferred,
+            'requests': reader.requests,
+            'total_size': reader.total_size,
+        }
+    finally:
+        reader.close()
+
+
+def decode_sparse_keyframes(path: str, frame_indices: list) -> list:
+    """
+    Decode the keyframes written by sparse_fetch_mp4.
+
+    Args:
+        path: Sparse file returned by sparse_fetch_mp4
+        frame_indices: Its 'frame_indices' (one entry per sample, repeats allowed)
+
+    Returns:
+        list: RGB uint8 frame per entry of `frame_indices`
+
+    Raises:
+        Exception: If the decoder did not return exactly the fetched keyframes
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'quiet',
+        # Holes read as zeros and fail to decode; skipping non-key frames avoids them entirely
+        '-skip_frame', 'nokey',
+        '-i', path,
+        '-map', '0:v:0', '-fps_mode', 'passthrough',
+        '-f', 'image2pipe', '-c:v', 'ppm', 'pipe:1',
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    decoded = []
+    try:
+        while True:
+            frame = read_ppm_frame(proc.stdout)
+            if frame is None:
+                break
+            decoded.append(frame)
+    finally:
+        proc.stdout.close()
+        proc.wait()
+
+    unique = sorted(set(frame_indices))
+    if len(decoded) != len(unique):
+        raise RuntimeError(f"Decoded {len(decoded)} keyframes, expected {len(unique)}")
+    by_index = dict(zip(unique, decoded))
+    return [by_index[i] for i in frame_indices]
@@ -0,0 +1,292 @@
+"""
+Pipelined download-and-decode for URL video analysis.
+
+yt-dlp writes the selected format to stdout and ffmpeg decodes it straight
+from that pipe, so frame sampling and audio extraction run while the bytes
+are still arriving. ffmpeg stops as soon as it has produced the frames and
+the audio window the model needs; yt-dlp is then terminated, which aborts
+the rest of the transfer.
+"""
+import os
+import re
+import sys
+import json
+import shutil
+import tempfile
+import logging
+import threading
+import subprocess
+
+import numpy as np
+import yt_dlp
+
+from downloader import HTTP_HEADERS, normalize_video_url
+from cancellation import current_token
+
+log = logging.getLogger(__name__)
+
+# Single-file formats only: a merged bestvideo+bestaudio cannot be piped
+STREAM_FORMAT = 'best[acodec!=none][vcodec!=none]/best'
+
+# Frames are kept at display resolution so they can double as UI thumbnails
+STREAM_FRAME_MAX_SIDE = 360
+
+
+def _read_exact(stream, size: int) -> bytes:
+    """Read exactly `size` bytes from a pipe, or fewer at EOF."""
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_ppm_frame(stream):
+    """
+    Read one binary PPM (P6) image from an ffmpeg image2pipe stream.
+
+    Returns:
+        np.ndarray: RGB frame of shape (H, W, 3), or None at end of stream
+    """
+    magic = _read_exact(stream, 2)
+    if len(magic) < 2:
+        return None
+    if magic != b"P6":
+        raise ValueError(f"Unexpected frame header from ffmpeg: {magic!r}")
+
+    # Header is "P6 <width> <height> <maxval>" separated by single whitespace bytes
+    tokens = []
+    token = b""
+    while len(tokens) < 3:
+        ch = stream.read(1)
+        if not ch:
+            return None
+        if ch.isspace():
+            if token:
+                tokens.append(int(token))
+                token = b""
+        else:
+            token += ch
+    width, height, _ = tokens
+
+    data = _read_exact(stream, width * height * 3)
+    if len(data) < width * height * 3:
+        return None
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+
+
+def _resolve_stream_info(url: str, timeout: int) -> dict:
+    """Run yt-dlp extraction once and pick a single-file format to pipe."""
+    ydl_opts = {
+        'format': STREAM_FORMAT,
+        'quiet': True,
+        'no_warnings': True,
+        'socket_timeout': timeout,
+        'http_headers': HTTP_HEADERS,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        return ydl.sanitize_info(info)
+
+
+def _probe_media(media_url: str, timeout: int) -> dict:
+    """
+    Fill in duration/fps/audio for URLs yt-dlp cannot describe (plain .mp4 links).
+    ffmpeg prints the stream layout to stderr before complaining about the missing output.
+    """
+    header_lines = "".join(f"{k}: {v}\r\n" for k, v in HTTP_HEADERS.items())
+    cmd = ['ffmpeg', '-hide_banner', '-headers', header_lines, '-i', media_url]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {}
+    output = result.stderr.decode(errors='replace')
+
+    probed = {'has_audio': bool(re.search(r'Stream #\d+:\d+.*: Audio:', output))}
+    match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', output)
+    if match:
+        hours, minutes, seconds = match.groups()
+        probed['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    match = re.search(r'Stream #\d+:\d+.*: Video:.*?([\d.]+) fps', output)
+    if match:
+        probed['fps'] = float(match.group(1))
+    return probed
+
+
+def stream_video_samples(url: str, num_frames: int, window_seconds: float,
+                         sample_rate: int = 16000, timeout: int = 120, on_frame=None) -> dict:
+    """
+    Sample frames and audio from a URL while it downloads.
+
+    Args:
+        url: Video URL (any platform yt-dlp supports)
+        num_frames: Number of frames to sample, spread evenly over the window
+        window_seconds: Length of the analysed window from the start of the video
+        sample_rate: Target audio sample rate (mono)
+        timeout: Overall timeout in seconds; frames captured by then are still returned
+        on_frame: Optional callback, called with the list of frames decoded so far after each new one
+
+    Returns:
+        dict: 'frames' (list of RGB uint8 arrays), 'frame_indices' (approximate
+        source frame index per sample), 'waveform' (float32 mono array or None),
+        'sample_rate' and 'duration'
+
+    Raises:
+        Cancelled: If the request is cancelled (both processes are killed at once)
+        Exception: If the stream cannot be decoded (callers fall back to a full download)
+    """
+    token = current_token()
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg not found")
+
+    url = normalize_video_url(url)
+    info = _resolve_stream_info(url, timeout)
+
+    duration = float(info.get('duration') or 0)
+    source_fps = float(info.get('fps') or 0)
+    has_audio = info.get('acodec') not in (None, 'none')
+    if (not duration or info.get('acodec') is None) and info.get('url'):
+        probed = _probe_media(info['url'], min(timeout, 15))
+        duration = duration or probed.get('duration', 0)
+        source_fps = source_fps or probed.get('fps', 0)
+        has_audio = has_audio or probed.get('has_audio', False)
+
+    window = min(duration, window_seconds) if duration > 0 else window_seconds
+    sample_fps = num_frames / window
+
+    # Hand the resolved info back to yt-dlp so the piped download skips re-extraction
+    with tempfile.NamedTemporaryFile('w', suffix='.info.json', delete=False) as f:
+        json.dump(info, f)
+        info_path = f.name
+
+    ytdlp_cmd = [
+        sys.executable, '-m', 'yt_dlp',
+        '--load-info-json', info_path,
+        '-f', str(info.get('format_id') or STREAM_FORMAT),
+        '-o', '-',
+        '--quiet', '--no-warnings', '--no-part',
+        '--socket-timeout', str(timeout),
+    ]
+    for key, value in HTTP_HEADERS.items():
+        ytdlp_cmd += ['--add-header', f'{key}:{value}']
+
+    side = STREAM_FRAME_MAX_SIDE
+    ffmpeg_cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-i', 'pipe:0',
+        '-map', '0:v:0',
+        '-vf', f"fps={sample_fps:.6f},scale=w='min(iw,{side})':h='min(ih,{side})':force_original_aspect_ratio=decrease",
+        '-frames:v', str(num_frames),
+        '-f', 'image2pipe', '-c:v', 'ppm', 'pipe:1',
+    ]
+
+    audio_read_fd, audio_write_fd = (os.pipe() if has_audio else (None, None))
+    if has_audio:
+        ffmpeg_cmd += [
+            '-map', '0:a:0',
+            '-t', f"{window:.3f}",
+            '-ac', '1', '-ar', str(sample_rate),
+            '-f', 's16le', f'pipe:{audio_write_fd}',
+        ]
+
+    ytdlp_proc = None
+    ffmpeg_proc = None
+    audio_chunks = []
+    audio_thread = None
+    timer = None
+    try:
+        ytdlp_proc = subprocess.Popen(ytdlp_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        ffmpeg_proc = subprocess.Popen(
+            ffmpeg_cmd,
+            stdin=ytdlp_proc.stdout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            pass_fds=(audio_write_fd,) if has_audio else (),
+        )
+        # Only the child processes should hold these pipe ends
+        ytdlp_proc.stdout.close()
+        if has_audio:
+            os.close(audio_write_fd)
+            audio_write_fd = None
+
+            def _drain_audio():
+                with os.fdopen(audio_read_fd, 'rb') as audio_pipe:
+                    for chunk in iter(lambda: audio_pipe.read(65536), b""):
+                        audio_chunks.append(chunk)
+
+            audio_thread = threading.Thread(target=_drain_audio, daemon=True)
+            audio_thread.start()
+
+        def _kill():
+            for proc in (ffmpeg_proc, ytdlp_proc):
+                if proc and proc.poll() is None:
+                    proc.kill()
+
+        timer = threading.Timer(timeout, _kill)
+        timer.start()
+
+        frames = []
+        with token.on_cancel(_kill):
+            while len(frames) < num_frames:
+                frame = read_ppm_frame(ffmpeg_proc.stdout)
+                if frame is None:
+                    break
+                frames.append(frame)
+                if on_frame is not None:
+                    on_frame(frames)
+
+            if audio_thread:
+                audio_thread.join(timeout)
+            ffmpeg_proc.wait(timeout)
+        stderr = ffmpeg_proc.stderr.read().decode(errors='replace').strip()
+    finally:
+        if timer:
+            timer.cancel()
+        # Everything the model needs is captured; stop fetching the rest
+        for proc in (ytdlp_proc, ffmpeg_proc):
+            if proc and proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        if audio_write_fd is not None:
+            os.close(audio_write_fd)
+        if has_audio and audio_thread is None:
+            os.close(audio_read_fd)
+        try:
+            os.remove(info_path)
+        except OSError:
+            pass
+
+    if token.cancelled:
+        token.check()
+    if not frames:
+        raise RuntimeError(f"ffmpeg decoded no frames from stream: {stderr[:200]}")
+
+    frame_indices = [
+        int(round(i / sample_fps * source_fps)) if source_fps > 0 else i
+        for i in range(len(frames))
+    ]
+    captured = len(frames)
+    if captured < num_frames:
+        # Stream ended before the window did; spread what we have like linspace over a short file
+        picks = np.linspace(0, len(frames) - 1, num_frames, dtype=int)
+        frames = [frames[i] for i in picks]
+        frame_indices = [frame_indices[i] for i in picks]
+
+    waveform = None
+    if audio_chunks:
+        pcm = np.frombuffer(b"".join(audio_chunks), dtype=np.int16)
+        waveform = pcm.astype(np.float32) / 32768.0
+
+    log.info(f"✓ Streamed {captured} frames and {0 if waveform is None else len(waveform) / sample_rate:.1f}s of audio "
+          f"from the first {window:.1f}s")
+    return {
+        'frames': frames,
+        'frame_indices': frame_indices,
+        'waveform': waveform,
+        'sample_rate': sample_rate,
+        'duration': duration,
+    }
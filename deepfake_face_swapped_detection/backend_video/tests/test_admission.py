@@ -0,0 +1,184 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.responses import JSONResponse
+
+import admission
+from admission import AdmissionMiddleware, Lane, Rejected
+
+
+def make_lane(slots=1, queue=4, max_wait=60.0, service_time=1.0):
+    return Lane("test", ["/work"], slots=slots, queue=queue, max_wait=max_wait, service_time=service_time)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_slots_are_handed_over_in_arrival_order():
+    async def main():
+        lane = make_lane()
+        await lane.acquire()
+        order = []
+
+        async def queued(name):
+            await lane.acquire()
+            order.append(name)
+
+        tasks = []
+        for name in "abc":
+            tasks.append(asyncio.create_task(queued(name)))
+            await settle()
+        assert lane.waiting == 3 and order == []
+
+        for expected in (["a"], ["a", "b"], ["a", "b", "c"]):
+            lane.release(1.0)
+            await settle()
+            assert order == expected
+            # Handed straight over: the slot never looked free to a newcomer
+            assert lane.active == 1
+        lane.release(1.0)
+        assert lane.active == 0 and lane.waiting == 0
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+
+def test_full_queue_is_rejected_with_the_expected_wait():
+    async def main():
+        lane = make_lane(slots=2, queue=2, service_time=3.0)
+        await lane.acquire()
+        await lane.acquire()
+        tasks = [asyncio.create_task(lane.acquire()) for _ in range(2)]
+        await settle()
+        with pytest.raises(Rejected) as e:
+            await lane.acquire()
+        for task in tasks:
+            task.cancel()
+        return e.value
+
+    rejected = asyncio.run(main())
+    assert rejected.reason == "queue_full"
+    # Two queued plus this one, 3 s each, over two slots
+    assert rejected.retry_after == pytest.approx(4.5)
+
+
+def test_long_expected_wait_is_rejected_before_queueing():
+    async def main():
+        lane = make_lane(queue=10, max_wait=2.0, service_time=1.0)
+        await lane.acquire()
+        waiter = asyncio.create_task(lane.acquire())  # Expects 1 s
+        await settle()
+        second = asyncio.create_task(lane.acquire())  # Expects 2 s: still allowed
+        await settle()
+        with pytest.raises(Rejected) as e:
+            await lane.acquire()
+        assert lane.waiting == 2
+        waiter.cancel()
+        second.cancel()
+        return e.value
+
+    rejected = asyncio.run(main())
+    assert rejected.reason == "wait_too_long"
+    assert rejected.retry_after == pytest.approx(3.0)
+
+
+def test_service_time_is_a_moving_average():
+    lane = make_lane(service_time=1.0)
+    lane.active = 1
+    lane.release(11.0)
+    assert lane.service_time == pytest.approx(1.0 + admission.SERVICE_TIME_ALPHA * 10)
+    assert lane.active == 0
+
+
+def test_waiter_that_times_out_leaves_the_queue():
+    async def main():
+        lane = make_lane(max_wait=0.05, service_time=0.01)
+        await lane.acquire()
+        with pytest.raises(Rejected) as e:
+            await lane.acquire()
+        assert e.value.reason == "queue_timeout"
+        assert lane.waiting == 0
+        lane.release(None)
+        assert lane.active == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_take_the_slot():
+    async def main():
+        lane = make_lane()
+        await lane.acquire()
+        gone = asyncio.create_task(lane.acquire())
+        await settle()
+        stays = asyncio.create_task(lane.acquire())
+        await settle()
+        gone.cancel()
+        await settle()
+        lane.release(None)
+        await asyncio.wait_for(stays, 1)
+        assert lane.active == 1 and lane.waiting == 0
+
+    asyncio.run(main())
+
+
+class SlowApp:
+    """Holds every request until release is set."""
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.running = 0
+
+    async def __call__(self, scope, receive, send):
+        self.running += 1
+        await self.release.wait()
+        await JSONResponse({"ok": True})(scope, receive, send)
+
+
+def post_from(app, client, path="/work"):
+    transport = httpx.ASGITransport(app=app, client=(client, 1234))
+    async def post():
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post(path)
+    return asyncio.create_task(post())
+
+
+def test_middleware_answers_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_PER_CLIENT", 2)
+
+    async def main():
+        inner = SlowApp()
+        lane = make_lane(slots=1, queue=2, service_time=4.0)
+        app = AdmissionMiddleware(inner, lanes=[lane])
+
+        first = post_from(app, "10.0.0.1")
+        await settle()
+        queued = post_from(app, "10.0.0.1")
+        await settle()
+        over_limit = await post_from(app, "10.0.0.1")
+        other_queued = post_from(app, "10.0.0.2")
+        await settle()
+        queue_full = await post_from(app, "10.0.0.3")
+        # Paths outside every lane are not queued
+        unlaned = post_from(app, "10.0.0.3", "/health")
+        await settle()
+        assert inner.running == 2
+
+        inner.release.set()
+        ok = await asyncio.gather(first, queued, other_queued, unlaned)
+        return over_limit, queue_full, ok, app, lane
+
+    over_limit, queue_full, ok, app, lane = asyncio.run(main())
+
+    assert over_limit.status_code == 429
+    assert over_limit.json()["reason"] == "client_limit"
+    # One queued ahead, 4 s each, one slot
+    assert over_limit.headers["Retry-After"] == "8"
+
+    assert queue_full.status_code == 429
+    assert queue_full.json()["reason"] == "queue_full"
+    assert queue_full.headers["Retry-After"] == "12"
+
+    assert [r.status_code for r in ok] == [200] * 4
+    assert app.per_client == {} and lane.active == 0
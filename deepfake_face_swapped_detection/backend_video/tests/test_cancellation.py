@@ -0,0 +1,132 @@
+import time
+import asyncio
+import subprocess
+
+import pytest
+
+import cancellation
+from cancellation import (Cancelled, CancelToken, DeadlineExceeded, REQUEST_TIMEOUT, current_token,
+                          request_token, run_cancellable)
+
+
+class FakeRequest:
+    """Reports a disconnect from the n-th poll on."""
+    def __init__(self, disconnect_after=None):
+        self.disconnect_after = disconnect_after
+        self.polls = 0
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.disconnect_after is not None and self.polls >= self.disconnect_after
+
+
+def sleeper():
+    return subprocess.Popen(["sleep", "30"])
+
+
+def test_check_tells_deadline_from_disconnect():
+    token = CancelToken(0.05)
+    token.check()
+    time.sleep(0.06)
+    with pytest.raises(DeadlineExceeded) as e:
+        token.check()
+    assert e.value.status_code == 504
+
+    token = CancelToken(60)
+    token.cancel()
+    with pytest.raises(Cancelled) as e:
+        token.check()
+    assert e.value.status_code == 499
+
+    CancelToken().check()  # No deadline, never cancelled
+
+
+def test_budget_keeps_the_reserve(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cancellation.time.monotonic", lambda: now[0])
+    token = CancelToken(10)
+    assert token.budget(reserve=3) == 7
+    assert token.budget(reserve=3, cap=5) == 5
+    # Near or past the deadline a step still gets a short try
+    assert token.budget(reserve=20) == 1.0
+    now[0] += 30
+    assert token.expired() and token.budget() == 1.0
+
+    assert CancelToken().budget(reserve=3, cap=5) == 5
+
+
+def test_deadline_kills_the_blocking_step():
+    token = CancelToken(0.2)
+    proc = sleeper()
+    start = time.monotonic()
+    with token.on_cancel(proc.kill):
+        proc.wait(timeout=5)
+    assert time.monotonic() - start < 2
+    assert proc.returncode != 0
+    assert token.reason == "deadline"
+    with pytest.raises(DeadlineExceeded):
+        token.check()
+
+
+def test_on_cancel_fires_at_once_on_a_cancelled_token_and_only_inside_the_block():
+    token = CancelToken(60)
+    calls = []
+    with token.on_cancel(lambda: calls.append("inside")):
+        pass
+    token.cancel()
+    assert calls == []  # Unregistered when the block ended
+
+    with token.on_cancel(lambda: calls.append("late")):
+        pass
+    assert calls == ["late"]
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, REQUEST_TIMEOUT),
+    ("5", 5),
+    ("2.5", 2.5),
+    (str(REQUEST_TIMEOUT * 10), REQUEST_TIMEOUT),  # A client cannot ask for more than the server's maximum
+    ("0", REQUEST_TIMEOUT),
+    ("-3", REQUEST_TIMEOUT),
+    ("soon", REQUEST_TIMEOUT),
+])
+def test_request_token_reads_x_request_timeout(header, expected):
+    token = request_token(header)
+    assert token.remaining() == pytest.approx(expected, abs=0.5)
+
+
+def test_disconnect_cancels_the_running_work(monkeypatch):
+    monkeypatch.setattr(cancellation, "DISCONNECT_POLL", 0.02)
+    procs = []
+
+    def work():
+        token = current_token()
+        procs.append(sleeper())
+        with token.on_cancel(procs[0].kill):
+            procs[0].wait(timeout=10)
+        token.check()
+        return "finished"
+
+    token = CancelToken(60)
+    start = time.monotonic()
+    with pytest.raises(Cancelled) as e:
+        asyncio.run(run_cancellable(FakeRequest(disconnect_after=3), token, work))
+    assert e.value.status_code == 499
+    assert time.monotonic() - start < 5
+    assert token.reason == "client disconnected"
+    assert procs[0].returncode != 0
+
+
+def test_connected_client_gets_the_result(monkeypatch):
+    monkeypatch.setattr(cancellation, "DISCONNECT_POLL", 0.02)
+    token = CancelToken(60)
+
+    def work(a, b):
+        time.sleep(0.1)
+        assert current_token() is token
+        return a + b
+
+    request = FakeRequest()
+    assert asyncio.run(run_cancellable(request, token, work, 2, 3)) == 5
+    assert request.polls >= 1
+    assert not token.cancelled
@@ -0,0 +1,30 @@
+import numpy as np
+
+import explain_artifacts
+from explain_artifacts import render, renderer, store, store_or_none
+
+
+@renderer("testgrid")
+def render_testgrid(inputs):
+    return inputs["grid"].tobytes()
+
+
+def test_small_shm_falls_back_to_disk(monkeypatch):
+    monkeypatch.setattr(explain_artifacts, "_free_bytes", lambda path: 64 * 1024 * 1024)
+    assert not explain_artifacts._default_artifact_dir(512 * 1024 * 1024).startswith("/dev/shm")
+
+
+def test_store_and_render(tmp_path, monkeypatch):
+    monkeypatch.setattr(explain_artifacts, "EXPLAIN_ARTIFACT_DIR", str(tmp_path))
+    grid = np.arange(16, dtype=np.uint8).reshape(4, 4)
+    artifact_id = store("testgrid", grid=grid)
+    assert artifact_id == store("testgrid", grid=grid.copy())
+    assert render(artifact_id) == grid.tobytes()
+
+
+def test_failed_store_drops_the_artifact(tmp_path, monkeypatch):
+    # A regular file where the directory should be: the write fails with an OSError
+    blocker = tmp_path / "artifacts"
+    blocker.write_bytes(b"")
+    monkeypatch.setattr(explain_artifacts, "EXPLAIN_ARTIFACT_DIR", str(blocker / "explain"))
+    assert store_or_none("testgrid", grid=np.zeros((4, 4), dtype=np.uint8)) is None
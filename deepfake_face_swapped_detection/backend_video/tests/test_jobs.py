@@ -0,0 +1,154 @@
+import time
+import socket
+import subprocess
+import threading
+
+import pytest
+
+from admission import Rejected
+from jobs import JobRunner, JobStore, DONE, FAILED, QUEUED, RUNNING
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def dead_pid() -> int:
+    proc = subprocess.Popen(["true"])
+    proc.wait()
+    return proc.pid
+
+
+def test_a_job_is_claimed_once(store):
+    job_id = store.submit("echo", {"n": 1})
+    job = store.claim("host:1:0")
+    assert job["id"] == job_id and job["status"] == RUNNING and job["attempts"] == 1
+    assert store.claim("host:2:0") is None
+
+
+def test_stale_job_is_requeued_and_only_the_new_claim_finishes_it(store):
+    job_id = store.submit("echo", {})
+    store.claim("host:1:0")
+    store.expire_heartbeats([job_id])
+    assert store.reclaim_stale() == 1
+    assert store.get(job_id)["status"] == QUEUED
+
+    job = store.claim("host:2:0")
+    assert job["attempts"] == 2
+    # The lost worker turns up late: its result is dropped
+    assert not store.complete(job_id, "host:1:0", {"from": "old"})
+    assert store.complete(job_id, "host:2:0", {"from": "new"})
+    assert store.get(job_id)["result"] == {"from": "new"}
+
+
+def test_heartbeat_keeps_a_job_from_being_reclaimed(store):
+    job_id = store.submit("echo", {})
+    store.claim("host:1:0")
+    store.heartbeat([job_id])
+    assert store.reclaim_stale(stale_after=60) == 0
+    assert store.get(job_id)["status"] == RUNNING
+
+
+def test_job_out_of_attempts_fails(store):
+    job_id = store.submit("echo", {})
+    for attempt in range(2):
+        store.claim(f"host:{attempt}:0")
+        store.expire_heartbeats([job_id])
+        store.reclaim_stale(max_attempts=2)
+    job = store.get(job_id)
+    assert job["status"] == FAILED
+    assert job["error"]["detail"] == "Worker lost while running the job"
+
+
+def test_purge_removes_expired_results(store):
+    job_id = store.submit("echo", {})
+    store.claim("host:1:0")
+    store.complete(job_id, "host:1:0", {})
+    assert store.purge(ttl=3600) == 0
+    time.sleep(0.01)
+    assert store.purge(ttl=0) == 1
+    assert store.get(job_id) is None
+
+
+def test_restart_recovers_a_job_from_a_dead_process(store):
+    job_id = store.submit("echo", {"n": 7})
+    store.claim(f"{socket.gethostname()}:{dead_pid()}:0")
+
+    calls = []
+    runner = JobRunner(store, {"echo": lambda payload: calls.append(payload) or payload})
+    runner.start()
+    try:
+        assert wait_for(lambda: store.get(job_id)["status"] == DONE)
+    finally:
+        runner.stop()
+    assert calls == [{"n": 7}]
+    assert store.get(job_id)["result"] == {"n": 7}
+
+
+def test_stop_does_not_hand_a_running_job_to_another_worker(store):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow(payload):
+        calls.append(payload)
+        started.set()
+        release.wait(5)
+        return {"ok": True}
+
+    runner = JobRunner(store, {"slow": slow})
+    runner.start()
+    job_id = runner.submit("slow", {})
+    assert started.wait(5)
+    runner.stop(grace=0.1)
+
+    # Still ours: no other worker can claim it while it runs here
+    assert store.get(job_id)["status"] == RUNNING
+    assert store.claim("other:1:0") is None
+    release.set()
+    assert wait_for(lambda: store.get(job_id)["status"] == DONE)
+    assert len(calls) == 1
+
+
+def test_stop_waits_for_a_short_job(store):
+    runner = JobRunner(store, {"quick": lambda payload: time.sleep(0.2) or {"ok": True}})
+    runner.start()
+    job_id = runner.submit("quick", {})
+    assert wait_for(lambda: store.get(job_id)["status"] == RUNNING)
+    runner.stop(grace=5)
+    assert store.get(job_id)["status"] == DONE
+
+
+def test_submission_limits(store):
+    runner = JobRunner(store, {"echo": lambda payload: payload}, max_queued=3, per_client=2, service_time=10)
+    runner.submit("echo", {}, client="10.0.0.1")
+    runner.submit("echo", {}, client="10.0.0.1")
+    with pytest.raises(Rejected) as e:
+        runner.submit("echo", {}, client="10.0.0.1")
+    assert e.value.reason == "client_limit"
+
+    runner.submit("echo", {}, client="10.0.0.2")
+    with pytest.raises(Rejected) as e:
+        runner.submit("echo", {}, client="10.0.0.3")
+    assert e.value.reason == "queue_full"
+    # Three queued ahead, one worker at 10 s each
+    assert e.value.retry_after == pytest.approx(40)
+    assert store.count(QUEUED) == 3
+
+
+def test_finished_jobs_free_the_client_limit(store):
+    job_id = store.submit("echo", {}, client="10.0.0.1", per_client=1)
+    with pytest.raises(Rejected):
+        store.submit("echo", {}, client="10.0.0.1", per_client=1)
+    store.claim("host:1:0")
+    store.complete(job_id, "host:1:0", {})
+    store.submit("echo", {}, client="10.0.0.1", per_client=1)
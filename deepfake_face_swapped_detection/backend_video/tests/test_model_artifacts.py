@@ -0,0 +1,69 @@
+import os
+
+import pytest
+import requests
+
+from http_fixture import start_server
+from artifacts import download_artifact, sha256_file
+
+
+@pytest.fixture
+def serve_dir(tmp_path):
+    path = tmp_path / "serve"
+    path.mkdir()
+    with open(path / "best_model.pth", "wb") as f:
+        f.write(os.urandom(3 * 1024 * 1024 + 123))
+    return path
+
+
+def test_download_resumes_after_dropped_connections(serve_dir, tmp_path):
+    expected = sha256_file(serve_dir / "best_model.pth")
+    server = start_server(str(serve_dir), fail_after_bytes=1024 * 1024)
+    try:
+        dest = str(tmp_path / "store" / "best_model.pth")
+        download_artifact(server.url_for("best_model.pth"), dest, sha256=expected)
+        assert sha256_file(dest) == expected
+        assert not os.path.exists(dest + ".part")
+        # Cut off every MB: one request per MB plus the tail
+        assert server.requests == 4
+        assert server.bytes_sent == os.path.getsize(dest)
+    finally:
+        server.shutdown()
+
+
+def test_checksum_mismatch_leaves_nothing_behind(serve_dir, tmp_path):
+    server = start_server(str(serve_dir))
+    try:
+        dest = str(tmp_path / "bad.pth")
+        with pytest.raises(ValueError, match="Checksum mismatch"):
+            download_artifact(server.url_for("best_model.pth"), dest, sha256="0" * 64)
+        assert not os.path.exists(dest)
+        assert not os.path.exists(dest + ".part")
+    finally:
+        server.shutdown()
+
+
+def test_server_ignoring_range_restarts_from_zero(serve_dir, tmp_path):
+    expected = sha256_file(serve_dir / "best_model.pth")
+    dest = str(tmp_path / "best_model.pth")
+    # A stale partial download that the server will not let us resume
+    with open(dest + ".part", "wb") as f:
+        f.write(b"x" * 1000)
+    server = start_server(str(serve_dir), ranges=False)
+    try:
+        download_artifact(server.url_for("best_model.pth"), dest, sha256=expected)
+        assert sha256_file(dest) == expected
+    finally:
+        server.shutdown()
+
+
+def test_no_range_and_dropped_connections_gives_up(serve_dir, tmp_path):
+    # Every attempt restarts at 0 and dies at the same byte: no progress, however much is written
+    server = start_server(str(serve_dir), fail_after_bytes=1024 * 1024, ranges=False)
+    try:
+        dest = str(tmp_path / "best_model.pth")
+        with pytest.raises(requests.RequestException):
+            download_artifact(server.url_for("best_model.pth"), dest, sha256="0" * 64, timeout=5)
+        assert server.requests <= 5
+    finally:
+        server.shutdown()
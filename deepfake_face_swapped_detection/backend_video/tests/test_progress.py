@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+from progress import emit, event_stream
+
+
+def test_work_runs_even_if_the_stream_is_never_read():
+    finished = threading.Event()
+
+    def work():
+        emit("frames", decoded=1)
+        finished.set()
+        return {"ok": True}
+
+    async def main():
+        stream = event_stream(work)
+        # A client that disconnects before the response starts: the generator is only closed
+        await stream.aclose()
+        return await asyncio.get_running_loop().run_in_executor(None, finished.wait, 5)
+
+    assert asyncio.run(main())
+
+
+def test_stream_yields_events_then_result():
+    def work():
+        emit("frames", decoded=3, total=8)
+        return {"label": "REAL"}
+
+    async def main():
+        return [chunk async for chunk in event_stream(work)]
+
+    chunks = asyncio.run(main())
+    assert chunks[0].startswith("event: frames\n")
+    assert chunks[-1] == 'event: result\ndata: {"label": "REAL"}\n\n'
@@ -0,0 +1,10 @@
+import pytest
+
+# Only in a full checkout: a deployed backend has neither benchmarks/ nor the other backend
+check_shared = pytest.importorskip("check_shared")
+
+
+def test_shared_modules_are_identical():
+    # metrics, admission, tracing, ... are copied into both backends; edit one, then run
+    # `python benchmarks/check_shared.py --fix --from <backend>`
+    assert check_shared.drifted() == []
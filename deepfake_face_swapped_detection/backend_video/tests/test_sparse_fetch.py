@@ -0,0 +1,192 @@
+import io
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from http_fixture import start_server
+from streaming import read_ppm_frame
+from sparse_fetch import (MERGE_GAP_BYTES, MIN_DISTINCT_KEYFRAMES, RangeReader,
+                          _sample_table, decode_sparse_keyframes, sparse_fetch_mp4)
+
+
+@pytest.fixture
+def media_dir(tmp_path):
+    with open(tmp_path / "big.mp4", "wb") as f:
+        f.write(os.urandom(1024 * 1024) * 32)
+    return tmp_path
+
+
+def test_range_reader_returns_requested_bytes(media_dir):
+    server = start_server(str(media_dir))
+    try:
+        reader = RangeReader(server.url_for("big.mp4"))
+        assert reader.read(10, 20) == (media_dir / "big.mp4").read_bytes()[10:20]
+        assert reader.total_size == 32 * 1024 * 1024
+        reader.close()
+    finally:
+        server.shutdown()
+
+
+def test_server_ignoring_range_is_not_downloaded(media_dir):
+    server = start_server(str(media_dir), ranges=False)
+    try:
+        reader = RangeReader(server.url_for("big.mp4"))
+        with pytest.raises(RuntimeError, match="Range"):
+            reader.read(0, 1024)
+        reader.close()
+        # The 200 is refused from its status line; the 32 MB body is never read
+        assert server.bytes_sent < 8 * 1024 * 1024
+        assert reader.bytes_transferred == 0
+    finally:
+        server.shutdown()
+
+
+def test_counters_are_exact_under_concurrent_reads(media_dir):
+    server = start_server(str(media_dir))
+    try:
+        reader = RangeReader(server.url_for("big.mp4"))
+        ranges = [(i * 4096, i * 4096 + 1000) for i in range(200)]
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda r: reader.read(*r), ranges))
+        assert reader.requests == 200
+        assert reader.bytes_transferred == 200 * 1000
+        reader.close()
+    finally:
+        server.shutdown()
+
+
+def test_sample_table_expands_the_index():
+    # Chunk 1 holds 3 samples, chunk 2 the last 2; I P B B P in decode order
+    track = {
+        'timescale': 100,
+        'sizes': np.array([10, 20, 30, 40, 50]),
+        'chunk_offsets': np.array([100, 1000]),
+        'stsc': np.array([[1, 3, 1], [2, 2, 1]]),
+        'stts': np.array([[5, 4]]),
+        'ctts': np.array([[1, 4], [1, 12], [2, 0], [1, 4]]),
+        'stss': np.array([0]),
+    }
+    table = _sample_table(track)
+    assert table['offsets'].tolist() == [100, 110, 130, 1000, 1040]
+    assert table['decode_seconds'].tolist() == [0, 0.04, 0.08, 0.12, 0.16]
+    assert table['presentation_times'].tolist() == [4, 16, 8, 12, 20]
+    assert table['sync'].tolist() == [0]
+
+
+def encode_mp4(path, seconds=5, gop=12, faststart=True):
+    """testsrc2 + sine, x264 with B-frames (so the index has ctts) and AAC audio."""
+    cmd = [
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=320x240:rate=25:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}',
+        '-c:v', 'libx264', '-g', str(gop), '-keyint_min', str(gop), '-bf', '2', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest',
+    ]
+    if faststart:
+        cmd += ['-movflags', '+faststart']
+    subprocess.run(cmd + [str(path)], check=True)
+
+
+def decode_all_frames(path):
+    proc = subprocess.run(
+        ['ffmpeg', '-loglevel', 'error', '-i', str(path), '-map', '0:v:0', '-fps_mode', 'passthrough',
+         '-f', 'image2pipe', '-c:v', 'ppm', 'pipe:1'],
+        stdout=subprocess.PIPE, check=True,
+    )
+    stream = io.BytesIO(proc.stdout)
+    frames = []
+    while (frame := read_ppm_frame(stream)) is not None:
+        frames.append(frame)
+    return frames
+
+
+def key_frame_numbers(path):
+    log = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-i', str(path), '-map', '0:v:0', '-fps_mode', 'passthrough',
+         '-vf', 'showinfo', '-f', 'null', '-'],
+        stderr=subprocess.PIPE, text=True, check=True,
+    ).stderr
+    return {int(n) for n in re.findall(r'\bn:\s*(\d+)\b.*\biskey:1', log)}
+
+
+def decode_audio(path, seconds):
+    return subprocess.run(
+        ['ffmpeg', '-loglevel', 'quiet', '-i', str(path), '-t', str(seconds), '-map', '0:a:0',
+         '-f', 's16le', '-ac', '1', '-ar', '16000', 'pipe:1'],
+        stdout=subprocess.PIPE,
+    ).stdout
+
+
+@pytest.fixture(scope='module')
+def mp4_dir(tmp_path_factory):
+    if shutil.which('ffmpeg') is None:
+        pytest.skip('Needs ffmpeg')
+    path = tmp_path_factory.mktemp('mp4')
+    encode_mp4(path / 'faststart.mp4')
+    encode_mp4(path / 'moov_last.mp4', faststart=False)
+    encode_mp4(path / 'one_gop.mp4', gop=250)
+    return path
+
+
+@pytest.mark.parametrize('name', ['faststart.mp4', 'moov_last.mp4'])
+@pytest.mark.parametrize('merge_gap', [0, MERGE_GAP_BYTES])
+def test_sparse_keyframes_match_a_full_decode(mp4_dir, tmp_path, name, merge_gap):
+    original = mp4_dir / name
+    assert b'ctts' in original.read_bytes()
+    server = start_server(str(mp4_dir))
+    try:
+        result = sparse_fetch_mp4(server.url_for(name), 16, 2.0, output_dir=str(tmp_path), merge_gap=merge_gap)
+    finally:
+        server.shutdown()
+
+    # Snapped to keyframes, spread over the whole clip
+    assert set(result['frame_indices']) <= key_frame_numbers(original)
+    assert len(set(result['frame_indices'])) >= MIN_DISTINCT_KEYFRAMES
+    assert result['frame_indices'] == sorted(result['frame_indices'])
+    assert result['frame_indices'][-1] >= 100
+
+    full = decode_all_frames(original)
+    sparse = decode_sparse_keyframes(result['path'], result['frame_indices'])
+    assert len(sparse) == 16
+    for index, frame in zip(result['frame_indices'], sparse):
+        assert np.array_equal(frame, full[index]), f"frame {index} differs"
+
+    # The audio window came along too
+    assert decode_audio(result['path'], 1.5) == decode_audio(original, 1.5)
+
+
+def test_merging_fetches_the_same_bytes_in_fewer_requests(mp4_dir, tmp_path):
+    server = start_server(str(mp4_dir))
+    try:
+        url = server.url_for('faststart.mp4')
+        separate = sparse_fetch_mp4(url, 16, 2.0, output_dir=str(tmp_path), merge_gap=0)
+        merged = sparse_fetch_mp4(url, 16, 2.0, output_dir=str(tmp_path), merge_gap=1024 * 1024)
+    finally:
+        server.shutdown()
+    assert merged['requests'] < separate['requests']
+    with open(separate['path'], 'rb') as a, open(merged['path'], 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_decoded_frame_count_is_checked(mp4_dir, tmp_path):
+    server = start_server(str(mp4_dir))
+    try:
+        result = sparse_fetch_mp4(server.url_for('faststart.mp4'), 16, 2.0, output_dir=str(tmp_path))
+    finally:
+        server.shutdown()
+    with pytest.raises(RuntimeError, match='Decoded'):
+        decode_sparse_keyframes(result['path'], result['frame_indices'] + [result['frame_indices'][-1] + 1])
+
+
+def test_too_few_keyframes_is_refused(mp4_dir, tmp_path):
+    server = start_server(str(mp4_dir))
+    try:
+        with pytest.raises(RuntimeError, match='too sparse'):
+            sparse_fetch_mp4(server.url_for('one_gop.mp4'), 16, 2.0, output_dir=str(tmp_path))
+    finally:
+        server.shutdown()
@@ -0,0 +1,154 @@
+import io
+import time
+import shutil
+import threading
+import subprocess
+
+import numpy as np
+import pytest
+
+import streaming
+from cancellation import Cancelled, CancelToken, DeadlineExceeded, bind
+from http_fixture import start_server
+from streaming import read_ppm_frame, stream_video_samples
+
+# Red channel brightness per second of video, so a frame tells when it was taken
+BRIGHTNESS_PER_SECOND = 40
+
+# Stands in for `python -m yt_dlp`: writes the first half of the file, then hangs like a stalled download
+STALLED_YT_DLP = """
+import sys, json, time
+args = sys.argv[1:]
+with open(args[args.index('--load-info-json') + 1]) as f:
+    info = json.load(f)
+with open(info['url'], 'rb') as f:
+    data = f.read()
+sys.stdout.buffer.write(data[:len(data) // 2])
+sys.stdout.buffer.flush()
+time.sleep(60)
+"""
+
+
+def encode_clip(path, seconds, brightness_per_second=BRIGHTNESS_PER_SECOND):
+    subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f"nullsrc=s=160x120:r=25:d={seconds},geq=r='T*{brightness_per_second}':g=128:b=128",
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={seconds}',
+        '-c:v', 'libx264', '-g', '25', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+        '-movflags', '+faststart', str(path),
+    ], check=True)
+
+
+def taken_at(frame):
+    return frame[..., 0].mean() / BRIGHTNESS_PER_SECOND
+
+
+@pytest.fixture(scope='module')
+def clips(tmp_path_factory):
+    if shutil.which('ffmpeg') is None:
+        pytest.skip('Needs ffmpeg')
+    path = tmp_path_factory.mktemp('clips')
+    encode_clip(path / 'short.mp4', 6)
+    encode_clip(path / 'long.mp4', 40, brightness_per_second=6)
+    return path
+
+
+@pytest.fixture
+def stalled_download(clips, tmp_path, monkeypatch):
+    """Pipes long.mp4 through the stalling yt-dlp stub; returns the child processes as they start."""
+    package = tmp_path / 'stub' / 'yt_dlp'
+    package.mkdir(parents=True)
+    (package / '__init__.py').write_text('')
+    (package / '__main__.py').write_text(STALLED_YT_DLP)
+    monkeypatch.setenv('PYTHONPATH', str(tmp_path / 'stub'))
+    monkeypatch.setattr(streaming, '_resolve_stream_info', lambda url, timeout: {
+        'url': str(clips / 'long.mp4'), 'duration': 40.0, 'fps': 25.0, 'acodec': 'aac', 'format_id': 'stub',
+    })
+
+    procs = []
+    popen = subprocess.Popen
+
+    def recording_popen(*args, **kwargs):
+        procs.append(popen(*args, **kwargs))
+        return procs[-1]
+    monkeypatch.setattr(streaming.subprocess, 'Popen', recording_popen)
+    return procs
+
+
+def test_read_ppm_frame():
+    pixels = bytes(range(2 * 3 * 3))
+    stream = io.BytesIO(b'P6\n3 2\n255\n' + pixels + b'P6 3 2 255 ' + pixels + b'P6\n3 2\n255\n' + pixels[:5])
+    for _ in range(2):
+        frame = read_ppm_frame(stream)
+        assert frame.shape == (2, 3, 3)
+        assert frame.tobytes() == pixels
+    # A frame cut short by a killed ffmpeg ends the stream
+    assert read_ppm_frame(stream) is None
+
+    with pytest.raises(ValueError):
+        read_ppm_frame(io.BytesIO(b'GIF89a'))
+
+
+def test_frames_and_audio_are_sampled_over_the_window(clips):
+    server = start_server(str(clips))
+    try:
+        result = stream_video_samples(server.url_for('short.mp4'), 8, 4.0, timeout=60)
+    finally:
+        server.shutdown()
+
+    assert result['duration'] == pytest.approx(6.0, abs=0.1)
+    assert len(result['frames']) == 8
+    assert result['frames'][0].shape == (120, 160, 3)
+    # Evenly over the first 4 s of a 6 s clip, nothing from after the window
+    times = [taken_at(frame) for frame in result['frames']]
+    assert times == sorted(times)
+    assert times[0] < 0.5 and 3.0 < times[-1] < 4.3
+    assert result['frame_indices'] == [0, 12, 25, 38, 50, 62, 75, 88]
+
+    # The audio pipe carried the window's audio, 16 kHz mono
+    assert result['sample_rate'] == 16000
+    assert len(result['waveform']) == pytest.approx(4.0 * 16000, rel=0.02)
+    assert 0.1 < np.abs(result['waveform']).max() <= 1.0
+
+
+def test_timeout_keeps_the_frames_decoded_so_far(stalled_download):
+    start = time.monotonic()
+    result = stream_video_samples('https://example.com/video.mp4', 8, 32.0, timeout=3)
+    assert time.monotonic() - start < 10
+
+    # Half the file arrived: the first frames, padded out to the requested count
+    assert len(result['frames']) == 8
+    times = [taken_at(frame) for frame in result['frames']]
+    assert times[0] < 1 and max(times) < 24
+    assert len(set(result['frame_indices'])) < 8
+
+    ytdlp, ffmpeg = stalled_download
+    assert ytdlp.returncode is not None and ffmpeg.returncode is not None
+
+
+def test_cancel_kills_both_processes(stalled_download):
+    token = CancelToken(60)
+    first_frame = threading.Event()
+
+    def cancel_after_first_frame():
+        first_frame.wait(20)
+        token.cancel()
+    canceller = threading.Thread(target=cancel_after_first_frame)
+    canceller.start()
+
+    start = time.monotonic()
+    with bind(token), pytest.raises(Cancelled) as e:
+        stream_video_samples('https://example.com/video.mp4', 8, 32.0, timeout=60,
+                             on_frame=lambda frames: first_frame.set())
+    canceller.join()
+    assert e.value.status_code == 499
+    assert time.monotonic() - start < 10
+
+    ytdlp, ffmpeg = stalled_download
+    assert ytdlp.returncode == -9 and ffmpeg.returncode == -9
+
+
+def test_deadline_kills_the_stalled_stream(stalled_download):
+    with bind(CancelToken(2)), pytest.raises(DeadlineExceeded):
+        stream_video_samples('https://example.com/video.mp4', 8, 32.0, timeout=60)
+    assert all(proc.returncode == -9 for proc in stalled_download)
@@ -0,0 +1,25 @@
+import os
+import json
+
+import tracing
+
+
+def test_each_process_writes_its_own_trace_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(tracing, "_trace_logger", None)
+
+    parent = tracing._get_trace_logger()
+    parent.info(json.dumps({"from": "parent"}))
+    pid = os.fork()
+    if pid == 0:
+        try:
+            tracing._get_trace_logger().info(json.dumps({"from": "child"}))
+        finally:
+            os._exit(0)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0
+    for handler in parent.handlers:
+        handler.flush()
+
+    assert (tmp_path / f"traces.{os.getpid()}.jsonl").read_text().splitlines() == ['{"from": "parent"}']
+    assert (tmp_path / f"traces.{pid}.jsonl").read_text().splitlines() == ['{"from": "child"}']
@@ -0,0 +1,43 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import uploads
+from uploads import receive_upload
+
+
+def make_app():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        with await receive_upload(request, memory_extensions={".jpg"}) as upload:
+            return {"size": upload.size, "sha256": upload.sha256}
+    return app
+
+
+def test_small_shm_falls_back_to_disk(monkeypatch):
+    monkeypatch.setattr(uploads, "_free_bytes", lambda path: 64 * 1024 * 1024)
+    assert not uploads._default_scratch_dir(250 * 1024 * 1024).startswith("/dev/shm")
+
+
+def test_full_scratch_dir_is_a_server_error(tmp_path, monkeypatch):
+    # A regular file where the directory should be: every scratch write fails with an OSError
+    blocker = tmp_path / "scratch"
+    blocker.write_bytes(b"")
+    monkeypatch.setattr(uploads, "UPLOAD_SCRATCH_DIR", str(blocker / "uploads"))
+    client = TestClient(make_app())
+
+    response = client.post("/upload", files={"file": ("clip.mp4", b"\0" * 4096, "video/mp4")})
+    assert response.status_code == 507
+
+    # In-memory uploads never touch the scratch directory
+    response = client.post("/upload", files={"file": ("face.jpg", b"\xff\xd8\xff" + b"\0" * 100, "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["size"] == 103
+
+
+def test_malformed_body_is_a_client_error():
+    client = TestClient(make_app())
+    response = client.post("/upload", content=b"--x\r\nnot a part",
+                           headers={"content-type": "multipart/form-data; boundary=x"})
+    assert response.status_code in (400, 422)
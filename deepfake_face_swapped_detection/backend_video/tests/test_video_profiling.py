@@ -0,0 +1,41 @@
+import os
+import json
+
+import torch
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import profiling
+from cancellation import NEVER, run_cancellable
+
+
+def test_profiled_request_records_ops_from_worker_thread(tmp_path, monkeypatch):
+    import main
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+
+    def work():
+        x = torch.randn(64, 64)
+        return float((x @ x).relu().sum())
+
+    @app.post("/work")
+    async def endpoint(request: Request):
+        return {"value": await run_cancellable(request, NEVER, work)}
+
+    profiling.install_profiling(app, op_profiler=(main.start_torch_profile, main.stop_torch_profile),
+                                per_thread=True)
+    profiling.arm(1)
+    with TestClient(app) as client:
+        assert client.post("/work").status_code == 200
+
+    (out_dir,) = [os.path.join(tmp_path, d) for d in os.listdir(tmp_path)]
+    with open(os.path.join(out_dir, "torch_ops.txt")) as f:
+        ops = f.read()
+    assert "aten::mm" in ops
+    with open(os.path.join(out_dir, "meta.json")) as f:
+        assert json.load(f)["op_profile"] is True
+
+
+def test_op_profile_is_a_noop_outside_a_profiled_request():
+    with profiling.op_profile():
+        pass
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Grad-CAM overlay rendering: the previous generate_heatmap_image against
+heatmap_render.render_heatmap_overlay.
+
+The baseline is the old function as it was: matplotlib jet rebuilt per call,
+array_to_img/img_to_array round trips, a lossless PNG of the 180x180
+caffe-preprocessed input, and base64. Newer matplotlib no longer has
+cm.get_cmap, which made that function raise; the baseline falls back to
+matplotlib.colormaps so it can still be timed. The Keras preprocessing that
+produces its input is not timed, because inference needs it anyway.
+
+Each candidate renders synthetic JPEGs of several sizes (a 6x6 Grad-CAM
+grid, as ResNet50 gives for 180x180) and reports p50/p95 latency, output
+pixels and bytes (for the baseline, the base64 string it put in the JSON).
+The new renderer runs at --max-side and, for a like-for-like comparison, at
+the baseline's 180 pixels. Unlike the baseline, its time includes decoding
+the original image.
+
+Usage:
+    python benchmarks/bench_heatmap.py [--sizes 640x480,1920x1080,4032x3024] [--iterations 20]
+        [--formats webp,jpeg] [--quality 80] [--max-side 512] [--json]
+"""
+import os
+import io
+import sys
+import json
+import time
+import base64
+import argparse
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_DIR = os.path.abspath(os.path.join(HERE, '..', 'backend-image'))
+sys.path.insert(0, IMAGE_DIR)
+sys.path.insert(0, HERE)
+
+from synthetic_media import parse_size, make_image_bytes
+from heatmap_render import render_heatmap_overlay
+
+
+def legacy_generate_heatmap_image(img_array, heatmap):
+    """generate_heatmap_image before heatmap_render.py, kept for comparison."""
+    import matplotlib.cm as cm
+    from tensorflow.keras.preprocessing import image as keras_image
+
+    img = keras_image.array_to_img(img_array[0])
+
+    heatmap_uint8 = np.uint8(255 * heatmap)
+    if hasattr(cm, "get_cmap"):
+        jet = cm.get_cmap("jet")
+    else:
+        import matplotlib
+        jet = matplotlib.colormaps["jet"]
+    jet_colors = jet(np.arange(256))[:, :3]
+    jet_heatmap = jet_colors[heatmap_uint8]
+    jet_heatmap = keras_image.array_to_img(jet_heatmap)
+    jet_heatmap = jet_heatmap.resize((img.size[0], img.size[1]))
+    jet_heatmap = keras_image.img_to_array(jet_heatmap)
+
+    superimposed = jet_heatmap * 0.4 + keras_image.img_to_array(img)
+    superimposed = keras_image.array_to_img(superimposed)
+
+    buffer = io.BytesIO()
+    superimposed.save(buffer, format="PNG")
+    img_str = base64.b64encode(buffer.getvalue()).decode()
+    return f"data:image/png;base64,{img_str}"
+
+
+def caffe_input(image_bytes):
+    """The 180x180 model input the legacy renderer drew on (main.transform_image)."""
+    from PIL import Image
+    from tensorflow.keras.applications.resnet50 import preprocess_input
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB").resize((180, 180))
+    return preprocess_input(np.expand_dims(np.asarray(img, dtype=np.float32), axis=0))
+
+
+def output_size(out) -> str:
+    from PIL import Image
+    if isinstance(out, str):
+        out = base64.b64decode(out.split(",", 1)[1])
+    return "x".join(map(str, Image.open(io.BytesIO(out)).size))
+
+
+def measure(fn, iterations):
+    fn()  # Warm-up: imports, first-call allocations
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        out = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'output_pixels': output_size(out),
+        'output_bytes': len(out),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='640x480,1920x1080,4032x3024')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--formats', default='webp,jpeg')
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--max-side', type=int, default=512)
+    parser.add_argument('--json', action='store_true', help='Print the raw results instead of a table')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    heatmap = rng.random((6, 6)).astype(np.float32)
+    results = {}
+    for size in (parse_size(s) for s in args.sizes.split(',')):
+        data = make_image_bytes(size=size, quality=90)
+        processed = caffe_input(data)
+        name = f"{size[0]}x{size[1]}"
+        rows = {'legacy_png_base64': measure(lambda: legacy_generate_heatmap_image(processed, heatmap),
+                                             args.iterations)}
+        for fmt in args.formats.split(','):
+            for max_side in sorted({180, args.max_side}):
+                rows[f'{fmt}{args.quality}@{max_side}'] = measure(
+                    lambda: render_heatmap_overlay(data, heatmap, fmt=fmt, quality=args.quality,
+                                                   max_side=max_side),
+                    args.iterations)
+        results[name] = rows
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'image':>10}  {'renderer':<18} {'p50 ms':>8} {'p95 ms':>8} {'pixels':>9} {'bytes':>9}")
+    for name, rows in results.items():
+        for renderer, r in rows.items():
+            print(f"{name:>10}  {renderer:<18} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+                  f"{r['output_pixels']:>9} {r['output_bytes']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the model_arch submodules, with a regression baseline.
+
+Each module is built on its own with random weights (eval mode, no grad)
+and its forward pass is timed over a grid of batch sizes and sequence
+lengths (sequence length is capped at Config.SEQUENCE_LENGTH by the
+positional encodings). A case is repeated until --min-time has elapsed, and
+the median is what gets compared.
+
+Usage:
+    # Measure and store a baseline
+    python benchmarks/bench_modules.py run --save benchmarks/baselines/model_arch.json
+    # Re-measure the baseline's grid and flag modules slower by more than 10%
+    python benchmarks/bench_modules.py compare [--baseline benchmarks/baselines/model_arch.json]
+        [--current results.json] [--threshold 0.10]
+
+compare exits with status 1 when any case regresses past the threshold.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+
+import torch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend_video'))
+
+import model_arch
+from model_arch import Config
+
+# Bump when the result layout or the way cases are measured changes
+SCHEMA_VERSION = 1
+DEFAULT_BASELINE = os.path.join(HERE, 'baselines', 'model_arch.json')
+
+config = Config()
+HIDDEN = config.HIDDEN_DIM
+AUDIO_FRAMES = int(config.AUDIO_SAMPLE_RATE * 1.0 / 512) + 1
+
+
+def _features(b, s):
+    return torch.randn(b, s, HIDDEN)
+
+
+# name -> (constructor, inputs(batch, seq) -> tuple of forward arguments)
+MODULES = {
+    'AudioFeatureExtractor': (
+        lambda: model_arch.AudioFeatureExtractor(hidden_dim=HIDDEN),
+        lambda b, s: (torch.randn(b, s, config.AUDIO_N_MELS, AUDIO_FRAMES),)),
+    'AudioTemporalConsistencyModule': (
+        lambda: model_arch.AudioTemporalConsistencyModule(HIDDEN),
+        lambda b, s: (_features(b, s),)),
+    'SpatialAttentionModule': (
+        lambda: model_arch.SpatialAttentionModule(512),
+        # ResNet18 output for a 112x112 frame: 512 x 4 x 4, one per frame
+        lambda b, s: (torch.randn(b * s, 512, 4, 4),)),
+    'VideoFeatureExtractor': (
+        lambda: model_arch.VideoFeatureExtractor(hidden_dim=HIDDEN),
+        lambda b, s: (torch.randn(b, s, 3, config.IMG_SIZE, config.IMG_SIZE),)),
+    'VideoTemporalConsistencyModule': (
+        lambda: model_arch.VideoTemporalConsistencyModule(HIDDEN),
+        lambda b, s: (_features(b, s),)),
+    'CrossModalAttention': (
+        lambda: model_arch.CrossModalAttention(HIDDEN, num_heads=4, dropout=config.DROPOUT_RATE),
+        lambda b, s: (_features(b, s), _features(b, s))),
+    'TemporalAggregator': (
+        lambda: model_arch.TemporalAggregator(HIDDEN),
+        lambda b, s: (_features(b, s),)),
+    'MultiModalFusionNetwork': (
+        lambda: model_arch.MultiModalFusionNetwork(feature_dim=HIDDEN),
+        lambda b, s: (_features(b, s), _features(b, s))),
+    'MultiModalDeepfakeDetector': (
+        lambda: model_arch.MultiModalDeepfakeDetector(hidden_dim=HIDDEN),
+        lambda b, s: (torch.randn(b, s, config.AUDIO_N_MELS, AUDIO_FRAMES),
+                      torch.randn(b, s, 3, config.IMG_SIZE, config.IMG_SIZE))),
+}
+
+
+def case_key(module: str, batch: int, seq: int) -> str:
+    return f"{module}[b={batch},s={seq}]"
+
+
+def environment() -> dict:
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+    except OSError:
+        pass
+    return {'host': socket.gethostname(), 'cpu': cpu, 'python': platform.python_version(),
+            'torch': torch.__version__, 'threads': torch.get_num_threads()}
+
+
+def time_case(module, inputs, min_time: float, min_repeats: int, warmup: int) -> dict:
+    with torch.no_grad():
+        for _ in range(warmup):
+            module(*inputs)
+        samples = []
+        start = time.perf_counter()
+        while len(samples) < min_repeats or time.perf_counter() - start < min_time:
+            t0 = time.perf_counter()
+            module(*inputs)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    n = len(samples)
+    return {
+        'median_ms': round(samples[n // 2], 4),
+        'min_ms': round(samples[0], 4),
+        'p90_ms': round(samples[min(n - 1, int(n * 0.9))], 4),
+        'repeats': n,
+    }
+
+
+def run(modules, batch_sizes, seq_lens, min_time=0.5, min_repeats=5, warmup=2, seed=0) -> dict:
+    torch.manual_seed(seed)
+    results = {}
+    for name in modules:
+        build, make_inputs = MODULES[name]
+        module = build().eval()
+        for batch in batch_sizes:
+            for seq in seq_lens:
+                torch.manual_seed(seed)
+                results[case_key(name, batch, seq)] = {
+                    'module': name, 'batch': batch, 'seq_len': seq,
+                    **time_case(module, make_inputs(batch, seq), min_time, min_repeats, warmup),
+                }
+                print(f"  {case_key(name, batch, seq):<50} {results[case_key(name, batch, seq)]['median_ms']:>10.3f} ms",
+                      file=sys.stderr)
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'grid': {'modules': list(modules), 'batch_sizes': list(batch_sizes), 'seq_lens': list(seq_lens),
+                 'min_time': min_time},
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> dict:
+    """Per-case median ratios; a case regresses when current > baseline * (1 + threshold)."""
+    cases = []
+    for key, base in baseline['results'].items():
+        now = current['results'].get(key)
+        if now is None:
+            continue
+        ratio = now['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+        status = 'regressed' if ratio > 1 + threshold else 'improved' if ratio < 1 - threshold else 'ok'
+        cases.append({'case': key, 'baseline_ms': base['median_ms'], 'current_ms': now['median_ms'],
+                      'ratio': round(ratio, 3), 'status': status})
+    mismatched = {k: (baseline['environment'].get(k), current['environment'].get(k))
+                  for k in ('cpu', 'torch', 'threads')
+                  if baseline['environment'].get(k) != current['environment'].get(k)}
+    return {
+        'threshold': threshold,
+        'environment_mismatch': mismatched,
+        'regressed': [c['case'] for c in cases if c['status'] == 'regressed'],
+        'improved': [c['case'] for c in cases if c['status'] == 'improved'],
+        'cases': cases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='Measure and print (optionally save) results')
+    run_parser.add_argument('--modules', default=','.join(MODULES))
+    run_parser.add_argument('--batch-sizes', default='1,2')
+    run_parser.add_argument('--seq-lens', default=f'8,16,{config.SEQUENCE_LENGTH}')
+    run_parser.add_argument('--min-time', type=float, default=0.5, help='Seconds of timed repeats per case')
+    run_parser.add_argument('--threads', type=int, default=0, help='torch threads (0 = torch default)')
+    run_parser.add_argument('--save', help='Write the results here (e.g. a new baseline)')
+
+    compare_parser = sub.add_parser('compare', help='Compare against a baseline')
+    compare_parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    compare_parser.add_argument('--current', help='Saved results to compare; re-measured when omitted')
+    compare_parser.add_argument('--threshold', type=float, default=0.10)
+    compare_parser.add_argument('--threads', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.command == 'run':
+        report = run(args.modules.split(','), [int(b) for b in args.batch_sizes.split(',')],
+                     [int(s) for s in args.seq_lens.split(',')], min_time=args.min_time)
+        if args.save:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+            with open(args.save, 'w') as f:
+                json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('schema_version') != SCHEMA_VERSION:
+        sys.exit(f"Baseline schema {baseline.get('schema_version')} != {SCHEMA_VERSION}; re-create it with `run --save`")
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        grid = baseline['grid']
+        if not args.threads and baseline['environment'].get('threads'):
+            torch.set_num_threads(baseline['environment']['threads'])
+        current = run(grid['modules'], grid['batch_sizes'], grid['seq_lens'], min_time=grid['min_time'])
+    result = compare(baseline, current, args.threshold)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result['regressed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
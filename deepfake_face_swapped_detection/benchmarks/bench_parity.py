@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Accuracy-versus-speed parity of inference engine configurations.
+
+Runs one local corpus through every engine configuration of both models and
+compares each against the reference engine (the one serving uses today):
+
+- video, MultiModalDeepfakeDetector (videos, and images as static videos,
+  exactly as /predict does): eager (reference), inference_mode,
+  bf16_autocast, dynamic_int8, torchscript, compile
+- image, the Keras ResNet50 classifier: keras_predict (reference),
+  tf_function, xla, tflite, tflite_int8
+
+Per engine: label agreement, max logit delta, max consistency-score delta
+(video), min correlation of the explanation (per-frame temporal consistency
+for video, Grad-CAM heatmap for image; engines that cannot take gradients
+report none), p50 latency per input, build time and RSS. An engine that
+fails to build or run is listed with its error instead of aborting the run.
+
+Each backend runs in its own subprocess (both are imported as `main`); the
+default output is one table across both, --json prints the raw results.
+
+Usage:
+    python benchmarks/bench_parity.py [--backend all|video|image] [--engines eager,dynamic_int8,...]
+        [--repeats 3] [--weights auto|random] [--corpus DIR] [--json] [--output results.json] [corpus options]
+"""
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VIDEO_DIR = os.path.abspath(os.path.join(HERE, '..', 'backend_video'))
+IMAGE_DIR = os.path.abspath(os.path.join(HERE, '..', 'backend-image'))
+sys.path.insert(0, HERE)
+
+from synthetic_media import add_corpus_arguments, corpus_from_args
+
+VIDEO_ENGINES = ('eager', 'inference_mode', 'bf16_autocast', 'dynamic_int8', 'torchscript', 'compile')
+IMAGE_ENGINES = ('keras_predict', 'tf_function', 'xla', 'tflite', 'tflite_int8')
+CONSISTENCY_KEYS = ('audio_consistency', 'video_consistency', 'cross_modal_consistency')
+
+
+def rss_mb() -> float:
+    with open('/proc/self/statm') as f:
+        return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+
+
+def correlation(a, b) -> float:
+    a, b = np.ravel(a).astype(np.float64), np.ravel(b).astype(np.float64)
+    if a.std() == 0 or b.std() == 0:
+        # Flat maps (e.g. an all-zero Grad-CAM) only correlate with an identical map
+        return 1.0 if np.allclose(a, b) else 0.0
+    return float(np.corrcoef(a, b)[0, 1])
+
+
+def run_engine(name, build, inputs, repeats: int) -> dict:
+    """
+    Builds one engine and runs every input through it.
+
+    Args:
+        build: () -> (predict(sample) -> outputs dict, explain(sample, outputs) -> array or None)
+        inputs: list of (input name, sample)
+        repeats: Timed runs per input; outputs come from the first
+
+    Returns:
+        dict: {engine, status, outputs?, latency_ms?, build_s?, rss_mb?, rss_delta_mb?, error?}
+    """
+    before = rss_mb()
+    start = time.perf_counter()
+    try:
+        predict, explain = build()
+        predict(inputs[0][1])  # Warm-up; also triggers lazy tracing / compilation
+        build_s = time.perf_counter() - start
+        outputs, latencies = {}, []
+        for input_name, sample in inputs:
+            for i in range(repeats):
+                t0 = time.perf_counter()
+                result = predict(sample)
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+                if i == 0:
+                    outputs[input_name] = result
+            outputs[input_name]['explanation'] = explain(sample, outputs[input_name])
+    except Exception as e:
+        return {'engine': name, 'status': 'failed', 'error': f"{type(e).__name__}: {str(e)[:300]}"}
+    return {
+        'engine': name,
+        'status': 'ok',
+        'outputs': outputs,
+        'latency_ms': {'p50': round(float(np.percentile(latencies, 50)), 2),
+                       'mean': round(float(np.mean(latencies)), 2)},
+        'build_s': round(build_s, 2),
+        'rss_mb': rss_mb(),
+        'rss_delta_mb': round(rss_mb() - before, 1),
+    }
+
+
+def parity(reference: dict, candidate: dict) -> dict:
+    """Compares candidate outputs with the reference engine's, input by input."""
+    agree, logit_deltas, consistency_deltas, correlations = [], [], [], []
+    for input_name, ref in reference.items():
+        out = candidate[input_name]
+        agree.append(out['label'] == ref['label'])
+        logit_deltas.append(float(np.max(np.abs(out['logits'] - ref['logits']))))
+        if ref.get('consistency') is not None:
+            consistency_deltas.append(float(np.max(np.abs(out['consistency'] - ref['consistency']))))
+        if ref['explanation'] is not None and out['explanation'] is not None:
+            correlations.append(correlation(ref['explanation'], out['explanation']))
+    return {
+        'label_agreement': round(sum(agree) / len(agree), 4),
+        'max_logit_delta': round(max(logit_deltas), 6),
+        'max_consistency_delta': round(max(consistency_deltas), 6) if consistency_deltas else None,
+        'explanation_corr_min': round(min(correlations), 4) if correlations else None,
+    }
+
+
+def run_engines(engines: dict, inputs, repeats: int) -> list:
+    """Runs every engine; the first is the reference the others are compared with."""
+    rows, reference = [], None
+    for name, build in engines.items():
+        print(f"  {name}...", file=sys.stderr)
+        row = run_engine(name, build, inputs, repeats)
+        if reference is None:
+            if row['status'] != 'ok':
+                raise RuntimeError(f"Reference engine {name} failed: {row['error']}")
+            reference = row['outputs']
+        if row['status'] == 'ok':
+            row.update(parity(reference, row.pop('outputs')))
+        rows.append(row)
+    return rows
+
+
+# --- Video: MultiModalDeepfakeDetector ---------------------------------------
+
+def video_engines(net, sample, selected) -> dict:
+    import torch
+
+    def summarize(outputs):
+        logits = outputs['logits'][0].float()
+        scores = outputs['consistency_scores']
+        return {
+            'logits': logits.numpy(),
+            'label': int(torch.argmax(logits)),
+            'consistency': np.array([scores[k][0].float().item() for k in CONSISTENCY_KEYS]),
+            'temporal': np.concatenate([outputs['audio_temporal_consistency'][0].float().numpy().ravel(),
+                                        outputs['video_temporal_consistency'][0].float().numpy().ravel()]),
+        }
+
+    def explain(sample, result):
+        # /predict-explain picks frames from the per-step temporal consistency
+        return result['temporal']
+
+    def engine(forward, context=torch.no_grad):
+        def predict(inputs):
+            audio, video = inputs
+            with context():
+                return summarize(forward(audio, video))
+        return lambda: (predict, explain)
+
+    def bf16_forward(audio, video):
+        with torch.autocast('cpu', dtype=torch.bfloat16):
+            return net(audio, video)
+
+    def dynamic_int8():
+        quantized = torch.ao.quantization.quantize_dynamic(copy.deepcopy(net), {torch.nn.Linear}, dtype=torch.qint8)
+
+        def forward(audio, video):
+            # The transformer fast path reads linear weights as tensors, which quantized Linear does not expose
+            fastpath = torch.backends.mha.get_fastpath_enabled()
+            torch.backends.mha.set_fastpath_enabled(False)
+            try:
+                return quantized(audio, video)
+            finally:
+                torch.backends.mha.set_fastpath_enabled(fastpath)
+        return engine(forward)()
+
+    def torchscript():
+        # The tracer cannot return the nested outputs dict, so trace a flat tuple and rebuild it
+        class Flat(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.net = net
+
+            def forward(self, audio, video):
+                outputs = self.net(audio, video)
+                return (outputs['logits'], *(outputs['consistency_scores'][k] for k in CONSISTENCY_KEYS),
+                        outputs['audio_temporal_consistency'], outputs['video_temporal_consistency'])
+
+        with torch.no_grad():
+            # Sequence loops are unrolled for the fixed Config.SEQUENCE_LENGTH the preprocessors produce
+            traced = torch.jit.freeze(torch.jit.trace(Flat().eval(), sample, check_trace=False))
+
+        def forward(audio, video):
+            logits, *rest = traced(audio, video)
+            return {'logits': logits, 'consistency_scores': dict(zip(CONSISTENCY_KEYS, rest[:3])),
+                    'audio_temporal_consistency': rest[3], 'video_temporal_consistency': rest[4]}
+        return engine(forward)()
+
+    def compiled():
+        return engine(torch.compile(net))()
+
+    builders = {
+        'eager': engine(net),
+        'inference_mode': engine(net, torch.inference_mode),
+        'bf16_autocast': engine(bf16_forward),
+        'dynamic_int8': dynamic_int8,
+        'torchscript': torchscript,
+        'compile': compiled,
+    }
+    return {name: builders[name] for name in selected}
+
+
+def run_video(manifest, args) -> dict:
+    os.chdir(VIDEO_DIR)
+    sys.path.insert(0, VIDEO_DIR)
+    import torch
+    import main
+    from model_arch import MultiModalDeepfakeDetector
+
+    if args.weights == 'auto' and os.path.exists(main.MODEL_PATH):
+        main.load_model()
+    if main.model is None:
+        # Random weights still show numeric drift between engines, not label quality
+        torch.manual_seed(0)
+        main.model = MultiModalDeepfakeDetector().to(main.DEVICE).eval()
+    net = main.model
+
+    inputs = []
+    for item in manifest:
+        audio, video = (main.preprocess_video(item['path'])[:2] if item['kind'] == 'video'
+                        else main.preprocess_image_as_video(item['path']))
+        if video is not None:
+            inputs.append((item['name'], (audio.unsqueeze(0).to(main.DEVICE), video.unsqueeze(0).to(main.DEVICE))))
+    selected = [e for e in args.engines.split(',') if e in VIDEO_ENGINES] if args.engines else VIDEO_ENGINES
+    engines = video_engines(net, inputs[0][1], ['eager'] + [e for e in selected if e != 'eager'])
+    return {'torch': torch.__version__, 'threads': torch.get_num_threads(),
+            'weights': 'random' if main.model_error or not os.path.exists(main.MODEL_PATH) or args.weights == 'random'
+            else main.MODEL_PATH,
+            'inputs': [name for name, _ in inputs],
+            'engines': run_engines(engines, inputs, args.repeats)}
+
+
+# --- Image: Keras ResNet50 ---------------------------------------------------
+
+def image_engines(main, model, selected) -> dict:
+    import tensorflow as tf
+
+    def summarize(score):
+        score = float(np.ravel(score)[0])
+        # Sigmoid output: compare in logit space so deltas near 0/1 are not squashed
+        clipped = min(max(score, 1e-7), 1 - 1e-7)
+        return {'logits': np.array([np.log(clipped / (1 - clipped))]), 'label': int(score > 0.5), 'score': score}
+
+    def eager_gradcam(x, result):
+        return main.get_gradcam_heatmap(x, model)
+
+    def graph_gradcam(jit_compile: bool):
+        base_model, classifier_layers = model.layers[0], model.layers[1:]
+
+        @tf.function(jit_compile=jit_compile)
+        def raw_heatmap(x):
+            with tf.GradientTape() as tape:
+                feature_maps = base_model(x)
+                tape.watch(feature_maps)
+                y = feature_maps
+                for layer in classifier_layers:
+                    y = layer(y)
+                score = y[0][0]
+            grads = tape.gradient(score, feature_maps)
+            pooled = tf.reduce_mean(grads, axis=(0, 1, 2))
+            return tf.maximum(tf.squeeze(feature_maps[0] @ pooled[..., tf.newaxis]), 0)
+
+        def explain(x, result):
+            # Same normalisation as get_gradcam_heatmap
+            heatmap = np.nan_to_num(raw_heatmap(tf.constant(x, tf.float32)).numpy(), nan=0.0, posinf=0.0, neginf=0.0)
+            return heatmap / heatmap.max() if heatmap.max() > 0 else heatmap
+        return explain
+
+    def keras_predict():
+        return (lambda x: summarize(model.predict(x, verbose=0)), eager_gradcam)
+
+    def tf_function(jit_compile: bool):
+        def build():
+            call = tf.function(lambda x: model(x, training=False), jit_compile=jit_compile)
+            return (lambda x: summarize(call(tf.constant(x, tf.float32)).numpy()), graph_gradcam(jit_compile))
+        return build
+
+    def tflite(quantize: bool):
+        def build():
+            converter = tf.lite.TFLiteConverter.from_keras_model(model)
+            if quantize:
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]  # Dynamic-range int8 weights
+            interpreter = tf.lite.Interpreter(model_content=converter.convert())
+            interpreter.allocate_tensors()
+            input_index = interpreter.get_input_details()[0]['index']
+            output_index = interpreter.get_output_details()[0]['index']
+
+            def predict(x):
+                interpreter.set_tensor(input_index, x.astype(np.float32))
+                interpreter.invoke()
+                return summarize(interpreter.get_tensor(output_index))
+            # No gradients through the interpreter
+            return (predict, lambda x, result: None)
+        return build
+
+    builders = {
+        'keras_predict': keras_predict,
+        'tf_function': tf_function(False),
+        'xla': tf_function(True),
+        'tflite': tflite(False),
+        'tflite_int8': tflite(True),
+    }
+    return {name: builders[name] for name in selected}
+
+
+def run_image(manifest, args) -> dict:
+    os.chdir(IMAGE_DIR)
+    sys.path.insert(0, IMAGE_DIR)
+    import tensorflow as tf
+    import main
+
+    has_weights = os.path.exists(main.MODEL_ARTIFACT_FILENAME) or os.path.exists(main.MODEL_WEIGHTS_FILENAME)
+    if args.weights == 'auto' and has_weights:
+        model = main.load_model()
+    else:
+        tf.keras.utils.set_random_seed(0)
+        model = main.build_model()
+
+    inputs = []
+    for item in (m for m in manifest if m['kind'] == 'image'):
+        with open(item['path'], 'rb') as f:
+            inputs.append((item['name'], main.transform_image(f.read())))
+    selected = [e for e in args.engines.split(',') if e in IMAGE_ENGINES] if args.engines else IMAGE_ENGINES
+    engines = image_engines(main, model, ['keras_predict'] + [e for e in selected if e != 'keras_predict'])
+    return {'tensorflow': tf.__version__,
+            'weights': main.MODEL_ARTIFACT_FILENAME if args.weights == 'auto' and has_weights else 'random',
+            'inputs': [name for name, _ in inputs],
+            'engines': run_engines(engines, inputs, args.repeats)}
+
+
+# --- Report --------------------------------------------------------------------
+
+def format_table(backends: dict) -> str:
+    def fmt(value, spec):
+        return '—' if value is None else format(value, spec)
+
+    header = (f"{'backend':<7} {'engine':<20} {'agree':>6} {'max dlogit':>11} {'max dcons':>10} "
+              f"{'expl r':>7} {'p50 ms':>9} {'build s':>8} {'RSS MB':>8}")
+    lines = [header, '-' * len(header)]
+    for backend, report in backends.items():
+        for i, row in enumerate(report['engines']):
+            engine = row['engine'] + (' (ref)' if i == 0 else '')
+            if row['status'] != 'ok':
+                lines.append(f"{backend:<7} {engine:<20} failed: {row['error'][:80]}")
+                continue
+            lines.append(
+                f"{backend:<7} {engine:<20} {row['label_agreement']:>6.0%} {row['max_logit_delta']:>11.2e} "
+                f"{fmt(row['max_consistency_delta'], '.2e'):>10} {fmt(row['explanation_corr_min'], '.4f'):>7} "
+                f"{row['latency_ms']['p50']:>9.1f} {row['build_s']:>8.1f} {row['rss_mb']:>8.0f}")
+    lines.append('')
+    lines.append('agree: label agreement with the reference; dcons: global consistency scores (video); '
+                 'expl r: min correlation of temporal consistency (video) / Grad-CAM (image)')
+    for backend, report in backends.items():
+        lines.append(f"{backend}: weights={report['weights']}, {len(report['inputs'])} inputs")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=('all', 'video', 'image'), default='all')
+    parser.add_argument('--engines', default='',
+                        help=f"Comma-separated subset (default all): {','.join(VIDEO_ENGINES + IMAGE_ENGINES)}")
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per input and engine')
+    parser.add_argument('--weights', choices=('auto', 'random'), default='auto',
+                        help='auto loads the real models when present, else random weights')
+    parser.add_argument('--corpus', help='Existing corpus directory with manifest.json (skips generation)')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON instead of a table')
+    parser.add_argument('--output', help='Also write the JSON here')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    work_dir = None
+    if args.corpus:
+        with open(os.path.join(args.corpus, 'manifest.json')) as f:
+            manifest = json.load(f)
+    else:
+        work_dir = tempfile.mkdtemp(prefix='bench_parity_')
+        manifest = corpus_from_args(work_dir, args)
+
+    try:
+        if args.backend == 'all':
+            # One interpreter per backend: both apps are modules named `main`
+            backends = {}
+            for backend in ('video', 'image'):
+                result_path = os.path.join(tempfile.gettempdir(), f'bench_parity_{os.getpid()}_{backend}.json')
+                cmd = [sys.executable, os.path.abspath(__file__), '--backend', backend, '--json',
+                       '--corpus', args.corpus or work_dir, '--output', result_path,
+                       f'--engines={args.engines}', f'--repeats={args.repeats}', f'--weights={args.weights}']
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+                with open(result_path) as f:
+                    backends.update(json.load(f))
+                os.remove(result_path)
+        else:
+            os.environ.setdefault('TRACE_FILE', '')
+            os.environ.setdefault('LOG_LEVEL', 'WARNING')
+            runner = run_video if args.backend == 'video' else run_image
+            backends = {args.backend: runner(manifest, args)}
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(backends, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text if args.json else format_table(backends))
+
+
+if __name__ == '__main__':
+    main()
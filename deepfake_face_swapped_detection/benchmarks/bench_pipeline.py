@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark of both backends' pipelines.
+
+Generates a synthetic corpus (see synthetic_media.py), then, in-process and
+without network access, times each pipeline stage and the full HTTP paths
+through FastAPI's TestClient:
+
+- video: preprocess_video, model forward, anomalous-frame artifacts, one
+  frame thumbnail render,
+  POST /predict, POST /predict-explain
+- image: transform_image, model.predict, Grad-CAM, heatmap render,
+  POST /explain (remote API off, or answered by the local mock)
+
+Each backend runs in its own subprocess (both are imported as `main`), so
+peak RSS is per backend. Output is JSON with, per media file and stage:
+throughput, p50/p95/p99 latency, errors and peak RSS after the stage.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--backend all|video|image] [--iterations 5]
+        [--weights auto|random] [--remote-api off|mock] [--output results.json] [corpus options]
+"""
+import os
+import sys
+import json
+import time
+import mimetypes
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VIDEO_DIR = os.path.abspath(os.path.join(HERE, '..', 'backend_video'))
+IMAGE_DIR = os.path.abspath(os.path.join(HERE, '..', 'backend-image'))
+sys.path.insert(0, HERE)
+
+from synthetic_media import add_corpus_arguments, corpus_from_args
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def measure(fn, iterations: int, warmup: int = 1) -> dict:
+    """Runs fn warmup + iterations times; exceptions count as errors instead of aborting the run."""
+    latencies, errors, first_error = [], 0, None
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            errors += 1
+            first_error = first_error or f"{type(e).__name__}: {str(e)[:200]}"
+            continue
+        finally:
+            elapsed = time.perf_counter() - start
+        if i >= warmup:
+            latencies.append(elapsed)
+    result = {'n': len(latencies), 'errors': errors}
+    if latencies:
+        ms = np.array(latencies) * 1000.0
+        result['throughput_per_s'] = round(len(latencies) / sum(latencies), 3)
+        result['latency_ms'] = {
+            'mean': round(float(ms.mean()), 2),
+            'p50': round(float(np.percentile(ms, 50)), 2),
+            'p95': round(float(np.percentile(ms, 95)), 2),
+            'p99': round(float(np.percentile(ms, 99)), 2),
+        }
+    if first_error:
+        result['first_error'] = first_error
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def check_response(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response
+
+
+def environment() -> dict:
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}
+
+
+def run_video(manifest, args) -> dict:
+    os.chdir(VIDEO_DIR)
+    sys.path.insert(0, VIDEO_DIR)
+    import torch
+    import main
+    from fastapi.testclient import TestClient
+    from model_arch import MultiModalDeepfakeDetector
+    from module_profiler import ModuleProfiler
+
+    if args.weights == 'random' or not os.path.exists(main.MODEL_PATH):
+        # Latency does not depend on the weight values
+        net = MultiModalDeepfakeDetector().to(main.DEVICE).eval()
+        main.model, main.module_profiler = net, ModuleProfiler(net)
+        main.model_ready.set()
+    else:
+        main.load_model()
+
+    results = {}
+    with TestClient(main.app) as client:
+        for item in (m for m in manifest if m['kind'] == 'video'):
+            path = item['path']
+            stages = {}
+            stages['preprocess_video'] = measure(lambda: main.preprocess_video(path, keep_frames=True), args.iterations)
+            audio, video, samples = main.preprocess_video(path, keep_frames=True)
+
+            def forward():
+                with torch.no_grad():
+                    main.model(audio.unsqueeze(0).to(main.DEVICE), video.unsqueeze(0).to(main.DEVICE))
+            stages['inference'] = measure(forward, args.iterations)
+
+            scores = np.linspace(0, 1, main.config.SEQUENCE_LENGTH)
+            stages['explain_frames'] = measure(lambda: main.anomalous_frame_artifacts(samples, scores), args.iterations)
+            # Paid on the first GET /artifacts/{id} of each frame, not in the analysis response
+            stages['frame_thumbnail'] = measure(
+                lambda: main.render_frame_thumbnail({'frame': samples['frames'][0]}), args.iterations)
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            mime = mimetypes.guess_type(path)[0] or 'video/mp4'
+            for endpoint in ('/predict', '/predict-explain'):
+                stages[f'POST {endpoint}'] = measure(
+                    lambda: check_response(client.post(endpoint, files={'file': (item['name'], data, mime)})),
+                    args.iterations)
+            results[item['name']] = stages
+    return {'torch': torch.__version__, 'torch_threads': torch.get_num_threads(), 'results': results}
+
+
+def run_image(manifest, args) -> dict:
+    os.chdir(IMAGE_DIR)
+    sys.path.insert(0, IMAGE_DIR)
+    import tensorflow as tf
+    import main
+    from fastapi.testclient import TestClient
+
+    mock = None
+    if args.remote_api == 'mock':
+        from mock_hive_api import start_mock_api
+        mock = start_mock_api(latency=args.api_latency)
+        main.remote_client.url, main.remote_client.api_key = mock.url, 'bench'
+    else:
+        main.USE_API_FALLBACK = False
+
+    results = {}
+    with TestClient(main.app) as client:
+        if args.weights == 'random' or main.model is None:
+            main.model = main.build_model()
+        for item in (m for m in manifest if m['kind'] == 'image'):
+            with open(item['path'], 'rb') as f:
+                data = f.read()
+            mime = mimetypes.guess_type(item['path'])[0]
+            stages = {}
+            stages['transform_image'] = measure(lambda: main.transform_image(data), args.iterations)
+            processed = main.transform_image(data)
+            stages['inference'] = measure(lambda: main.model.predict(processed, verbose=0), args.iterations)
+            stages['gradcam'] = measure(lambda: main.get_gradcam_heatmap(processed, main.model), args.iterations)
+            heatmap = main.get_gradcam_heatmap(processed, main.model)
+            stages['heatmap_render'] = measure(lambda: main.render_heatmap_overlay(data, heatmap), args.iterations)
+            stages['POST /explain'] = measure(
+                lambda: check_response(client.post('/explain', files={'file': (item['name'], data, mime)})),
+                args.iterations)
+            results[item['name']] = stages
+    if mock is not None:
+        mock.shutdown()
+    return {'tensorflow': tf.__version__, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=('all', 'video', 'image'), default='all')
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--weights', choices=('auto', 'random'), default='auto',
+                        help='auto loads the real model when present, else random weights')
+    parser.add_argument('--remote-api', choices=('off', 'mock'), default='off')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='Mock remote API latency (s)')
+    parser.add_argument('--corpus', help='Existing corpus directory with manifest.json (skips generation)')
+    parser.add_argument('--output', help='Also write the JSON here')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    work_dir = None
+    if args.corpus:
+        with open(os.path.join(args.corpus, 'manifest.json')) as f:
+            manifest = json.load(f)
+    else:
+        work_dir = tempfile.mkdtemp(prefix='bench_pipeline_')
+        manifest = corpus_from_args(work_dir, args)
+
+    try:
+        if args.backend == 'all':
+            # One interpreter per backend: both apps are modules named `main`
+            report = {'environment': environment(), 'media': manifest, 'backends': {}}
+            corpus = args.corpus or work_dir
+            for backend in ('video', 'image'):
+                result_path = os.path.join(tempfile.gettempdir(), f'bench_pipeline_{os.getpid()}_{backend}.json')
+                cmd = [sys.executable, os.path.abspath(__file__), '--backend', backend,
+                       '--corpus', corpus, '--output', result_path] + [
+                       f'--{k.replace("_", "-")}={getattr(args, k)}'
+                       for k in ('iterations', 'weights', 'remote_api', 'api_latency')]
+                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+                with open(result_path) as f:
+                    report['backends'][backend] = json.load(f)
+                os.remove(result_path)
+        else:
+            os.environ.setdefault('TRACE_FILE', '')
+            os.environ.setdefault('LOG_LEVEL', 'WARNING')
+            runner = run_video if args.backend == 'video' else run_image
+            report = {'environment': environment(), 'backend': args.backend, **runner(manifest, args)}
+            report['peak_rss_mb'] = peak_rss_mb()
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
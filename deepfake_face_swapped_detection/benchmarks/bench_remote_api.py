@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the image backend's remote API client.
+
+Runs the pooled/hedged/cached client against the local mock Hive server in
+a few scenarios (tail latency, outage, repeated images, concurrent bursts)
+and prints JSON with latency percentiles, request counts, upstream bytes and
+breaker/cache behaviour.
+
+Usage:
+    python benchmarks/bench_remote_api.py [--calls 50] [--concurrency 8]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend-image'))
+sys.path.insert(0, HERE)
+
+from mock_hive_api import start_mock_api
+from synthetic_media import make_image_bytes
+from remote_api import RemoteDeepfakeClient
+
+
+def percentiles(samples):
+    arr = np.array(samples) * 1000.0
+    return {f'p{p}': round(float(np.percentile(arr, p)), 1) for p in (50, 95, 99)}
+
+
+async def run_scenario(server, images, concurrency, **client_kwargs):
+    client = RemoteDeepfakeClient(server.url, 'mock-key', **client_kwargs)
+    await client.start()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    answered = 0
+
+    async def one(image):
+        nonlocal answered
+        async with semaphore:
+            start = time.perf_counter()
+            label, _ = await client.predict(image)
+            latencies.append(time.perf_counter() - start)
+            answered += label is not None
+
+    server.reset_counters()
+    await asyncio.gather(*(one(image) for image in images))
+    await client.close()
+    return {
+        'latency_ms': percentiles(latencies),
+        'answered': answered,
+        'calls': len(images),
+        'upstream_requests': server.requests,
+        'upstream_images': server.images,
+        'upstream_bytes': server.bytes_received,
+        'breaker': client.breaker.state,
+        'cache_hits': client.cache.hits,
+    }
+
+
+async def main_async(args):
+    # Phone-camera sized JPEGs, so re-encoding has real work to do
+    photos = [make_image_bytes(i) for i in range(4)]
+    # Distinct bytes per call so the cache stays out of the way; the trailing junk is ignored by decoders
+    unique = [photos[i % len(photos)] + i.to_bytes(4, 'big') for i in range(args.calls)]
+    results = {'upload_bytes_per_image': len(photos[0])}
+
+    # 10% of upstream answers take 3 s; the hedge should cap most calls near hedge_delay + latency
+    server = start_mock_api(latency=0.05, slow_fraction=0.1, slow_latency=3.0)
+    results['tail_no_hedge'] = await run_scenario(server, unique, args.concurrency, hedge_delay=60, timeout=10)
+    results['tail_hedged'] = await run_scenario(server, unique, args.concurrency, hedge_delay=0.3, timeout=10)
+    server.shutdown()
+
+    # Upstream down: the breaker should stop sending requests after a few failures
+    server = start_mock_api(failure_rate=1.0)
+    results['outage'] = await run_scenario(server, unique, args.concurrency, failure_threshold=3)
+    server.shutdown()
+
+    # Burst of concurrent uploads: one request per image vs batched, downscaled requests
+    server = start_mock_api(latency=0.05)
+    results['burst_unbatched_full_size'] = await run_scenario(server, unique, args.concurrency, max_batch=1,
+                                                              max_side=100000)
+    results['burst_batched_downscaled'] = await run_scenario(server, unique, args.concurrency)
+    server.shutdown()
+
+    # Same few images over and over: the cache should answer most of them
+    server = start_mock_api(latency=0.05)
+    repeated = [unique[i % 5] for i in range(args.calls)]
+    results['repeated_images'] = await run_scenario(server, repeated, 1)
+    server.shutdown()
+
+    print(json.dumps(results, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
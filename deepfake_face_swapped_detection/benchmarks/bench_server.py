@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Launch one backend under uvicorn for load tests, offline.
+
+Runs the real app from its own directory. When the model file is missing
+(fresh checkout, no network), a randomly initialised model of the same
+architecture is installed instead, since latency does not depend on the
+weight values. The image backend's remote API is disabled unless API_URL
+is set.
+
+Usage:
+    python benchmarks/bench_server.py {video,image} [--port 8000] [--random-weights]
+"""
+import os
+import sys
+import argparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIRS = {
+    'video': os.path.abspath(os.path.join(HERE, '..', 'backend_video')),
+    'image': os.path.abspath(os.path.join(HERE, '..', 'backend-image')),
+}
+
+
+def prepare_video(random_weights: bool):
+    import main
+    from model_arch import MultiModalDeepfakeDetector
+    from module_profiler import ModuleProfiler
+
+    if random_weights or not os.path.exists(main.MODEL_PATH):
+        net = MultiModalDeepfakeDetector().to(main.DEVICE).eval()
+        main.warm_up(net)
+        main.model, main.module_profiler = net, ModuleProfiler(net)
+        # The lifespan only starts the background loader while this is unset
+        main.model_ready.set()
+    return main.app
+
+
+def prepare_image(random_weights: bool):
+    import main
+
+    if not os.environ.get("API_URL"):
+        main.USE_API_FALLBACK = False
+    if random_weights or not (os.path.exists(main.MODEL_ARTIFACT_FILENAME)
+                              or os.path.exists(main.MODEL_WEIGHTS_FILENAME)):
+        main.load_model = main.build_model
+    return main.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('backend', choices=sorted(BACKEND_DIRS))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--random-weights', action='store_true')
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIRS[args.backend])
+    sys.path.insert(0, BACKEND_DIRS[args.backend])
+    os.environ.setdefault('TRACE_FILE', '')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    import uvicorn
+    prepare = prepare_video if args.backend == 'video' else prepare_image
+    app = prepare(args.random_weights)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Bytes-transferred benchmark for the sparse MP4 fetcher.
+
+Serves a local MP4 through the Range-capable fixture server and compares a
+full download with sparse_fetch_mp4, then checks that the frames decoded from
+the sparse file match the same frames decoded from the original.
+
+Usage:
+    python benchmarks/bench_sparse_fetch.py [--video path.mp4] [--gop 30]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import cv2
+import numpy as np
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend_video'))
+sys.path.insert(0, HERE)
+
+from http_fixture import start_server
+from sparse_fetch import sparse_fetch_mp4, decode_sparse_keyframes
+
+
+def read_frames(path, frame_indices):
+    cap = cv2.VideoCapture(path)
+    frames = {}
+    for idx in sorted(set(frame_indices)):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ret, frame = cap.read()
+        frames[idx] = frame if ret else None
+    cap.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', default=os.path.join(HERE, '..', 'video', 'amfdrorkqd.mp4'))
+    parser.add_argument('--gop', type=int, default=30,
+                        help='Re-encode with this keyframe interval first (0 keeps the file as is)')
+    parser.add_argument('--duration', type=float, default=120.0,
+                        help='Loop the input up to this many seconds (0 keeps the original length)')
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--audio-seconds', type=float, default=32.0)
+    parser.add_argument('--merge-gap', type=int, default=32 * 1024)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_sparse_')
+    try:
+        media_path = os.path.join(work_dir, 'input.mp4')
+        if args.gop > 0 or args.duration > 0:
+            # Typical web uploads are longer and have a keyframe every 1-2 s; the sample clip has far fewer
+            cmd = ['ffmpeg', '-loglevel', 'error', '-y']
+            if args.duration > 0:
+                cmd += ['-stream_loop', '-1', '-t', str(args.duration)]
+            cmd += ['-i', args.video]
+            cmd += ['-c:v', 'libx264', '-g', str(args.gop)] if args.gop > 0 else ['-c:v', 'copy']
+            subprocess.run(cmd + ['-c:a', 'aac', media_path], check=True)
+        else:
+            shutil.copy(args.video, media_path)
+
+        server = start_server(work_dir)
+        url = server.url_for('input.mp4')
+
+        start = time.perf_counter()
+        full_bytes = len(requests.get(url, timeout=60).content)
+        full_seconds = time.perf_counter() - start
+
+        server.reset_counters()
+        start = time.perf_counter()
+        result = sparse_fetch_mp4(url, args.frames, args.audio_seconds, output_dir=work_dir,
+                                  merge_gap=args.merge_gap)
+        sparse_seconds = time.perf_counter() - start
+
+        # Keyframes decoded from the sparse file must match cv2 seeking in the original
+        original = read_frames(media_path, result['frame_indices'])
+        sparse = decode_sparse_keyframes(result['path'], result['frame_indices'])
+        max_diff = 0
+        missing = 0
+        for idx, frame in zip(result['frame_indices'], sparse):
+            if original[idx] is None:
+                missing += 1
+                continue
+            rgb = cv2.cvtColor(original[idx], cv2.COLOR_BGR2RGB)
+            max_diff = max(max_diff, int(np.abs(rgb.astype(np.int16) - frame.astype(np.int16)).max()))
+
+        server.shutdown()
+        print(json.dumps({
+            'file_bytes': os.path.getsize(media_path),
+            'full_download': {'bytes': full_bytes, 'seconds': round(full_seconds, 4)},
+            'sparse_fetch': {
+                'bytes': result['bytes_transferred'],
+                'server_bytes': server.bytes_sent,
+                'requests': result['requests'],
+                'seconds': round(sparse_seconds, 4),
+                'fraction_of_file': round(result['bytes_transferred'] / result['total_size'], 4),
+            },
+            'distinct_frames': len(set(result['frame_indices'])),
+            'frames_missing': missing,
+            'max_pixel_diff': max_diff,
+        }, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Offline check for the video model artifact store.
+
+Serves a synthetic training checkpoint from the local fixture server with a
+connection that drops every N bytes, then verifies that:
+1. download_artifact resumes to completion and the SHA-256 matches
+2. a wrong digest is rejected and nothing is renamed into place
+3. the converted state dict mmap-loads into MultiModalDeepfakeDetector and
+   gives the same logits as the original checkpoint
+
+Usage:
+    python benchmarks/check_artifacts.py [--fail-after 4194304]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+import torch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend_video'))
+sys.path.insert(0, HERE)
+
+from http_fixture import start_server
+from artifacts import download_artifact, ensure_model_artifact, load_mmap_state_dict, sha256_file
+from model_arch import MultiModalDeepfakeDetector, Config
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fail-after', type=int, default=4 * 1024 * 1024,
+                        help='Bytes the fixture sends before dropping each connection')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='check_artifacts_')
+    try:
+        serve_dir = os.path.join(work_dir, 'serve')
+        store_dir = os.path.join(work_dir, 'store')
+        os.makedirs(serve_dir)
+
+        torch.manual_seed(0)
+        reference = MultiModalDeepfakeDetector().eval()
+        # Same layout as the training notebook's checkpoint
+        torch.save({'epoch': 1, 'model_state_dict': reference.state_dict()},
+                   os.path.join(serve_dir, 'best_model.pth'))
+        expected = sha256_file(os.path.join(serve_dir, 'best_model.pth'))
+
+        server = start_server(serve_dir, fail_after_bytes=args.fail_after)
+        url = server.url_for('best_model.pth')
+
+        # 1. Resumed download with verification
+        dest = os.path.join(store_dir, 'best_model.pth')
+        download_artifact(url, dest, sha256=expected)
+        resumed_ok = sha256_file(dest) == expected and not os.path.exists(dest + '.part')
+        requests_used = server.requests
+
+        # 2. Wrong digest: rejected, nothing left behind
+        bad_dest = os.path.join(store_dir, 'bad.pth')
+        try:
+            download_artifact(url, bad_dest, sha256='0' * 64)
+            rejected = False
+        except ValueError:
+            rejected = not os.path.exists(bad_dest) and not os.path.exists(bad_dest + '.part')
+        server.shutdown()
+
+        # 3. Convert and mmap-load
+        weights_path = ensure_model_artifact(dest, url, store_dir=store_dir)
+        net = MultiModalDeepfakeDetector()
+        before = rss_mb()
+        net.load_state_dict(load_mmap_state_dict(weights_path), assign=True)
+        net.eval()
+        rss_after_mmap = rss_mb() - before
+
+        config = Config()
+        audio = torch.randn(1, config.SEQUENCE_LENGTH, config.AUDIO_N_MELS, 32)
+        video = torch.randn(1, config.SEQUENCE_LENGTH, 3, config.IMG_SIZE, config.IMG_SIZE)
+        with torch.no_grad():
+            max_diff = (net(audio, video)['logits'] - reference(audio, video)['logits']).abs().max().item()
+
+        print(json.dumps({
+            'checkpoint_bytes': os.path.getsize(dest),
+            'fixture_requests_for_download': requests_used,
+            'resumed_download_verified': resumed_ok,
+            'bad_digest_rejected': rejected,
+            'weights_bytes': os.path.getsize(weights_path),
+            'rss_growth_mb_after_mmap_load': round(rss_after_mmap, 1),
+            'max_logit_diff': max_diff,
+        }, indent=2))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
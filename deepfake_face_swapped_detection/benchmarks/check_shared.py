@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Check that the modules shared by the two backends have not drifted apart.
+
+Each backend is built and deployed on its own (its directory is the Docker
+build context and the Hugging Face Space), so the shared modules cannot live
+in one package outside them: both directories carry a copy. This script
+compares the copies byte for byte and exits non-zero on any difference. The
+backends' test suites run the same check (tests/test_shared_modules.py).
+
+After changing one copy, bring the other in line with:
+
+    python benchmarks/check_shared.py --fix --from backend_video
+
+Usage:
+    python benchmarks/check_shared.py [--fix --from {backend_video,backend-image}]
+"""
+import os
+import sys
+import shutil
+import argparse
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+BACKENDS = ("backend_video", "backend-image")
+
+SHARED = (
+    "admission.py",
+    "explain_artifacts.py",
+    "metrics.py",
+    "profiling.py",
+    "tracing.py",
+    "uploads.py",
+    "url_handler.py",
+    "tests/conftest.py",
+    "tests/test_shared_modules.py",
+)
+
+
+def drifted(root: str = ROOT) -> list:
+    """
+    Lists the shared files whose copies differ.
+
+    Args:
+        root: Repository root holding both backend directories
+
+    Returns:
+        Relative paths that differ or are missing from a backend
+    """
+    out = []
+    for name in SHARED:
+        copies = []
+        for backend in BACKENDS:
+            path = os.path.join(root, backend, name)
+            if not os.path.exists(path):
+                copies.append(None)
+                continue
+            with open(path, "rb") as f:
+                copies.append(f.read())
+        if None in copies or len(set(copies)) > 1:
+            out.append(name)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fix", action="store_true", help="Overwrite the other copy with the --from one")
+    parser.add_argument("--from", dest="source", choices=BACKENDS, help="Backend holding the copy to keep")
+    args = parser.parse_args()
+    if args.fix and not args.source:
+        parser.error("--fix needs --from")
+
+    names = drifted()
+    if not names:
+        print(f"✅ {len(SHARED)} shared files identical in {' and '.join(BACKENDS)}")
+        return 0
+
+    if args.fix:
+        for name in names:
+            for backend in BACKENDS:
+                if backend != args.source:
+                    shutil.copyfile(os.path.join(ROOT, args.source, name), os.path.join(ROOT, backend, name))
+            print(f"🔧 {name}: copied from {args.source}")
+        return 0
+
+    for name in names:
+        print(f"❌ {name} differs between {' and '.join(BACKENDS)}")
+    print("Bring the copies in line with: python benchmarks/check_shared.py --fix --from <backend>")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Local HTTP server fixture for offline download tests and benchmarks.
+
+Serves files from a directory with single-range `Range` support and counts
+the bytes it sends, so fetchers can be exercised and measured without
+touching real platforms.
+"""
+import os
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """GET/HEAD handler for static files with `Range: bytes=...` support."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _resolve(self):
+        name = os.path.basename(self.path.split("?", 1)[0])
+        path = os.path.join(self.server.directory, name)
+        return path if name and os.path.isfile(path) else None
+
+    def _send_file(self, include_body: bool):
+        path = self._resolve()
+        if path is None:
+            self.send_error(404)
+            return
+
+        total = os.path.getsize(path)
+        start, end = 0, total - 1
+        status = 200
+
+        match = re.match(r"bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+        if match and self.server.ranges and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else total - 1
+            else:
+                # Suffix range: last N bytes
+                start = max(0, total - int(match.group(2)))
+            end = min(end, total - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{total}")
+                self.end_headers()
+                return
+            status = 206
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", self.server.content_type_for(path))
+        if self.server.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        self.end_headers()
+
+        self.server.record_request()
+        if not include_body:
+            return
+
+        # Simulated flaky link: drop the connection after this many body bytes
+        budget = self.server.fail_after_bytes
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                if budget is not None:
+                    chunk = chunk[:budget]
+                    budget -= len(chunk)
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Clients that stop early (streaming, sparse fetch) just hang up
+                    return
+                self.server.record_bytes(len(chunk))
+                remaining -= len(chunk)
+                if budget == 0 and remaining > 0:
+                    self.close_connection = True
+                    return
+
+    def do_GET(self):
+        self._send_file(include_body=True)
+
+    def do_HEAD(self):
+        self._send_file(include_body=False)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    CONTENT_TYPES = {
+        ".mp4": "video/mp4",
+        ".mov": "video/quicktime",
+        ".webm": "video/webm",
+        ".jpg": "image/jpeg",
+        ".jpeg": "image/jpeg",
+        ".png": "image/png",
+        ".webp": "image/webp",
+    }
+
+    def __init__(self, directory: str, port: int = 0, fail_after_bytes: int = None, ranges: bool = True):
+        super().__init__(("127.0.0.1", port), RangeRequestHandler)
+        self.directory = directory
+        self.fail_after_bytes = fail_after_bytes
+        self.ranges = ranges
+        self.bytes_sent = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def url_for(self, filename: str) -> str:
+        return f"{self.base_url}/{filename}"
+
+    def content_type_for(self, path: str) -> str:
+        return self.CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+    def record_bytes(self, count: int):
+        with self._lock:
+            self.bytes_sent += count
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def reset_counters(self):
+        with self._lock:
+            self.bytes_sent = 0
+            self.requests = 0
+
+
+def start_server(directory: str, port: int = 0, fail_after_bytes: int = None, ranges: bool = True) -> FixtureServer:
+    """
+    Start serving `directory` on 127.0.0.1 in a background thread.
+
+    Args:
+        directory: Folder whose files are served by basename
+        port: Port to bind (0 picks a free one)
+        fail_after_bytes: If set, every response is cut off after this many body bytes
+        ranges: False ignores Range headers and always answers 200 with the whole file
+
+    Returns:
+        FixtureServer: call .shutdown() when done
+    """
+    server = FixtureServer(directory, port, fail_after_bytes, ranges)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test against locally launched instances of both backends.
+
+Starts the video and image apps (bench_server.py) and a local HTTP fixture
+serving the synthetic corpus in place of real platforms, then replays a
+weighted mix of requests:
+
+- image_upload:  POST /explain (image backend)
+- video_upload:  POST /predict (video backend)
+- video_url:     POST /predict-video-url with a fixture URL
+- image_url:     POST /explain-url with a fixture URL
+
+Load models:
+- closed: --users virtual users, each sending its next request as soon as
+  the previous one finishes (plus --think-time)
+- open:   Poisson arrivals at each rate in --rates requests/s, independent of
+  how fast the servers answer, so queueing shows up as latency
+
+Output is JSON per phase (one per user count or rate): throughput, error
+rate, p50/p95/p99 latency overall and per request type, plus a per-second
+timeline of completions, errors, in-flight requests and each server's CPU
+and RSS (including child processes such as ffmpeg).
+
+Usage:
+    python benchmarks/load_test.py [--model closed|open] [--users 1,2,4] [--rates 0.5,1,2]
+        [--duration 30] [--mix image_upload=4,video_upload=3,video_url=2,image_url=1]
+        [--video-url http://127.0.0.1:8000 --image-url http://127.0.0.1:8001] [--output out.json]
+
+Pass --video-url/--image-url to target already running servers instead of launching them.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from http_fixture import start_server
+from synthetic_media import generate_corpus
+
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+# -- Server processes --
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def launch_server(backend: str, random_weights: bool, log_dir: str):
+    port = free_port()
+    cmd = [sys.executable, os.path.join(HERE, 'bench_server.py'), backend, '--port', str(port)]
+    if random_weights:
+        cmd.append('--random-weights')
+    log = open(os.path.join(log_dir, f'{backend}_server.log'), 'w')
+    process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+    return process, f'http://127.0.0.1:{port}'
+
+
+def wait_ready(base_url: str, process=None, timeout: float = 300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server for {base_url} exited with {process.returncode}")
+        try:
+            if httpx.get(f'{base_url}/ready', timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{base_url} not ready after {timeout}s")
+
+
+def process_tree(pid: int) -> list:
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def cpu_seconds_and_rss(pid: int) -> tuple:
+    """(utime + stime in seconds, RSS in MB) summed over the process and its children."""
+    cpu, rss = 0.0, 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / CLK_TCK
+            rss += int(fields[21]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss / 2**20
+
+
+# -- Request mix --
+def build_requests(manifest: list, fixture, video_base: str, image_base: str) -> dict:
+    """Request type -> list of zero-argument factories returning (method, url, httpx kwargs)."""
+    videos = [m for m in manifest if m['kind'] == 'video']
+    images = [m for m in manifest if m['kind'] == 'image']
+    payloads = {m['name']: open(m['path'], 'rb').read() for m in manifest}
+    mime = {'.mp4': 'video/mp4', '.webm': 'video/webm', '.jpg': 'image/jpeg', '.png': 'image/png',
+            '.webp': 'image/webp'}
+
+    def upload(base, path, item):
+        ext = os.path.splitext(item['name'])[1]
+        return ('POST', f'{base}{path}', {'files': {'file': (item['name'], payloads[item['name']], mime[ext])}})
+
+    def by_url(base, path, item):
+        return ('POST', f'{base}{path}', {'json': {'url': fixture.url_for(item['name'])}})
+
+    return {
+        'image_upload': [lambda i=i: upload(image_base, '/explain', i) for i in images],
+        'video_upload': [lambda v=v: upload(video_base, '/predict', v) for v in videos],
+        'video_url': [lambda v=v: by_url(video_base, '/predict-video-url', v) for v in videos],
+        'image_url': [lambda i=i: by_url(image_base, '/explain-url', i) for i in images],
+    }
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        name, weight = part.split('=')
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+# -- Load generation --
+class Recorder:
+    def __init__(self):
+        self.results = []  # (request type, start offset, latency, status or error)
+        self.in_flight = 0
+        self.start = time.perf_counter()
+
+    def summary(self, elapsed: float) -> dict:
+        def stats(rows):
+            ok = [r[2] for r in rows if r[3] == 200]
+            errors = {}
+            for r in rows:
+                if r[3] != 200:
+                    errors[str(r[3])] = errors.get(str(r[3]), 0) + 1
+            out = {'completed': len(rows), 'ok': len(ok), 'errors': errors,
+                   'error_rate': round(1 - len(ok) / len(rows), 4) if rows else 0.0,
+                   'throughput_per_s': round(len(ok) / elapsed, 3)}
+            if ok:
+                ms = np.array(ok) * 1000.0
+                out['latency_ms'] = {p: round(float(np.percentile(ms, q)), 1)
+                                     for p, q in (('p50', 50), ('p95', 95), ('p99', 99))}
+                out['latency_ms']['max'] = round(float(ms.max()), 1)
+            return out
+
+        by_type = {}
+        for row in self.results:
+            by_type.setdefault(row[0], []).append(row)
+        return {'overall': stats(self.results), 'by_type': {k: stats(v) for k, v in sorted(by_type.items())}}
+
+
+async def send(client, recorder, kind, factory):
+    method, url, kwargs = factory()
+    start = time.perf_counter()
+    recorder.in_flight += 1
+    try:
+        response = await client.request(method, url, **kwargs)
+        outcome = response.status_code
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    finally:
+        recorder.in_flight -= 1
+    recorder.results.append((kind, start - recorder.start, time.perf_counter() - start, outcome))
+
+
+def pick(requests: dict, mix: dict, rng: random.Random):
+    kinds = [k for k in mix if requests.get(k)]
+    kind = rng.choices(kinds, weights=[mix[k] for k in kinds])[0]
+    return kind, rng.choice(requests[kind])
+
+
+async def closed_loop(client, recorder, requests, mix, users, duration, think_time, rng):
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            kind, factory = pick(requests, mix, rng)
+            await send(client, recorder, kind, factory)
+            if think_time:
+                await asyncio.sleep(think_time)
+
+    await asyncio.gather(*(user() for _ in range(users)))
+
+
+async def open_loop(client, recorder, requests, mix, rate, duration, max_outstanding, rng):
+    deadline = time.perf_counter() + duration
+    tasks = set()
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        kind, factory = pick(requests, mix, rng)
+        if len(tasks) >= max_outstanding:
+            # Client-side shedding, so a saturated server cannot make the generator unbounded
+            recorder.results.append((kind, time.perf_counter() - recorder.start, 0.0, 'client_overflow'))
+        else:
+            task = asyncio.create_task(send(client, recorder, kind, factory))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        next_arrival += rng.expovariate(rate)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def sample_timeline(recorder, servers, interval, stop):
+    timeline = []
+    previous = {name: cpu_seconds_and_rss(p.pid)[0] for name, p in servers.items()}
+    last_count, last_time = 0, time.perf_counter()
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        now = time.perf_counter()
+        done = recorder.results[last_count:]
+        point = {'t': round(now - recorder.start, 1), 'completed': len(done),
+                 'errors': sum(1 for r in done if r[3] != 200), 'in_flight': recorder.in_flight}
+        for name, process in servers.items():
+            cpu, rss = cpu_seconds_and_rss(process.pid)
+            point[f'{name}_cpu_pct'] = round(100 * (cpu - previous[name]) / (now - last_time), 1)
+            point[f'{name}_rss_mb'] = round(rss, 1)
+            previous[name] = cpu
+        last_count, last_time = len(recorder.results), now
+        timeline.append(point)
+    return timeline
+
+
+async def run_phase(args, requests, mix, servers, level) -> dict:
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=args.max_outstanding, max_keepalive_connections=args.max_outstanding)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        sampler = asyncio.create_task(sample_timeline(recorder, servers, args.sample_interval, stop))
+        if args.model == 'closed':
+            await closed_loop(client, recorder, requests, mix, level, args.duration, args.think_time, rng)
+        else:
+            await open_loop(client, recorder, requests, mix, level, args.duration, args.max_outstanding, rng)
+        elapsed = time.perf_counter() - recorder.start
+        stop.set()
+        timeline = await sampler
+    key = 'users' if args.model == 'closed' else 'rate_per_s'
+    return {key: level, 'elapsed_s': round(elapsed, 2), **recorder.summary(elapsed), 'timeline': timeline}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--users', default='1,2,4', help='Closed loop: comma-separated concurrency levels')
+    parser.add_argument('--rates', default='0.25,0.5,1', help='Open loop: comma-separated arrival rates (req/s)')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per phase')
+    parser.add_argument('--think-time', type=float, default=0.0)
+    parser.add_argument('--mix', default='image_upload=4,video_upload=3,video_url=2,image_url=1')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--max-outstanding', type=int, default=64)
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--video-duration', type=float, default=5.0)
+    parser.add_argument('--random-weights', action='store_true')
+    parser.add_argument('--video-url', help='Use this running video backend instead of launching one')
+    parser.add_argument('--image-url', help='Use this running image backend instead of launching one')
+    parser.add_argument('--output', help='Also write the JSON here')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    work_dir = tempfile.mkdtemp(prefix='load_test_')
+    processes = {}
+    fixture = None
+    try:
+        manifest = generate_corpus(work_dir, durations=(args.video_duration,), audio=(True,),
+                                   image_formats=('JPEG',))
+        fixture = start_server(work_dir)
+
+        video_base, image_base = args.video_url, args.image_url
+        if not video_base:
+            processes['video'], video_base = launch_server('video', args.random_weights, work_dir)
+        if not image_base:
+            processes['image'], image_base = launch_server('image', args.random_weights, work_dir)
+        wait_ready(video_base, processes.get('video'))
+        wait_ready(image_base, processes.get('image'))
+
+        requests = build_requests(manifest, fixture, video_base, image_base)
+        levels = [float(x) for x in (args.users if args.model == 'closed' else args.rates).split(',')]
+        if args.model == 'closed':
+            levels = [int(x) for x in levels]
+        phases = [asyncio.run(run_phase(args, requests, mix, processes, level)) for level in levels]
+
+        report = {
+            'model': args.model, 'mix': mix, 'duration_s': args.duration,
+            'media': [{k: m[k] for k in ('name', 'kind', 'bytes')} for m in manifest],
+            'fixture_bytes_sent': fixture.bytes_sent,
+            'phases': phases,
+        }
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if fixture is not None:
+            fixture.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
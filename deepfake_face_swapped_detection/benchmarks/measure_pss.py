@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory (PSS) of the video backend under 1, 2, 4 and 8 workers.
+
+For each worker count the backend is started twice:
+- prefork: `python serve.py --workers N` (model loaded once in the parent)
+- uvicorn: `uvicorn main:app --workers N` (every worker loads its own model)
+
+Once /ready answers and one /predict has gone through each worker, PSS
+(proportional set size: shared pages are split between the processes that
+map them) is read from /proc/<pid>/smaps_rollup for every worker process.
+Linux only.
+
+Usage:
+    python benchmarks/measure_pss.py [--workers 1 2 4 8] [--modes prefork uvicorn]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import argparse
+import subprocess
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.abspath(os.path.join(HERE, '..', 'backend_video'))
+SAMPLE_VIDEO = os.path.abspath(os.path.join(HERE, '..', 'video', 'amfdrorkqd.mp4'))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def children(pid):
+    pids = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        try:
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                pids += [int(p) for p in f.read().split()]
+        except FileNotFoundError:
+            pass
+    return pids
+
+
+def memory_kb(pid):
+    """(pss, rss, private) in kB from smaps_rollup."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0].endswith(':') and len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    private = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    return values.get('Pss', 0), values.get('Rss', 0), private
+
+
+def wait_ready(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'{base_url}/ready', timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def measure(mode, workers, timeout):
+    port = free_port()
+    env = {**os.environ, 'WEB_CONCURRENCY': str(workers)}
+    if mode == 'prefork':
+        cmd = [sys.executable, 'serve.py', '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port)]
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', 'main:app', '--workers', str(workers),
+               '--host', '127.0.0.1', '--port', str(port)]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        if not wait_ready(base_url, timeout):
+            return {'error': 'backend did not become ready'}
+        worker_pids = children(proc.pid)
+        if mode == 'uvicorn':
+            # uvicorn's supervisor also starts a resource tracker; only processes serving the app count
+            worker_pids = [p for p in worker_pids if 'resource_tracker' not in open(f'/proc/{p}/cmdline').read()]
+        if not worker_pids:
+            # `uvicorn --workers 1` serves from the main process itself
+            worker_pids = [proc.pid]
+            # Each uvicorn worker loads its model independently; wait until all of them are warm
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline and requests.get(f'{base_url}/ready', timeout=5).status_code != 200:
+                time.sleep(0.5)
+
+        # Push a real request through every worker so lazily allocated inference memory is counted
+        with open(SAMPLE_VIDEO, 'rb') as f:
+            video = f.read()
+        for _ in range(workers * 2):
+            requests.post(f'{base_url}/predict', files={'file': ('a.mp4', video, 'video/mp4')}, timeout=120)
+
+        parent_pss = memory_kb(proc.pid)[0] if proc.pid not in worker_pids else 0
+        per_worker = [memory_kb(pid) for pid in worker_pids]
+        pss = [m[0] for m in per_worker]
+
+        def mb(kb):
+            return round(kb / 1024, 1)
+
+        return {
+            'workers': len(worker_pids),
+            'parent_pss_mb': mb(parent_pss),
+            'worker_pss_mb': [mb(p) for p in pss],
+            'mean_worker_pss_mb': mb(sum(pss) / len(pss)),
+            'mean_worker_rss_mb': mb(sum(m[1] for m in per_worker) / len(per_worker)),
+            'mean_worker_private_mb': mb(sum(m[2] for m in per_worker) / len(per_worker)),
+            'total_pss_mb': mb(parent_pss + sum(pss)),
+        }
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--modes', nargs='+', default=['prefork', 'uvicorn'], choices=['prefork', 'uvicorn'])
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes:
+        for workers in args.workers:
+            print(f"Measuring {mode} x{workers}...", file=sys.stderr)
+            results[f'{mode}_{workers}'] = measure(mode, workers, args.timeout)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
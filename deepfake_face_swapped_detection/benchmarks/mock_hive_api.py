@@ -0,0 +1,105 @@
+"""
+Local stand-in for the NVIDIA Hive deepfake image detection endpoint.
+
+Answers POSTs with Hive-shaped responses after a configurable delay and
+fails a configurable fraction of requests, so the image backend's remote
+client can be exercised offline.
+"""
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockHiveHandler(BaseHTTPRequestHandler):
+    """POST handler returning {"data": [{"status": "SUCCESS", "bounding_boxes": [...]}]}."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        inputs = body.get("input", [])
+        self.server.record_request(len(inputs), length)
+
+        delay = self.server.next_latency()
+        if delay > 0:
+            time.sleep(delay)
+
+        if random.random() < self.server.failure_rate:
+            status, payload = 503, {"error": "mock failure"}
+        else:
+            status = 200
+            payload = {"data": [
+                {"status": "SUCCESS", "bounding_boxes": [{"is_deepfake": self.server.deepfake_score}]}
+                for _ in inputs
+            ]}
+
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # Hedged/cancelled requests hang up before the answer
+            pass
+
+
+class MockHiveServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, slow_fraction: float = 0.0, slow_latency: float = 0.0,
+                 failure_rate: float = 0.0, deepfake_score: float = 0.9, port: int = 0):
+        super().__init__(("127.0.0.1", port), MockHiveHandler)
+        self.latency = latency
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.deepfake_score = deepfake_score
+        self.requests = 0
+        self.images = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/deepfake"
+
+    def next_latency(self) -> float:
+        """Base latency, or the tail latency for `slow_fraction` of requests."""
+        if random.random() < self.slow_fraction:
+            return self.slow_latency
+        return self.latency
+
+    def record_request(self, image_count: int, body_bytes: int):
+        with self._lock:
+            self.requests += 1
+            self.images += image_count
+            self.bytes_received += body_bytes
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.images = 0
+            self.bytes_received = 0
+
+
+def start_mock_api(**kwargs) -> MockHiveServer:
+    """
+    Start the mock API on 127.0.0.1 in a background thread.
+
+    Args:
+        **kwargs: MockHiveServer settings (latency, slow_fraction, slow_latency,
+            failure_rate, deepfake_score, port)
+
+    Returns:
+        MockHiveServer: call .shutdown() when done
+    """
+    server = MockHiveServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Ranked per-submodule forward-pass timings for the video model.
+
+Runs MultiModalDeepfakeDetector over a sample workload with the module
+profiler attached and prints a table ranked by self time (or JSON with
+--json). Inputs are random tensors with the serving shapes; pass --weights
+to profile a converted checkpoint instead of random initialisation (timings
+do not depend on the weight values).
+
+Usage:
+    python benchmarks/profile_video_modules.py [--forwards 10] [--warmup 2] [--threads 0]
+        [--weights backend_video/artifacts/best_model.weights.pt] [--json]
+"""
+import os
+import sys
+import json
+import argparse
+
+import torch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'backend_video'))
+
+from model_arch import MultiModalDeepfakeDetector, Config
+from module_profiler import ModuleProfiler, format_table
+
+
+def sample_inputs(config, seed):
+    """Batch of one with the shapes main.py feeds the model."""
+    generator = torch.Generator().manual_seed(seed)
+    time_dim = int(config.AUDIO_SAMPLE_RATE * 1.0 / 512) + 1  # One second of mel frames per sequence step
+    audio = torch.randn(1, config.SEQUENCE_LENGTH, config.AUDIO_N_MELS, time_dim, generator=generator)
+    video = torch.randn(1, config.SEQUENCE_LENGTH, 3, config.IMG_SIZE, config.IMG_SIZE, generator=generator)
+    return audio, video
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--forwards', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=0, help='torch threads (0 = torch default)')
+    parser.add_argument('--weights', help='State-dict file from artifacts.ensure_model_artifact')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON instead of a table')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    config = Config()
+    model = MultiModalDeepfakeDetector().eval()
+    if args.weights:
+        model.load_state_dict(torch.load(args.weights, map_location='cpu', weights_only=True))
+
+    profiler = ModuleProfiler(model)
+    with torch.no_grad():
+        for i in range(args.warmup):
+            model(*sample_inputs(config, i))
+        profiler.enable()
+        for i in range(args.forwards):
+            model(*sample_inputs(config, args.warmup + i))
+        profiler.disable()
+
+    summary = profiler.summary()
+    if args.json:
+        print(json.dumps({'threads': torch.get_num_threads(), **summary}, indent=2))
+    else:
+        print(format_table(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Synthetic test media for offline benchmarks.
+
+Videos come from ffmpeg's lavfi sources (moving test pattern with grain, a
+sine tone for audio) so they exercise real decode and audio extraction
+paths; images are smooth NumPy noise upscaled to photo size, so encoders
+and resizers have realistic work to do. Everything is deterministic for a
+given seed.
+
+Usage:
+    python benchmarks/synthetic_media.py OUT_DIR [--durations 5,30] [--resolutions 640x360,1280x720]
+        [--codecs libx264] [--audio both] [--image-sizes 1024x768] [--image-formats JPEG,PNG]
+
+Writes the files and a manifest.json describing them to OUT_DIR.
+"""
+import io
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+# Codec -> container extension and extra encoder arguments
+VIDEO_CODECS = {
+    'libx264': ('.mp4', ['-pix_fmt', 'yuv420p', '-preset', 'veryfast']),
+    'libx265': ('.mp4', ['-pix_fmt', 'yuv420p', '-preset', 'veryfast', '-tag:v', 'hvc1']),
+    'mpeg4': ('.mp4', ['-q:v', '5']),
+    'libvpx-vp9': ('.webm', ['-deadline', 'realtime', '-cpu-used', '8', '-b:v', '1M']),
+}
+AUDIO_CODECS = {'.mp4': 'aac', '.webm': 'libopus'}
+IMAGE_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def parse_size(text: str) -> tuple:
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def make_video(path: str, duration: float = 5.0, size: tuple = (640, 360), fps: int = 25,
+               codec: str = 'libx264', audio: bool = True, gop: int = None, seed: int = 0) -> str:
+    """
+    Encode a synthetic clip with ffmpeg.
+
+    Args:
+        path: Output file; the container follows its extension
+        duration: Seconds
+        size: (width, height)
+        fps: Frame rate
+        codec: Key of VIDEO_CODECS
+        audio: Add a 16 kHz mono sine track
+        gop: Keyframe interval in frames (encoder default if None)
+        seed: Grain seed, so different seeds give different bytes
+
+    Returns:
+        str: path
+    """
+    ext, codec_args = VIDEO_CODECS[codec]
+    width, height = size
+    cmd = ['ffmpeg', '-loglevel', 'error', '-y',
+           '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}:duration={duration}']
+    if audio:
+        cmd += ['-f', 'lavfi', '-i', f'sine=frequency={220 + 20 * seed}:sample_rate=16000:duration={duration}']
+    # Temporal grain keeps the encoder from collapsing static areas to nothing
+    cmd += ['-vf', f'noise=alls=12:allf=t+u:all_seed={seed}', '-c:v', codec] + codec_args
+    if gop:
+        cmd += ['-g', str(gop)]
+    if audio:
+        cmd += ['-c:a', AUDIO_CODECS[os.path.splitext(path)[1] or ext], '-ac', '1', '-shortest']
+    subprocess.run(cmd + [path], check=True)
+    return path
+
+
+def make_image_bytes(seed: int = 0, size: tuple = (3024, 4032), fmt: str = 'JPEG', quality: int = 92) -> bytes:
+    """Photo-sized image with smooth texture, encoded in memory."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(1, size[1] // 16), max(1, size[0] // 16), 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize(size, Image.BICUBIC)
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **({'quality': quality} if fmt in ('JPEG', 'WEBP') else {}))
+    return buffer.getvalue()
+
+
+def make_image(path: str, size: tuple = (1024, 768), seed: int = 0) -> str:
+    fmt = {v: k for k, v in IMAGE_EXTENSIONS.items()}[os.path.splitext(path)[1].lower()]
+    with open(path, 'wb') as f:
+        f.write(make_image_bytes(seed, size, fmt))
+    return path
+
+
+def generate_corpus(out_dir: str, durations=(5.0,), resolutions=((640, 360),), codecs=('libx264',),
+                    audio=(True,), image_sizes=((1024, 768),), image_formats=('JPEG',), fps: int = 25) -> list:
+    """
+    Writes every combination of the video and image settings to out_dir.
+
+    Returns:
+        list: manifest entries {name, path, kind, bytes, ...settings}, also saved as manifest.json
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = []
+    seed = 0
+    for duration in durations:
+        for width, height in resolutions:
+            for codec in codecs:
+                for with_audio in audio:
+                    ext = VIDEO_CODECS[codec][0]
+                    name = f"video_{width}x{height}_{duration:g}s_{codec}_{'audio' if with_audio else 'mute'}{ext}"
+                    path = make_video(os.path.join(out_dir, name), duration, (width, height), fps=fps,
+                                      codec=codec, audio=with_audio, seed=seed)
+                    manifest.append({'name': name, 'path': path, 'kind': 'video', 'bytes': os.path.getsize(path),
+                                     'duration': duration, 'fps': fps, 'width': width, 'height': height, 'codec': codec,
+                                     'audio': with_audio})
+                    seed += 1
+    for width, height in image_sizes:
+        for fmt in image_formats:
+            name = f"image_{width}x{height}{IMAGE_EXTENSIONS[fmt]}"
+            path = make_image(os.path.join(out_dir, name), (width, height), seed)
+            manifest.append({'name': name, 'path': path, 'kind': 'image', 'bytes': os.path.getsize(path),
+                             'width': width, 'height': height, 'format': fmt})
+            seed += 1
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def add_corpus_arguments(parser):
+    """Corpus options shared by the benchmarks that generate their own media."""
+    parser.add_argument('--durations', default='5', help='Comma-separated video durations in seconds')
+    parser.add_argument('--resolutions', default='640x360', help='Comma-separated WxH video sizes')
+    parser.add_argument('--codecs', default='libx264', help=f"Comma-separated, from {','.join(VIDEO_CODECS)}")
+    parser.add_argument('--audio', choices=('yes', 'no', 'both'), default='both')
+    parser.add_argument('--image-sizes', default='1024x768', help='Comma-separated WxH image sizes')
+    parser.add_argument('--image-formats', default='JPEG,PNG', help=f"Comma-separated, from {','.join(IMAGE_EXTENSIONS)}")
+
+
+def corpus_from_args(out_dir: str, args) -> list:
+    return generate_corpus(
+        out_dir,
+        durations=[float(d) for d in args.durations.split(',')],
+        resolutions=[parse_size(r) for r in args.resolutions.split(',')],
+        codecs=args.codecs.split(','),
+        audio={'yes': (True,), 'no': (False,), 'both': (True, False)}[args.audio],
+        image_sizes=[parse_size(s) for s in args.image_sizes.split(',')],
+        image_formats=[f.upper() for f in args.image_formats.split(',')],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    manifest = corpus_from_args(args.out_dir, args)
+    json.dump(manifest, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
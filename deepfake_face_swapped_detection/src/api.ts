@@ -0,0 +1,3 @@
+// Backend base URLs. Artifact paths in their responses (image_url, heatmap_image_url) are relative to these.
+export const VIDEO_API_URL = 'http://127.0.0.1:8000';
+export const IMAGE_API_URL = 'http://127.0.0.1:8001';